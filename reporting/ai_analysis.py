@@ -15,17 +15,29 @@ Kaldes fra:
   etf_build_weekly.py → mode="weekly"
 """
 
-import json
 import os
-import time
-import urllib.request
-import urllib.error
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from ai_payload import compile_payload
+
+# HTTP og rate-limit-styring ligger i ai_client.py (asyncio + http.client
+# keep-alive) — ventetid styres af API'ets rate-limit-headers, ikke faste
+# pauser. Den importeres først i selve API-kaldene (asyncio koster ~50 ms),
+# så builder- og alert-kørsler uden API-nøgle ikke betaler for den.
 
 # Model — Haiku er billig og hurtig nok til denne opgave
 MODEL = "claude-haiku-4-5-20251001"
-API_URL = "https://api.anthropic.com/v1/messages"
 MAX_TOKENS = 400
 
+# Sek pr. skriv-kald: 15 + 1 sek pr. 100 max_tokens. ai_client genforsøger et
+# socket-timeout som netværksfejl (og hvert forsøg kan faktureres), så lange
+# svar — fx lag 3's batch på op til 1200 tokens — skal have tid til at blive færdige
+WRITE_TIMEOUT_BASE       = 15
+WRITE_TIMEOUT_PER_TOKENS = 100
+
 
 # ==========================================
 # PAYLOAD-BYGGER
@@ -36,7 +48,8 @@ def build_payload(portfolio, latest_map, hits_data, hwm_data,
                   corr_pairs=None, heatmap_data=None):
     """
     Bygger det dataobjekt der sendes til Claude API.
-    Inkluderer kun det der er relevant — holder payload kompakt.
+    Inkluderer kun det der er relevant — ai_payload.compile_payload()
+    koder det kompakt og trimmer det til token-budgettet.
     """
 
     # --- Ejede positioner ---
@@ -212,46 +225,88 @@ Skriv et kort overblik til den ugentlige rapport."""
 # API-KALD
 # ==========================================
 
-def call_claude(system_prompt, user_prompt):
+def call_claude(system_prompt, user_prompt, mode=None):
     """
     Kalder Anthropic API og returnerer tekstsvar.
     Returnerer None ved fejl — så integration ikke crasher.
+    mode: cache-levetid (se ai_cache.TTL) — None = ingen cache.
     """
     api_key = os.environ.get('ANTHROPIC_API_KEY', '')
     if not api_key:
         print("⚠️  ANTHROPIC_API_KEY mangler — AI-analyse springes over")
         return None
 
-    body = json.dumps({
+    return call_claude_many([(system_prompt, user_prompt)], api_key, mode=mode)[0]
+
+
+def call_claude_many(prompts, api_key, mode=None, max_tokens=MAX_TOKENS, timeout=None):
+    """
+    Flere uafhængige skriv-kald samtidigt: [(system, user), ...] → [tekst eller None].
+    timeout: sek pr. kald — standard vokser med max_tokens.
+    """
+    if timeout is None:
+        timeout = WRITE_TIMEOUT_BASE + max_tokens / WRITE_TIMEOUT_PER_TOKENS
+    bodies  = [_message_body(system, user, max_tokens) for system, user in prompts]
+    results = _send_cached(bodies, mode, api_key=api_key, timeout=timeout)
+    tekster = []
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"⚠️  AI-analyse fejlede: {result}")
+            tekster.append(None)
+        else:
+            print(f"✅ AI-analyse genereret ({len(result)} tegn)")
+            tekster.append(result)
+    return tekster
+
+
+def _send_cached(bodies, mode, **kwargs):
+    """
+    Sender kun de kald der ikke allerede har et gyldigt svar i ai_cache.
+    Returnerer tekst eller Exception pr. body, i samme rækkefølge.
+    """
+    from ai_client import post_many
+    import ai_cache
+
+    if mode is None or not ai_cache.ENABLED:
+        return [r if isinstance(r, Exception) else _response_text(r)
+                for r in post_many(bodies, **kwargs)]
+
+    from ai_cache import body_key, get_cache, lookup, store, save_cache
+
+    cache   = get_cache()
+    keys    = [body_key(b) for b in bodies]
+    results = [lookup(cache, k) for k in keys]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if len(missing) < len(bodies):
+        print(f"   ♻️  {len(bodies) - len(missing)} AI-svar fra cache ({mode})")
+
+    if missing:
+        svar = post_many([bodies[i] for i in missing], **kwargs)
+        for i, result in zip(missing, svar):
+            if isinstance(result, Exception):
+                results[i] = result
+            else:
+                results[i] = _response_text(result)
+                store(cache, keys[i], mode, results[i])
+    save_cache(cache)
+    return results
+
+
+def _message_body(system_prompt, user_prompt, max_tokens=MAX_TOKENS):
+    return {
         "model":      MODEL,
-        "max_tokens": MAX_TOKENS,
+        "max_tokens": max_tokens,
         "system":     system_prompt,
         "messages":   [{"role": "user", "content": user_prompt}]
-    }).encode('utf-8')
-
-    req = urllib.request.Request(
-        API_URL,
-        data=body,
-        headers={
-            "Content-Type":      "application/json",
-            "x-api-key":         api_key,
-            "anthropic-version": "2023-06-01",
-        },
-        method="POST"
-    )
+    }
 
-    try:
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            data = json.loads(resp.read().decode('utf-8'))
-            tekst = data.get('content', [{}])[0].get('text', '').strip()
-            print(f"✅ AI-analyse genereret ({len(tekst)} tegn)")
-            return tekst
-    except urllib.error.HTTPError as e:
-        print(f"⚠️  API fejl {e.code}: {e.read().decode('utf-8')[:200]}")
-        return None
-    except Exception as e:
-        print(f"⚠️  AI-analyse fejlede: {e}")
-        return None
+
+def _response_text(data):
+    """Samler tekstblokkene i et svar (web search-svar har flere)."""
+    return " ".join(
+        block.get('text', '') for block in data.get('content', [])
+        if block.get('type') == 'text'
+    ).strip()
 
 
 # ==========================================
@@ -273,8 +328,8 @@ def get_alarm_analyse(portfolio, latest_map, hits_data, hwm_data,
         heatmap_data=heatmap_data,
     )
     tekst = call_claude(SYSTEM_ALARM, USER_ALARM.format(
-        payload=json.dumps(payload, ensure_ascii=False, indent=2)
-    ))
+        payload=compile_payload(payload, mode="alarm")[0]
+    ), mode="alarm")
     if not tekst:
         return ""
     return _wrap_html(tekst, mode="alarm")
@@ -297,8 +352,8 @@ def get_weekly_analyse(portfolio, latest_map, hits_data, hwm_data,
         heatmap_data=heatmap_data,
     )
     tekst = call_claude(SYSTEM_WEEKLY, USER_WEEKLY.format(
-        payload=json.dumps(payload, ensure_ascii=False, indent=2)
-    ))
+        payload=compile_payload(payload, mode="weekly")[0]
+    ), mode="weekly")
     if not tekst:
         return ""
     return _wrap_html(tekst, mode="weekly")
@@ -313,43 +368,47 @@ def get_weekly_analyse(portfolio, latest_map, hits_data, hwm_data,
 
 SEARCH_MODEL = "claude-haiku-4-5-20251001"
 SEARCH_MAX_TOKENS = 300  # Reduceret for at undgå rate limit
+SEARCH_BETA = "web-search-2025-03-05"
+# Søgeresultaterne lægges ind i konteksten og tæller som input-tokens —
+# medregnes i rate-limit-budgettet før kaldet sendes
+SEARCH_INPUT_ESTIMATE = 5000
 
 
-def _web_search_via_claude(query, api_key):
-    """
-    Udfører ét web search via Claude API med web_search tool.
-    Returnerer tekst-opsummering eller tom streng ved fejl.
-    """
-    body = json.dumps({
+def _search_body(query):
+    return {
         "model": SEARCH_MODEL,
         "max_tokens": SEARCH_MAX_TOKENS,
         "tools": [{"type": "web_search_20250305", "name": "web_search"}],
         "system": "Du søger på finansielle nyheder og returnerer en kort faktuel opsummering på max 3 sætninger på dansk. Ingen markdown, ingen bullet points. Fokus på hvad der driver markedet lige nu og hvad analytikere forventer.",
         "messages": [{"role": "user", "content": f"Søg efter aktuelle nyheder og markedsforhold: {query}"}]
-    }).encode('utf-8')
-
-    req = urllib.request.Request(
-        API_URL,
-        data=body,
-        headers={
-            "Content-Type":      "application/json",
-            "x-api-key":         api_key,
-            "anthropic-version": "2023-06-01",
-            "anthropic-beta":    "web-search-2025-03-05",
-        },
-        method="POST"
+    }
+
+
+def _web_search_via_claude(query, api_key):
+    """
+    Udfører ét web search via Claude API med web_search tool.
+    Returnerer tekst-opsummering eller tom streng ved fejl.
+    """
+    return _web_search_many([query], api_key)[0]
+
+
+def _web_search_many(queries, api_key):
+    """
+    Udfører uafhængige web searches samtidigt (inden for rate-limit-budgettet).
+    Returnerer en tekst pr. søgning — tom streng ved fejl.
+    """
+    results = _send_cached(
+        [_search_body(q) for q in queries], "search",
+        api_key=api_key, beta=SEARCH_BETA, timeout=20, extra_input=SEARCH_INPUT_ESTIMATE,
     )
-    try:
-        with urllib.request.urlopen(req, timeout=20) as resp:
-            data = json.loads(resp.read().decode('utf-8'))
-            tekst = " ".join(
-                block.get('text', '') for block in data.get('content', [])
-                if block.get('type') == 'text'
-            ).strip()
-            return tekst if tekst else ""
-    except Exception as e:
-        print(f"⚠️  Web search fejlede for '{query}': {e}")
-        return ""
+    tekster = []
+    for query, result in zip(queries, results):
+        if isinstance(result, Exception):
+            print(f"⚠️  Web search fejlede for '{query}': {result}")
+            tekster.append("")
+        else:
+            tekster.append(result)
+    return tekster
 
 
 # Mapping fra kategori-navn til web search søgeterm
@@ -396,25 +455,19 @@ def fetch_sector_news(positioner, top_kandidater, api_key):
             søgninger.append((f"Kandidat: {ticker}", f"{navn} ETF news outlook"))
 
     news = {}
-    print(f"   📰 Lag 2: {len(søgninger)} web søgninger...")
-    print(f"   ⏳ Venter 60 sek så token-vinduet nulstilles efter Lag 1...")
-    time.sleep(60)
-
-    for label, term in søgninger:
-        result = ""
-        for forsøg in range(2):
-            result = _web_search_via_claude(term, api_key)
-            if result:
-                break
-            if forsøg == 0:
-                print(f"   ⏳ Rate limit — venter 30 sek...")
-                time.sleep(30)
+    print(f"   📰 Lag 2: {len(søgninger)} web søgninger (samtidigt)...")
+    # Genforsøg og ventetid ved rate limit håndteres af ai_client
+    results = _web_search_many([term for _, term in søgninger], api_key)
+
+    for (label, _), result in zip(søgninger, results):
         if result:
             news[label] = result
             print(f"   ✅ {label}: {len(result)} tegn")
         else:
             print(f"   ⚠️  {label}: ingen resultater")
-        time.sleep(5)
+    from ai_cache import cache_stats
+    from ai_client import client_stats
+    print(f"   📊 {client_stats()} · {cache_stats()}")
 
     return news
 
@@ -484,9 +537,7 @@ def get_markedskontekst(positioner, kandidater, mode="weekly"):
         news=news_tekst,
     )
 
-    print(f"   ⏳ Venter 60 sek inden afsluttende kald...")
-    time.sleep(60)
-    tekst = call_claude(SYSTEM_MARKEDSKONTEKST, user_prompt)
+    tekst = call_claude(SYSTEM_MARKEDSKONTEKST, user_prompt, mode="kontekst")
     if not tekst:
         return ""
 
@@ -506,99 +557,168 @@ def get_markedskontekst(positioner, kandidater, mode="weekly"):
 # Format: {isin: {kriterium: dato}}
 _LAG3_CACHE = {}
 
+# Batch: alle signaler skrives i ét kald, så flere signaler ikke giver flere
+# runder — derfor kan loftet være højere end de 2 signaler der var før
+LAG3_MAX_SIGNALER = 6
+LAG3_TOKENS_PER_FOND = 150   # max_tokens pr. fond i batch-svaret
+
 SYSTEM_LAG3 = """Du er en kortfattet, dansk porteføljeassistent for en privat investor.
-Du modtager nyheder om en specifik fond og dens sektor efter et signal om svækkelse.
-Skriv 2-3 sætninger på dansk der forklarer hvad der driver bevægelsen og om det er midlertidigt eller strukturelt.
+Du modtager nyheder om en eller flere fonde, grupperet efter sektor, efter signaler om svækkelse.
+Skriv for hver fond 2-3 sætninger på dansk der forklarer hvad der driver bevægelsen og om det er midlertidigt eller strukturelt.
+
+Format — præcis én linje pr. fond, i den rækkefølge fondene er givet:
+TICKER: analyse
 
 Regler:
-- Skriv kun dansk, ingen markdown, ingen bullet points
-- Brug fondens ticker-navn (fx HYCN.DE)
+- Skriv kun dansk, ingen markdown, ingen bullet points, ingen linjeskift inde i en analyse
+- Start hver linje med fondens ticker-navn efterfulgt af kolon (fx "HYCN.DE: ...")
 - Vær konkret — hvad siger kilderne præcist?
-- Afslut med én sætning: midlertidigt eller strukturelt?
-- Max 3 sætninger
+- Afslut hver analyse med én sætning: midlertidigt eller strukturelt?
+- Max 3 sætninger pr. fond
 - Undgå finansiel rådgivning"""
 
-USER_LAG3 = """Signal: {kriterium} på {ticker} ({navn})
+USER_LAG3 = """Signaler grupperet efter sektor:
 
-Markedsnyheder:
-{news}
+{grupper}
 
-Skriv en kort kontekst-analyse til alarm-mailen. Er dette midlertidigt eller strukturelt?"""
+Skriv en kort kontekst-analyse til alarm-mailen for hver fond: {tickers}. Er det midlertidigt eller strukturelt?"""
 
 
-def get_signal_analyse(ticker, navn, sektor, kriterium, api_key=None):
+def _lag3_groups(jobs):
     """
-    Lag 3: Hændelsesdrevet analyse for ét signal.
-    Laver 2 søgninger og skriver 2-3 sætninger om årsag + midlertidigt/strukturelt.
-
-    Returnerer HTML-streng eller tom streng ved fejl/anti-spam.
-    Anti-spam: samme fond + kriterium analyseres ikke igen inden for 3 dage.
+    Grupperer signalerne efter sektor — fonde i samme sektor deler én
+    søgning. Fonde uden sektor får hver deres gruppe.
+    Returnerer [(label, query, [jobs])].
     """
-    if not api_key:
-        api_key = os.environ.get('ANTHROPIC_API_KEY', '')
-    if not api_key:
-        return ""
+    grupper = {}
+    for job in jobs:
+        sektor = job["sektor"] if job["sektor"] and job["sektor"] != "—" else None
+        grupper.setdefault(sektor or job["ticker"], (sektor, []))[1].append(job)
+
+    result = []
+    for label, (sektor, medlemmer) in grupper.items():
+        navne = ", ".join(j["navn"] for j in medlemmer)
+        if sektor:
+            query = f"{sektor} outlook 2026 — {navne} ETF news"
+        else:
+            query = f"{navne} ETF news sector outlook"
+        result.append((label, query, medlemmer))
+    return result
+
+
+def _parse_lag3(tekst, tickers):
+    """Deler batch-svaret op i {ticker: analyse} ud fra "TICKER: ..."-linjerne."""
+    sektioner = {}
+    aktuel = None
+    for linje in tekst.splitlines():
+        ren = linje.strip().lstrip("-*#• ").replace("**", "")
+        match = next((t for t in tickers if ren.upper().startswith(t.upper() + ":")), None)
+        if match:
+            aktuel = match
+            sektioner[aktuel] = ren[len(match) + 1:].strip()
+        elif aktuel and ren:
+            # Fortsættelse hvis modellen alligevel har brudt linjen
+            sektioner[aktuel] += " " + ren
+    # Ét signal og intet ticker-præfiks: hele svaret hører til fonden
+    if not sektioner and len(tickers) == 1 and tekst.strip():
+        sektioner[tickers[0]] = tekst.strip()
+    return {t: s for t, s in sektioner.items() if s}
+
+
+def _lag3_html(tekst):
+    return f"""<div style="margin-top:8px; padding:8px 12px; background:#f0f4ff;
+                border-left:3px solid #3b5bdb; border-radius:0 4px 4px 0;
+                font-size:12px; color:#333; line-height:1.5;">
+      <span style="font-weight:600; color:#3b5bdb;">🤖 AI-kontekst:</span> {tekst}
+    </div>"""
 
-    # Anti-spam check
+
+def _run_lag3(signaler, api_key):
+    """
+    Kører Lag 3 for signalerne i batch: én søgning pr. sektor (samtidigt),
+    derefter ét skriv-kald med alle fonde grupperet efter sektor. Svaret
+    deles op pr. ticker. Returnerer dict {ticker: html_tekst}.
+    """
     import datetime
     today = datetime.date.today().isoformat()
-    cache_key = f"{ticker}_{kriterium}"
-    if _LAG3_CACHE.get(cache_key) == today:
-        print(f"   ⏭️  Lag 3 anti-spam: {ticker} {kriterium} allerede analyseret i dag")
-        return ""
 
-    print(f"   🔍 Lag 3: søger på {ticker} ({kriterium})...")
+    # Anti-spam check
+    jobs = []
+    for s in signaler:
+        ticker    = s.get("ticker", "")
+        kriterium = s.get("kriterium", "")
+        cache_key = f"{ticker}_{kriterium}"
+        if _LAG3_CACHE.get(cache_key) == today:
+            print(f"   ⏭️  Lag 3 anti-spam: {ticker} {kriterium} allerede analyseret i dag")
+            continue
+        print(f"   🔍 Lag 3: søger på {ticker} ({kriterium})...")
+        jobs.append({
+            "ticker":    ticker,
+            "navn":      s.get("navn", ticker),
+            "sektor":    s.get("sektor", "—"),
+            "kriterium": kriterium,
+            "cache_key": cache_key,
+        })
+    if not jobs:
+        return {}
 
-    # Søgning 1: fond-specifikke nyheder
-    q1 = f"{navn} ETF news"
-    # Søgning 2: sektor-outlook
-    q2 = f"{sektor} outlook 2026" if sektor and sektor != "—" else f"{ticker} sector outlook"
+    grupper = _lag3_groups(jobs)
+    results = _web_search_many([query for _, query, _ in grupper], api_key)
+
+    blokke, med_nyheder = [], []
+    for (label, _, medlemmer), result in zip(grupper, results):
+        if not result:
+            print(f"   ⚠️  Lag 3: ingen søgeresultater for {label}")
+            continue
+        print(f"   ✅ Lag 3 søgning '{label}': {len(result)} tegn")
+        fonde = "\n".join(f"- Signal: {j['kriterium']} på {j['ticker']} ({j['navn']})" for j in medlemmer)
+        blokke.append(f"Sektor: {label}\n{fonde}\n\nMarkedsnyheder:\n{result}")
+        med_nyheder += medlemmer
+    if not med_nyheder:
+        return {}
 
-    news_parts = []
-    for label, query in [(ticker, q1), (sektor, q2)]:
-        result = _web_search_via_claude(query, api_key)
-        if result:
-            nl = "\n"
-            news_parts.append(f"{label}:{nl}{result}")
-            print(f"   ✅ Lag 3 søgning '{label}': {len(result)} tegn")
-        time.sleep(5)
+    tickers = [j["ticker"] for j in med_nyheder]
+    user_prompt = USER_LAG3.format(grupper="\n\n".join(blokke), tickers=", ".join(tickers))
+    max_tokens  = min(MAX_TOKENS + LAG3_TOKENS_PER_FOND * (len(tickers) - 1), 1200)
+    tekst = call_claude_many([(SYSTEM_LAG3, user_prompt)], api_key, mode="signal", max_tokens=max_tokens)[0]
+    if not tekst:
+        return {}
 
-    if not news_parts:
-        print(f"   ⚠️  Lag 3: ingen søgeresultater for {ticker}")
-        return ""
+    sektioner = _parse_lag3(tekst, tickers)
+    resultater = {}
+    for job in med_nyheder:
+        analyse = sektioner.get(job["ticker"])
+        if not analyse:
+            print(f"   ⚠️  Lag 3: intet afsnit for {job['ticker']} i svaret")
+            continue
+        # Opdater anti-spam cache
+        _LAG3_CACHE[job["cache_key"]] = today
+        print(f"   ✅ Lag 3 analyse: {job['ticker']} ({len(analyse)} tegn)")
+        resultater[job["ticker"]] = _lag3_html(analyse)
+    return resultater
 
-    # Vent så token-vinduet ikke overskrides
-    print(f"   ⏳ Lag 3: venter 30 sek inden skriv-kald...")
-    time.sleep(30)
 
-    nl = "\n\n"
-    news_tekst = nl.join(news_parts)
-    user_prompt = USER_LAG3.format(
-        kriterium=kriterium,
-        ticker=ticker,
-        navn=navn,
-        news=news_tekst,
-    )
+def get_signal_analyse(ticker, navn, sektor, kriterium, api_key=None):
+    """
+    Lag 3: Hændelsesdrevet analyse for ét signal.
+    Søger på fond + sektor og skriver 2-3 sætninger om årsag + midlertidigt/strukturelt.
 
-    tekst = call_claude(SYSTEM_LAG3, user_prompt)
-    if not tekst:
+    Returnerer HTML-streng eller tom streng ved fejl/anti-spam.
+    Anti-spam: samme fond + kriterium analyseres ikke igen inden for 3 dage.
+    """
+    if not api_key:
+        api_key = os.environ.get('ANTHROPIC_API_KEY', '')
+    if not api_key:
         return ""
 
-    # Opdater anti-spam cache
-    _LAG3_CACHE[cache_key] = today
-    print(f"   ✅ Lag 3 analyse: {ticker} ({len(tekst)} tegn)")
-
-    return f"""<div style="margin-top:8px; padding:8px 12px; background:#f0f4ff;
-                border-left:3px solid #3b5bdb; border-radius:0 4px 4px 0;
-                font-size:12px; color:#333; line-height:1.5;">
-      <span style="font-weight:600; color:#3b5bdb;">🤖 AI-kontekst:</span> {tekst}
-    </div>"""
+    signal = {"ticker": ticker, "navn": navn, "sektor": sektor, "kriterium": kriterium}
+    return _run_lag3([signal], api_key).get(ticker, "")
 
 
 def get_all_signal_analyser(signaler, watchlist=None):
     """
-    Kører Lag 3 for en liste af signaler.
-    Prioriterer Trail Stop > K3 > K2. Max 2 signaler per kørsel.
+    Kører Lag 3 for en liste af signaler i ét batch-kald.
+    Prioriterer Trail Stop > K3 > K2. Max LAG3_MAX_SIGNALER signaler per kørsel.
 
     signaler: liste af dicts med {ticker, navn, sektor, kriterium}
     Returnerer: dict {ticker: html_tekst}
@@ -611,27 +731,20 @@ def get_all_signal_analyser(signaler, watchlist=None):
     prioritet = {"Trail Stop": 0, "K3": 1, "K2": 2, "K1": 9}
     sorterede = sorted(signaler, key=lambda x: prioritet.get(x.get("kriterium", "K1"), 9))
 
-    # Max 2 signaler — spring K1 over
-    kandidater = [s for s in sorterede if s.get("kriterium") != "K1"][:2]
+    # Spring K1 over — én fond kan have flere signaler, den vigtigste tæller
+    kandidater, sete = [], set()
+    for s in sorterede:
+        if s.get("kriterium") == "K1" or s.get("ticker") in sete:
+            continue
+        sete.add(s.get("ticker"))
+        kandidater.append(s)
+    kandidater = kandidater[:LAG3_MAX_SIGNALER]
 
     if not kandidater:
         return {}
 
-    print(f"   📰 Lag 3: analyserer {len(kandidater)} signal(er)...")
-    # Vent så Lag 1 tokens er clearet
-    time.sleep(30)
-
-    resultater = {}
-    for s in kandidater:
-        ticker   = s.get("ticker", "")
-        navn     = s.get("navn", ticker)
-        sektor   = s.get("sektor", "—")
-        kriterium = s.get("kriterium", "")
-        html = get_signal_analyse(ticker, navn, sektor, kriterium, api_key)
-        if html:
-            resultater[ticker] = html
-
-    return resultater
+    print(f"   📰 Lag 3: analyserer {len(kandidater)} signal(er) i ét batch...")
+    return _run_lag3(kandidater, api_key)
 
 
 # ==========================================
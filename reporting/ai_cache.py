@@ -0,0 +1,146 @@
+"""
+ai_cache.py — Cache af AI-svar nøglet på payload-hash
+======================================================
+ETF weekly og monthly kører samme lørdag og sender ofte præcis samme
+payload, og en alert der køres igen efter en fejl spørger om det samme
+som før. Cachen mapper sha256(model, system-prompt, user-prompt) → svar,
+så et gentaget kald hverken koster ventetid eller tokens.
+
+Levetid pr. mode — hvor hurtigt svaret bliver forældet:
+  alarm    3 timer   (dagens signaler — kun genkørsler)
+  signal   12 timer  (Lag 3-analyse af ét signal)
+  weekly   12 timer  (ugens/månedens porteføljeoverblik)
+  search   24 timer  (sektornyheder fra web search)
+  kontekst 24 timer  (markedskontekst skrevet ud fra nyhederne)
+
+Kun gyldige svar gemmes — fejl og tomme svar prøves igen næste gang.
+Udløbne poster ryddes ved gemning, og cachen holdes under MAX_ENTRIES
+ved at fjerne de ældst brugte (LRU).
+
+TRENDAGENT_AI_CACHE=0 slår cachen fra (fx ved benchmarks mod ai_mock_server.py).
+
+Format (data/ai_cache.json — committes ikke, genbruges via actions/cache):
+  {"entries": {nøgle: {"mode", "created", "text"}, ...}}   — ældst brugt først
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_store import load_json, save_json
+
+ROOT       = Path(__file__).resolve().parents[1]
+CACHE_FILE = ROOT / "data/ai_cache.json"
+ENABLED    = os.environ.get("TRENDAGENT_AI_CACHE", "1") != "0"
+
+HOUR = 3600
+TTL = {
+    "alarm":    3 * HOUR,
+    "signal":   12 * HOUR,
+    "weekly":   12 * HOUR,
+    "search":   24 * HOUR,
+    "kontekst": 24 * HOUR,
+}
+
+# Et svar er ~1-2 KB — 300 poster ≈ 0,5 MB og dækker flere ugers kørsler
+MAX_ENTRIES = 300
+
+_STATE = None   # Indlæses ved første opslag og deles af alle kald i processen
+
+
+def cache_key(model, system_prompt, user_prompt):
+    """sha256 over model, system- og user-prompt (NUL-separeret)."""
+    raw = "\0".join((model, system_prompt or "", user_prompt or ""))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def body_key(body):
+    """Nøgle for en Messages-body: model, system og sidste user-besked."""
+    messages = body.get("messages") or [{}]
+    content  = messages[-1].get("content", "")
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    # Værktøjer (web search) ændrer svaret — de indgår i system-delen af nøglen
+    system = body.get("system", "")
+    if body.get("tools"):
+        system += json.dumps(body["tools"], sort_keys=True)
+    return cache_key(body.get("model", ""), system, content)
+
+
+# ==========================================
+# CACHE-STATE
+# ==========================================
+
+def load_cache(max_entries=MAX_ENTRIES):
+    """Indlæser cachen. Returnerer state-dict til lookup()/store()/save_cache()."""
+    data    = load_json(CACHE_FILE, {})
+    entries = data.get("entries", {}) if isinstance(data, dict) else {}
+    return {"entries": entries, "max": max_entries, "hits": 0, "misses": 0, "dirty": False}
+
+
+def get_cache():
+    """Processens fælles cache (indlæses én gang)."""
+    global _STATE
+    if _STATE is None:
+        _STATE = load_cache()
+    return _STATE
+
+
+def _expired(entry, now):
+    ttl = TTL.get(entry.get("mode"), 0)
+    return now - entry.get("created", 0) > ttl
+
+
+def save_cache(cache):
+    """Gemmer cachen (atomisk) hvis den er ændret — fjerner udløbne og ældst brugte poster."""
+    entries = cache["entries"]
+    now = time.time()
+    for key in [k for k, e in entries.items() if _expired(e, now)]:
+        del entries[key]
+        cache["dirty"] = True
+
+    overflow = len(entries) - cache["max"]
+    if overflow > 0:
+        for key in list(entries)[:overflow]:
+            del entries[key]
+        cache["dirty"] = True
+
+    if not cache["dirty"]:
+        return
+    save_json(CACHE_FILE, {"entries": entries}, indent=1)
+    cache["dirty"] = False
+
+
+def lookup(cache, key):
+    """Returnerer cachet tekst, eller None hvis posten mangler eller er udløbet."""
+    entry = cache["entries"].pop(key, None)
+    if entry is None or _expired(entry, time.time()):
+        if entry is not None:
+            cache["dirty"] = True
+        cache["misses"] += 1
+        return None
+    cache["hits"] += 1
+    # Flyt posten bagerst = senest brugt
+    cache["entries"][key] = entry
+    cache["dirty"] = True
+    return entry["text"]
+
+
+def store(cache, key, mode, text):
+    if not text:
+        return
+    if mode not in TTL:
+        raise ValueError(f"Ukendt cache-mode: {mode}")
+    cache["entries"].pop(key, None)
+    cache["entries"][key] = {"mode": mode, "created": round(time.time()), "text": text}
+    cache["dirty"] = True
+
+
+def cache_stats(cache=None):
+    cache = cache or get_cache()
+    return f"ai-cache: {cache['hits']} hits, {cache['misses']} misses, {len(cache['entries'])} poster"
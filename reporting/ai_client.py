@@ -0,0 +1,326 @@
+"""
+ai_client.py — Asynkron klient til Anthropic API med rate-limit-styring
+========================================================================
+ai_analysis.py ventede før med faste pauser: 60 sek før første web search,
+30 sek ved hvert genforsøg, 5 sek mellem søgninger og 60 sek før det
+afsluttende kald — over to minutter i tomgang pr. ugerapport, uanset om
+API'et faktisk var presset. Her styres ventetiden af API'et selv:
+
+  - token-bucket pr. grænse (requests, input-tokens, output-tokens), som
+    kalibreres fra svarenes anthropic-ratelimit-*-headers (limit, remaining,
+    reset) — der ventes kun når budgettet faktisk er brugt op
+  - 429/529 respekterer retry-after (ellers eksponentiel backoff), og
+    blokeringen gælder alle samtidige kald
+  - uafhængige kald (fx web search pr. sektor) køres samtidigt med asyncio,
+    inden for budgettet
+  - keep-alive: forbindelsen genbruges på tværs af alle kald i processen
+    (én pr. samtidigt kald — HTTP/1.1 kan ikke multiplexe)
+
+Kun standardbiblioteket (asyncio + http.client) — ingen ekstra pakker i
+workflowene. Indtil første svar er kendt, sendes ét kald ad gangen.
+
+TRENDAGENT_API_URL peger klienten mod en anden server — fx den lokale
+stand-in i ai_mock_server.py til offline benchmarks og test.
+
+Brug:
+  from ai_client import post_message, post_many
+  data  = post_message(body)                        # ét kald → svar-dict
+  svar  = post_many([body1, body2], beta="...")     # samtidige kald
+"""
+
+import asyncio
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+DEFAULT_API_URL   = "https://api.anthropic.com/v1/messages"
+API_URL           = os.environ.get("TRENDAGENT_API_URL") or DEFAULT_API_URL
+ANTHROPIC_VERSION = "2023-06-01"
+
+MAX_CONCURRENCY = 4       # Samtidige kald (= max antal keep-alive forbindelser)
+MAX_RETRIES     = 4       # Genforsøg ved 429/529/5xx/netværksfejl
+BACKOFF_BASE    = 2.0     # Sek — 2, 4, 8, 16 hvis serveren ikke sender retry-after
+MAX_WAIT        = 90.0    # Loft over én ventetid
+RETRY_STATUS    = {429, 500, 502, 503, 504, 529}
+
+# Grænser vi læser fra headers: anthropic-ratelimit-<navn>-{limit,remaining,reset}
+BUCKETS = ("requests", "tokens", "input-tokens", "output-tokens")
+
+_LOCK  = threading.Lock()   # render_all.py kan kalde fra flere tråde
+_POOL  = {}                 # (host, port, https) → [ledige forbindelser]
+_STATS = {"requests": 0, "retries": 0, "waited": 0.0, "connections": 0, "reused": 0}
+
+
+# ==========================================
+# TOKEN-BUCKET
+# ==========================================
+
+def new_limiter():
+    """Budget pr. grænse + global blokering (retry-after). Kalibreres fra headers."""
+    return {"buckets": {}, "blocked_until": 0.0, "calibrated": False}
+
+
+_LIMITER = new_limiter()
+
+
+def _parse_reset(value):
+    """anthropic-ratelimit-*-reset er et RFC 3339-tidspunkt — returnerer sek til reset."""
+    try:
+        reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+
+
+def update_limits(limiter, headers, now=None):
+    """
+    Synkroniserer bucketterne med serverens tal. remaining er sandheden;
+    genopfyldningen sættes så bucket'en er fuld ved reset (min. limit/60 pr. sek).
+    """
+    now = time.monotonic() if now is None else now
+    with _LOCK:
+        for name in BUCKETS:
+            try:
+                limit     = float(headers[f"anthropic-ratelimit-{name}-limit"])
+                remaining = float(headers[f"anthropic-ratelimit-{name}-remaining"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            reset_in = _parse_reset(headers.get(f"anthropic-ratelimit-{name}-reset"))
+            rate = limit / 60.0
+            if reset_in:
+                rate = max(rate, (limit - remaining) / reset_in)
+            limiter["buckets"][name] = {
+                "limit": limit, "tokens": remaining, "rate": rate, "updated": now,
+            }
+        limiter["calibrated"] = True
+
+
+def block(limiter, seconds):
+    """Sætter alle kald på pause (fx retry-after fra et 429-svar)."""
+    with _LOCK:
+        limiter["blocked_until"] = max(limiter["blocked_until"], time.monotonic() + seconds)
+
+
+def _refill(bucket, now):
+    elapsed = now - bucket["updated"]
+    bucket["tokens"]  = min(bucket["limit"], bucket["tokens"] + elapsed * bucket["rate"])
+    bucket["updated"] = now
+
+
+def _reserve(limiter, costs):
+    """
+    Trækker costs fra bucketterne hvis der er plads — ellers returneres
+    ventetiden (sek) uden at trække noget. Kaldes under _LOCK.
+    """
+    now  = time.monotonic()
+    wait = max(0.0, limiter["blocked_until"] - now)
+    for name, cost in costs.items():
+        bucket = limiter["buckets"].get(name)
+        if not bucket or not cost:
+            continue
+        _refill(bucket, now)
+        # Et kald større end hele budgettet må vente på fuld bucket
+        need = min(cost, bucket["limit"])
+        if bucket["tokens"] < need:
+            wait = max(wait, (need - bucket["tokens"]) / bucket["rate"] if bucket["rate"] else MAX_WAIT)
+    if wait > 0:
+        return wait
+    for name, cost in costs.items():
+        if name in limiter["buckets"]:
+            limiter["buckets"][name]["tokens"] -= cost
+    return 0.0
+
+
+async def acquire(limiter, costs):
+    """Venter til budgettet rækker til kaldet, og trækker det så."""
+    while True:
+        with _LOCK:
+            wait = _reserve(limiter, costs)
+        if wait <= 0:
+            return
+        wait = min(wait, MAX_WAIT)
+        _STATS["waited"] += wait
+        await asyncio.sleep(wait)
+
+
+def estimate_costs(body, extra_input=0):
+    """Anslået forbrug: ~4 tegn pr. input-token + evt. søgeresultater; max_tokens ud."""
+    input_tokens  = len(json.dumps(body, ensure_ascii=False)) // 4 + extra_input
+    output_tokens = body.get("max_tokens", 0)
+    return {
+        "requests":      1,
+        "input-tokens":  input_tokens,
+        "output-tokens": output_tokens,
+        "tokens":        input_tokens + output_tokens,
+    }
+
+
+# ==========================================
+# KEEP-ALIVE FORBINDELSER
+# ==========================================
+
+def _pool_key(url):
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    return (parts.hostname, parts.port or (443 if https else 80), https), parts.path or "/"
+
+
+def _checkout(key, timeout):
+    with _LOCK:
+        free = _POOL.setdefault(key, [])
+        if free:
+            _STATS["reused"] += 1
+            return free.pop(), True
+        _STATS["connections"] += 1
+    host, port, https = key
+    cls = http.client.HTTPSConnection if https else http.client.HTTPConnection
+    return cls(host, port, timeout=timeout), False
+
+
+def _checkin(key, conn):
+    with _LOCK:
+        _POOL.setdefault(key, []).append(conn)
+
+
+def close_all():
+    """Lukker alle ledige forbindelser."""
+    with _LOCK:
+        conns = [c for free in _POOL.values() for c in free]
+        _POOL.clear()
+    for conn in conns:
+        conn.close()
+
+
+def _send(key, path, payload, headers, timeout):
+    """
+    Blokerende POST på en genbrugt forbindelse (køres i en tråd).
+    En lukket keep-alive forbindelse (serveren har timet ud) prøves igen
+    én gang på en ny forbindelse.
+    """
+    for attempt in range(2):
+        conn, reused = _checkout(key, timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        try:
+            conn.request("POST", path, body=payload, headers=headers)
+            resp = conn.getresponse()
+            raw  = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if reused and attempt == 0:
+                continue
+            raise
+        except Exception:
+            conn.close()
+            raise
+        resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+        if resp.will_close:
+            conn.close()
+        else:
+            _checkin(key, conn)
+        return resp.status, resp_headers, raw
+
+
+# ==========================================
+# KALD
+# ==========================================
+
+def _retry_delay(headers, attempt):
+    """retry-after hvis serveren sender den, ellers eksponentiel backoff med jitter."""
+    try:
+        delay = float(headers.get("retry-after", ""))
+    except ValueError:
+        delay = BACKOFF_BASE * (2 ** attempt)
+        delay += random.uniform(0, delay / 4)
+    return min(delay, MAX_WAIT)
+
+
+async def post_async(body, api_key=None, beta=None, timeout=30, extra_input=0,
+                     limiter=None, url=None):
+    """
+    Sender ét Messages-kald inden for rate-limit-budgettet.
+    Returnerer svar-dict — kaster RuntimeError med status og fejltekst ved fejl.
+    """
+    limiter = _LIMITER if limiter is None else limiter
+    api_key = api_key or os.environ.get("ANTHROPIC_API_KEY", "")
+    key, path = _pool_key(url or API_URL)
+
+    headers = {
+        "Content-Type":      "application/json",
+        "x-api-key":         api_key,
+        "anthropic-version": ANTHROPIC_VERSION,
+    }
+    if beta:
+        headers["anthropic-beta"] = beta
+    payload = json.dumps(body).encode("utf-8")
+    costs   = estimate_costs(body, extra_input)
+
+    for attempt in range(MAX_RETRIES + 1):
+        await acquire(limiter, costs)
+        _STATS["requests"] += 1
+        try:
+            status, resp_headers, raw = await asyncio.to_thread(_send, key, path, payload, headers, timeout)
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                raise RuntimeError(f"netværksfejl: {e}") from e
+            _STATS["retries"] += 1
+            await asyncio.sleep(_retry_delay({}, attempt))
+            continue
+
+        update_limits(limiter, resp_headers)
+        if status == 200:
+            return json.loads(raw.decode("utf-8"))
+
+        if status in RETRY_STATUS and attempt < MAX_RETRIES:
+            delay = _retry_delay(resp_headers, attempt)
+            _STATS["retries"] += 1
+            print(f"   ⏳ API {status} — venter {delay:.0f} sek (forsøg {attempt + 2}/{MAX_RETRIES + 1})")
+            block(limiter, delay)
+            continue
+        raise RuntimeError(f"API fejl {status}: {raw.decode('utf-8', 'replace')[:200]}")
+
+
+async def gather_async(bodies, concurrency=MAX_CONCURRENCY, **kwargs):
+    """
+    Sender flere uafhængige kald samtidigt. Returnerer en liste i samme
+    rækkefølge — svar-dict eller Exception pr. kald.
+
+    Før første svar er budgettet ukendt, så det første kald går alene.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    limiter = kwargs.get("limiter") or _LIMITER
+
+    async def one(body):
+        async with sem:
+            return await post_async(body, **kwargs)
+
+    results = []
+    rest = list(bodies)
+    if rest and not limiter["calibrated"]:
+        results += await asyncio.gather(one(rest.pop(0)), return_exceptions=True)
+    results += await asyncio.gather(*(one(b) for b in rest), return_exceptions=True)
+    return results
+
+
+def post_message(body, **kwargs):
+    """Synkron indgang til ét kald (bruges fra almindelige scripts)."""
+    return asyncio.run(post_async(body, **kwargs))
+
+
+def post_many(bodies, **kwargs):
+    """Synkron indgang til flere samtidige kald."""
+    if not bodies:
+        return []
+    return asyncio.run(gather_async(bodies, **kwargs))
+
+
+def client_stats():
+    return (f"ai-klient: {_STATS['requests']} kald, {_STATS['retries']} genforsøg, "
+            f"{_STATS['waited']:.1f} sek ventet på rate limit, "
+            f"{_STATS['connections']} forbindelser ({_STATS['reused']} genbrug)")
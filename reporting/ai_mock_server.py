@@ -0,0 +1,371 @@
+"""
+ai_mock_server.py — Lokal stand-in for Anthropic Messages API
+==============================================================
+ai_analysis.py kunne hverken køres eller tidsmåles uden en rigtig nøgle
+og netværk. Denne server svarer som /v1/messages, så alert- og weekly-
+pipelinen kan benchmarkes og retry/limiter-logikken i ai_client.py kan
+testes helt offline:
+
+  - afspiller optagede svar (nøglet som ai_cache: model + system + prompt);
+    ukendte kald får et syntetisk dansk svar (Lag 3-batch: én linje pr. ticker)
+  - simuleret latens: fixed / uniform / exp / lognormal, web search x3
+  - rate limits som API'et: requests og input-tokens pr. minut med
+    anthropic-ratelimit-*-headers, 429 + retry-after når budgettet er brugt
+  - tilfældige 429- og 5xx-fejl (500/529) med valgfri sandsynlighed
+  - --record: videresender til det rigtige API og gemmer svarene til replay
+
+Klienten vælger serveren via TRENDAGENT_API_URL. Med en kommando efter
+'--' startes serveren, kommandoen køres mod den (med AI-cachen slået fra),
+og der printes væg-tid og serverstatistik.
+
+Brug:
+  python reporting/ai_mock_server.py --port 8765
+  TRENDAGENT_API_URL=http://127.0.0.1:8765/v1/messages python reporting/etf_send_alert.py
+
+  python reporting/ai_mock_server.py --latency 1.5 --latency-dist lognormal \\
+      --p429 0.1 --p5xx 0.05 -- python reporting/etf_build_weekly.py
+  python reporting/ai_mock_server.py --record -- python reporting/etf_send_alert.py
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from ai_cache import body_key
+from data_store import load_json, save_json
+
+ROOT            = Path(__file__).resolve().parents[1]
+RECORDINGS_FILE = ROOT / "data/ai_recordings.json"
+UPSTREAM_URL    = "https://api.anthropic.com/v1/messages"
+
+DEFAULTS = {
+    "latency":       0.8,     # Sek (median) pr. skriv-kald
+    "latency_dist":  "lognormal",
+    "latency_sigma": 0.4,     # Spredning for lognormal / uniform (±andel)
+    "search_factor": 3.0,     # Web search tager ~3x så lang tid
+    "search_tokens": 4000,    # Input-tokens som søgeresultaterne fylder
+    "rpm":           50,      # Requests pr. minut (0 = ubegrænset)
+    "itpm":          50000,   # Input-tokens pr. minut (0 = ubegrænset)
+    "p429":          0.0,     # Tilfældige 429 ud over rate limit
+    "p5xx":          0.0,     # Tilfældige 500/529
+    "retry_after":   2,       # Sek i retry-after ved tilfældige 429
+    "seed":          None,
+}
+
+
+# ==========================================
+# SIMULATION
+# ==========================================
+
+def new_server_state(config, recordings=None):
+    """Konfiguration, rate-limit-budget, optagelser og tællere for én server."""
+    now = time.monotonic()
+    return {
+        "config":     config,
+        "random":     random.Random(config.get("seed")),
+        "lock":       threading.Lock(),
+        "buckets": {
+            "requests":     {"limit": config["rpm"],  "tokens": float(config["rpm"]),  "updated": now},
+            "input-tokens": {"limit": config["itpm"], "tokens": float(config["itpm"]), "updated": now},
+        },
+        "recordings": recordings if recordings is not None else {},
+        "stats": {"requests": 0, "ok": 0, "rate_limited": 0, "random_429": 0, "errors_5xx": 0,
+                  "replayed": 0, "synthetic": 0, "recorded": 0, "latency": 0.0},
+    }
+
+
+def sample_latency(state, search=False):
+    cfg  = state["config"]
+    rnd  = state["random"]
+    base = cfg["latency"] * (cfg["search_factor"] if search else 1.0)
+    dist = cfg["latency_dist"]
+    if base <= 0 or dist == "fixed":
+        return max(0.0, base)
+    if dist == "uniform":
+        return rnd.uniform(base * (1 - cfg["latency_sigma"]), base * (1 + cfg["latency_sigma"]))
+    if dist == "exp":
+        return rnd.expovariate(1 / base)
+    # lognormal med median = base
+    return rnd.lognormvariate(math.log(base), cfg["latency_sigma"])
+
+
+def _reset_time(bucket):
+    """Tidspunkt hvor bucket'en er fuld igen (RFC 3339, som API'et)."""
+    missing = bucket["limit"] - bucket["tokens"]
+    seconds = missing / (bucket["limit"] / 60.0) if bucket["limit"] else 0
+    reset = datetime.now(timezone.utc) + timedelta(seconds=seconds)
+    return reset.isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def take_budget(state, input_tokens):
+    """
+    Trækker ét request og input_tokens fra budgettet. Returnerer
+    (ok, retry_after, headers) — headers er anthropic-ratelimit-*.
+    """
+    costs = {"requests": 1, "input-tokens": input_tokens}
+    with state["lock"]:
+        now = time.monotonic()
+        retry_after = 0.0
+        for name, bucket in state["buckets"].items():
+            if not bucket["limit"]:
+                continue
+            rate = bucket["limit"] / 60.0
+            bucket["tokens"]  = min(bucket["limit"], bucket["tokens"] + (now - bucket["updated"]) * rate)
+            bucket["updated"] = now
+            need = min(costs[name], bucket["limit"])
+            if bucket["tokens"] < need:
+                retry_after = max(retry_after, (need - bucket["tokens"]) / rate)
+        ok = retry_after == 0
+        if ok:
+            for name, bucket in state["buckets"].items():
+                if bucket["limit"]:
+                    bucket["tokens"] -= costs[name]
+
+        headers = {}
+        for name, bucket in state["buckets"].items():
+            if bucket["limit"]:
+                headers[f"anthropic-ratelimit-{name}-limit"]     = str(int(bucket["limit"]))
+                headers[f"anthropic-ratelimit-{name}-remaining"] = str(max(0, int(bucket["tokens"])))
+                headers[f"anthropic-ratelimit-{name}-reset"]     = _reset_time(bucket)
+    return ok, math.ceil(retry_after), headers
+
+
+def synthetic_text(body):
+    """Dansk svar i det format ai_analysis forventer for kaldstypen."""
+    prompt = body.get("messages", [{}])[-1].get("content", "")
+    if not isinstance(prompt, str):
+        prompt = json.dumps(prompt, ensure_ascii=False)
+    # Lag 3-batch: én "TICKER: ..."-linje pr. fond
+    m = re.search(r"for hver fond: (.+?)\. Er", prompt)
+    if m:
+        return "\n".join(
+            f"{t}: Mock-analyse — svækkelsen i {t} følger sektoren denne uge. Det ser midlertidigt ud."
+            for t in m.group(1).split(", ")
+        )
+    if body.get("tools"):
+        return "Mock-nyheder: sektoren handles sidelæns, analytikere afventer næste kvartals tal."
+    return "Mock-analyse: porteføljen er uændret i forhold til sidste kørsel, og ingen signaler kræver handling."
+
+
+def build_response(body, text, input_tokens):
+    return {
+        "id":      f"msg_mock_{random.getrandbits(48):012x}",
+        "type":    "message",
+        "role":    "assistant",
+        "model":   body.get("model", ""),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "usage":   {"input_tokens": input_tokens, "output_tokens": max(1, len(text) // 4)},
+    }
+
+
+def forward(raw, headers, upstream=UPSTREAM_URL, timeout=60):
+    """Videresender et kald til det rigtige API (til --record). Returnerer (status, headers, bytes)."""
+    import urllib.error
+    import urllib.request
+
+    req = urllib.request.Request(upstream, data=raw, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, dict(resp.headers), resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+# ==========================================
+# HTTP-SERVER
+# ==========================================
+
+def make_handler(state, record_file=None):
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive som det rigtige API
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _reply(self, status, payload, headers=None):
+            raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                self._reply(200, state["stats"])
+            else:
+                self._reply(404, {"type": "error", "error": {"type": "not_found_error"}})
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                self._reply(400, {"type": "error", "error": {"type": "invalid_request_error",
+                                                             "message": "body er ikke JSON"}})
+                return
+
+            stats  = state["stats"]
+            cfg    = state["config"]
+            search = bool(body.get("tools"))
+            input_tokens = len(raw) // 4 + (cfg["search_tokens"] if search else 0)
+            with state["lock"]:
+                stats["requests"] += 1
+                roll = state["random"].random()
+
+            ok, retry_after, headers = take_budget(state, input_tokens)
+            if not ok:
+                stats["rate_limited"] += 1
+                headers["retry-after"] = str(retry_after)
+                self._reply(429, {"type": "error", "error": {"type": "rate_limit_error",
+                                                             "message": "mock: rate limit"}}, headers)
+                return
+            if roll < cfg["p429"]:
+                stats["random_429"] += 1
+                headers["retry-after"] = str(cfg["retry_after"])
+                self._reply(429, {"type": "error", "error": {"type": "rate_limit_error",
+                                                             "message": "mock: tilfældig 429"}}, headers)
+                return
+
+            latency = sample_latency(state, search)
+            time.sleep(latency)
+            with state["lock"]:
+                stats["latency"] += latency
+
+            if roll < cfg["p429"] + cfg["p5xx"]:
+                stats["errors_5xx"] += 1
+                status = state["random"].choice((500, 529))
+                kind = "overloaded_error" if status == 529 else "api_error"
+                self._reply(status, {"type": "error", "error": {"type": kind, "message": "mock: serverfejl"}})
+                return
+
+            key = body_key(body)
+            recorded = state["recordings"].get(key)
+            if record_file and recorded is None:
+                fwd_headers = {k: v for k, v in self.headers.items()
+                               if k.lower() in ("x-api-key", "anthropic-version", "anthropic-beta", "content-type")}
+                status, up_headers, up_raw = forward(raw, fwd_headers)
+                if status != 200:
+                    self.send_response(status)
+                    self.send_header("Content-Length", str(len(up_raw)))
+                    self.end_headers()
+                    self.wfile.write(up_raw)
+                    return
+                recorded = json.loads(up_raw)
+                with state["lock"]:
+                    state["recordings"][key] = recorded
+                    stats["recorded"] += 1
+                    save_json(record_file, state["recordings"])
+            elif recorded is not None:
+                stats["replayed"] += 1
+
+            if recorded is None:
+                stats["synthetic"] += 1
+                recorded = build_response(body, synthetic_text(body), input_tokens)
+            stats["ok"] += 1
+            self._reply(200, recorded, headers)
+
+    return MockHandler
+
+
+def start_server(config=None, port=0, recordings_file=RECORDINGS_FILE, record=False):
+    """
+    Starter serveren i en baggrundstråd. Returnerer (server, url, state).
+    server.shutdown() stopper den igen.
+    """
+    cfg = dict(DEFAULTS)
+    cfg.update(config or {})
+    recordings = load_json(recordings_file, {}) if recordings_file else {}
+    state   = new_server_state(cfg, recordings)
+    handler = make_handler(state, recordings_file if record else None)
+    server  = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1/messages"
+    return server, url, state
+
+
+def format_stats(stats):
+    avg = stats["latency"] / stats["ok"] if stats["ok"] else 0.0
+    return (f"mock-API: {stats['requests']} kald — {stats['ok']} ok "
+            f"({stats['replayed']} afspillet, {stats['synthetic']} syntetiske, {stats['recorded']} optaget), "
+            f"{stats['rate_limited']} rate limit, {stats['random_429']} tilfældige 429, "
+            f"{stats['errors_5xx']} 5xx, gns. latens {avg:.2f} sek")
+
+
+def main():
+    argv = sys.argv[1:]
+    command = []
+    if "--" in argv:
+        split   = argv.index("--")
+        argv, command = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description="Lokal stand-in for Anthropic Messages API")
+    parser.add_argument("--port", type=int, default=0, help="Port (standard: ledig port)")
+    parser.add_argument("--latency", type=float, default=DEFAULTS["latency"], help="Median-latens i sek")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "exp", "lognormal"],
+                        default=DEFAULTS["latency_dist"])
+    parser.add_argument("--latency-sigma", type=float, default=DEFAULTS["latency_sigma"])
+    parser.add_argument("--search-factor", type=float, default=DEFAULTS["search_factor"])
+    parser.add_argument("--rpm", type=int, default=DEFAULTS["rpm"], help="Requests pr. minut (0 = ubegrænset)")
+    parser.add_argument("--itpm", type=int, default=DEFAULTS["itpm"], help="Input-tokens pr. minut (0 = ubegrænset)")
+    parser.add_argument("--p429", type=float, default=DEFAULTS["p429"], help="Sandsynlighed for tilfældig 429")
+    parser.add_argument("--p5xx", type=float, default=DEFAULTS["p5xx"], help="Sandsynlighed for 500/529")
+    parser.add_argument("--retry-after", type=int, default=DEFAULTS["retry_after"])
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--recordings", type=Path, default=RECORDINGS_FILE,
+                        help=f"Optagede svar (standard: {RECORDINGS_FILE.relative_to(ROOT)})")
+    parser.add_argument("--record", action="store_true",
+                        help="Videresend ukendte kald til det rigtige API og gem svarene")
+    args = parser.parse_args(argv)
+
+    config = {
+        "latency": args.latency, "latency_dist": args.latency_dist, "latency_sigma": args.latency_sigma,
+        "search_factor": args.search_factor, "rpm": args.rpm, "itpm": args.itpm,
+        "p429": args.p429, "p5xx": args.p5xx, "retry_after": args.retry_after, "seed": args.seed,
+    }
+    server, url, state = start_server(config, port=args.port,
+                                      recordings_file=args.recordings, record=args.record)
+    print(f"🧪 Mock-API kører på {url} ({len(state['recordings'])} optagede svar)")
+
+    if not command:
+        print(f"   TRENDAGENT_API_URL={url}  — Ctrl+C stopper")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        server.shutdown()
+        print(f"📊 {format_stats(state['stats'])}")
+        return 0
+
+    env = dict(os.environ, TRENDAGENT_API_URL=url, TRENDAGENT_AI_CACHE="0")
+    env.setdefault("ANTHROPIC_API_KEY", "mock-key")
+    start = time.monotonic()
+    code  = subprocess.run(command, env=env).returncode
+    elapsed = time.monotonic() - start
+    server.shutdown()
+
+    print(f"\n{'='*55}")
+    print(f"⏱️  {' '.join(command)}: {elapsed:.1f} sek (exit {code})")
+    print(f"📊 {format_stats(state['stats'])}")
+    print(f"{'='*55}\n")
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
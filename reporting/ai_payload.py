@@ -0,0 +1,164 @@
+"""
+ai_payload.py — Kompakt, token-budgetteret payload til AI-analysen
+===================================================================
+build_payload() sendte hele positions- og kandidatlisten som
+json.dumps(indent=2) — indrykning, gentagne feltnavne og tomme felter
+udgjorde over halvdelen af input-tokens. compile_payload() gør det samme
+indhold billigere:
+
+  1. kompakt kodning: tomme felter (None, "", "—", false, []) udelades,
+     tal rundes til 1 decimal, ingen indrykning
+  2. lister af ens dicts bliver tabeller: {"kolonner": [...], "rækker": [[...]]}
+     — feltnavnene står én gang i stedet for én gang pr. række
+  3. er payloaden stadig over budgettet for mode'en, trimmes i fast
+     rækkefølge: de svageste kandidater, små sektorer (samles i "Øvrige")
+     og felter med lav værdi for prompten
+
+Signaler, tickers, afkast, momentum, trail stop og høj korrelation
+trimmes aldrig — det er dem prompterne bygger på.
+
+Tokens anslås som ~4 tegn pr. token (samme skøn som ai_client).
+
+Brug:
+  from ai_payload import compile_payload
+  tekst, info = compile_payload(payload, mode="weekly")
+"""
+
+import json
+
+# Token-budget pr. mode (kun payloaden — prompten kommer oveni)
+BUDGETS = {
+    "alarm":  600,
+    "weekly": 900,
+}
+
+CHARS_PER_TOKEN = 4
+MIN_KANDIDATER  = {"alarm": 1, "weekly": 2}   # Prompterne nævner 1-2 kandidater
+MIN_SEKTOR_PCT  = 10                           # Mindre sektorer samles i "Øvrige"
+
+# Felter der fjernes (i rækkefølge) hvis budgettet stadig ikke holder
+TRIM_FIELDS = {
+    "alarm": [
+        ("kandidater", "navn"), ("kandidater", "sektor"), ("kandidater", "er_ny"),
+        ("positioner", "navn"), ("positioner", "rsi"), ("positioner", "depot"),
+    ],
+    "weekly": [
+        ("kandidater", "navn"), ("kandidater", "sektor"), ("positioner", "rsi"),
+        ("positioner", "navn"), ("positioner", "hwm_afstand"), ("kandidater", "er_ny"),
+    ],
+}
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+# ==========================================
+# KOMPAKT KODNING
+# ==========================================
+
+def compact(value):
+    """Fjerner tomme felter og runder tal — rekursivt."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            v = compact(v)
+            if v is None or v is False or v in ("", "—") or (isinstance(v, (list, dict)) and not v):
+                continue
+            out[k] = v
+        return out
+    if isinstance(value, list):
+        return [compact(v) for v in value]
+    if isinstance(value, float):
+        r = round(value, 1)
+        return int(r) if r.is_integer() else r
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def tabulate(rows):
+    """[{...}, {...}] → {"kolonner": [...], "rækker": [[...], ...]} (manglende felt = null)."""
+    if len(rows) < 2 or not all(isinstance(r, dict) for r in rows):
+        return rows
+    kolonner = []
+    for r in rows:
+        kolonner += [k for k in r if k not in kolonner]
+    return {"kolonner": kolonner, "rækker": [[r.get(k) for k in kolonner] for r in rows]}
+
+
+def encode(payload):
+    """Kompakt JSON — lister af dicts som tabeller, ingen indrykning."""
+    tabel = {k: tabulate(v) if isinstance(v, list) else v for k, v in payload.items()}
+    return json.dumps(tabel, ensure_ascii=False, separators=(",", ":"))
+
+
+# ==========================================
+# TRIMNING
+# ==========================================
+
+def _kandidat_prioritet(k):
+    """Højst = vigtigst: ASK-egnet, ny denne uge, derefter momentum."""
+    momentum = k.get("momentum")
+    return (bool(k.get("ask_egnet")), bool(k.get("er_ny")),
+            momentum if isinstance(momentum, (int, float)) else 0)
+
+
+def _trim_steps(payload, mode):
+    """
+    Generator over trimningstrin. Hvert trin ændrer payload og giver en
+    kort beskrivelse — kalderen stopper så snart budgettet holder.
+    """
+    kandidater = payload.get("kandidater", [])
+    while len(kandidater) > MIN_KANDIDATER.get(mode, 1):
+        svageste = min(range(len(kandidater)), key=lambda i: _kandidat_prioritet(kandidater[i]))
+        fjernet  = kandidater.pop(svageste)
+        yield f"kandidat {fjernet.get('ticker', '?')}"
+
+    sektorer = payload.get("risiko", {}).get("sektor_fordeling")
+    if sektorer:
+        små = {k: v for k, v in sektorer.items()
+               if isinstance(v, (int, float)) and v < MIN_SEKTOR_PCT}
+        if len(små) > 1:
+            for k in små:
+                del sektorer[k]
+            sektorer["Øvrige"] = round(sum(små.values()), 1)
+            yield f"{len(små)} små sektorer → Øvrige"
+
+    for liste, felt in TRIM_FIELDS.get(mode, []):
+        rows = payload.get(liste, [])
+        if any(felt in r for r in rows):
+            for r in rows:
+                r.pop(felt, None)
+            yield f"{liste}.{felt}"
+
+
+def compile_payload(payload, mode="weekly", budget=None, verbose=True):
+    """
+    Kompakt tekst til prompten + info om besparelsen:
+      {"før", "efter", "budget", "trimmet": [...]}  (tokens)
+    "før" er den gamle json.dumps(indent=2)-størrelse.
+    """
+    budget = budget or BUDGETS.get(mode, BUDGETS["weekly"])
+    før    = estimate_tokens(json.dumps(payload, ensure_ascii=False, indent=2))
+
+    # Topniveauet beholdes — "ingen signaler" er også information
+    data  = {k: compact(v) for k, v in payload.items()}
+    tekst = encode(data)
+    trimmet = []
+    if estimate_tokens(tekst) > budget:
+        for trin in _trim_steps(data, mode):
+            trimmet.append(trin)
+            tekst = encode(data)
+            if estimate_tokens(tekst) <= budget:
+                break
+
+    efter = estimate_tokens(tekst)
+    info  = {"før": før, "efter": efter, "budget": budget, "trimmet": trimmet}
+    if verbose:
+        spar = (1 - efter / før) * 100 if før else 0
+        over = " — stadig over budget" if efter > budget else ""
+        print(f"   📦 Payload ({mode}): {før} → {efter} tokens (-{spar:.0f}%, budget {budget}){over}")
+        if trimmet:
+            print(f"      trimmet: {', '.join(trimmet)}")
+    return tekst, info
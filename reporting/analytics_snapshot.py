@@ -0,0 +1,209 @@
+"""
+analytics_snapshot.py — Fælles analyse-snapshot for PFA og ETF
+===============================================================
+Daily, weekly og monthly beregnede hver især de samme nøgletal pr. fond
+(MA, RSI, kryds, trend, drawdown, ÅTD) ud fra de samme filer. Snapshottet
+beregner dem én gang pr. datasæt og data-version og gemmer resultatet:
+
+  data/pfa_analytics.json
+  data/etf_analytics.json
+  {"_meta":  {"dataset", "fingerprint", "data_date", "generated", "funds"},
+   "funds":  {isin: {"nav", "ma200", "ma_val", "ma_label", "rsi", ...}}}
+
+Fingerprintet er sha256 over inputfilerne (latest, historik, backfill-
+overlay), beregningskoden og årstallet (ÅTD). Så længe det passer,
+genbruges snapshottet — fx når weekly og monthly kører lørdag på fredagens
+data. Rapport-builderne læser kun snapshottet og renderer.
+
+Builderne beholder det der er kørsels-tilstand og ikke nøgletal:
+HWM/trail stop, gemt trend_state og rangering.
+
+Brug:
+  python reporting/analytics_snapshot.py pfa           # byg/genbrug
+  python reporting/analytics_snapshot.py etf --force   # byg forfra
+"""
+
+import argparse
+import hashlib
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_store import load_json, save_json, load_latest, load_history
+from utils import (
+    get_ma, get_best_ma, get_rsi, get_volatility,
+    calculate_drawdown, calculate_ytd,
+    get_cross_signal, get_trend_state,
+)
+from pfa_backfill import OVERLAY_FILE, load_overlay, indicator_series, with_nav
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Inputfiler pr. datasæt — ETF har intet backfill-overlay
+SOURCES = {
+    "pfa": {
+        "latest":  ROOT / "data/pfa_latest.json",
+        "history": ROOT / "data/pfa_history.json",
+        "overlay": OVERLAY_FILE,
+    },
+    "etf": {
+        "latest":  ROOT / "data/etf_latest.json",
+        "history": ROOT / "data/etf_history.json",
+        "overlay": None,
+    },
+}
+SNAPSHOT_FILES = {
+    "pfa": ROOT / "data/pfa_analytics.json",
+    "etf": ROOT / "data/etf_analytics.json",
+}
+
+_MEMO = {}   # dataset → snapshot (genbruges i samme proces, fx render_all.py)
+
+# Ændres beregningen, skal snapshottet bygges forfra
+CODE_FILES = [
+    Path(__file__).resolve(),
+    Path(__file__).resolve().parent / "utils.py",
+    Path(__file__).resolve().parent / "pfa_backfill.py",
+]
+
+
+# ==========================================
+# FINGERPRINT
+# ==========================================
+
+def fingerprint(dataset):
+    """sha256 over inputfiler + beregningskode + årstal (ÅTD afhænger af året)."""
+    h = hashlib.sha256(f"{dataset}:{datetime.now().year}".encode("ascii"))
+    for path in CODE_FILES:
+        h.update(hashlib.sha256(path.read_bytes()).digest())
+    for name in ("latest", "history", "overlay"):
+        path = SOURCES[dataset][name]
+        h.update(name.encode("ascii"))
+        if path is not None and path.exists():
+            h.update(hashlib.sha256(path.read_bytes()).digest())
+        else:
+            h.update(b"-")
+    return h.hexdigest()
+
+
+# ==========================================
+# BEREGNING
+# ==========================================
+
+def fund_metrics(item, history, overlay):
+    """
+    Alle nøgletal for én fond.
+
+    MA, kryds og trend beregnes på MA-serien (inkl. backfill for PFA),
+    RSI, volatilitet og drawdown kun på rigtige punkter. Dagens NAV er
+    altid sidste punkt i begge serier.
+    """
+    isin = item["isin"]
+    nav  = item.get("nav") or 0
+
+    ma_base, base = indicator_series(history, overlay, isin)
+    ma_prices = with_nav(ma_base, nav)
+    prices    = with_nav(base, nav)
+
+    ma_val, ma_label = get_best_ma(ma_prices)
+    return {
+        "nav":         nav,
+        "nav_date":    item.get("nav_date"),
+        # Antal historikpunkter før dagens NAV (0 = ingen historik endnu)
+        "points":      len(base),
+        "ma_points":   len(ma_base),
+        "prev_nav":    prices[-2] if len(prices) > 1 else nav,
+        "first_price": prices[0],
+        "ma20":        get_ma(ma_prices, 20),
+        "ma50":        get_ma(ma_prices, 50),
+        "ma200":       get_ma(ma_prices, 200),
+        "ma_val":      ma_val,
+        "ma_label":    ma_label,
+        "cross":       get_cross_signal(ma_prices),
+        "trend_state": get_trend_state(ma_prices),
+        "rsi":         get_rsi(prices, 14),
+        "volatility":  get_volatility(prices, 20),
+        "drawdown":    calculate_drawdown(prices),
+        "ytd":         calculate_ytd(history.get(isin, {})),
+    }
+
+
+def build_snapshot(dataset, latest, history, overlay, fp=None):
+    funds = {}
+    for item in latest:
+        if item.get("isin"):
+            funds[item["isin"]] = fund_metrics(item, history, overlay)
+
+    nav_dates = [m["nav_date"] for m in funds.values() if m["nav_date"]]
+    return {
+        "_meta": {
+            "dataset":     dataset,
+            "fingerprint": fp or fingerprint(dataset),
+            "data_date":   max(nav_dates) if nav_dates else None,
+            "generated":   datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "funds":       len(funds),
+        },
+        "funds": funds,
+    }
+
+
+# ==========================================
+# FIL
+# ==========================================
+
+def save_snapshot(dataset, snapshot):
+    save_json(SNAPSHOT_FILES[dataset], snapshot, indent=1)
+
+
+def get_snapshot(dataset, latest=None, history=None, overlay=None, force=False):
+    """
+    Returnerer snapshottet for datasættet — genbruges hvis inputfilerne
+    er uændrede, ellers beregnes og gemmes det.
+
+    latest / history / overlay: kan gives direkte (fx fra pfa_pipeline.py)
+    så filerne ikke indlæses igen ved cache-miss. De skal svare til filerne
+    på disk (som fingerprintet beregnes ud fra).
+    """
+    fp = fingerprint(dataset)
+    if not force:
+        memo = _MEMO.get(dataset)
+        if memo and memo["_meta"]["fingerprint"] == fp:
+            return memo
+        cached = load_json(SNAPSHOT_FILES[dataset], None)
+        if cached and cached.get("_meta", {}).get("fingerprint") == fp:
+            meta = cached["_meta"]
+            print(f"♻️  Analyse-snapshot ({dataset}) genbrugt: "
+                  f"{meta['funds']} fonde, data {meta['data_date']} (beregnet {meta['generated']})")
+            _MEMO[dataset] = cached
+            return cached
+
+    src = SOURCES[dataset]
+    if latest is None:
+        latest = load_latest(dataset)
+    if history is None:
+        history = load_history(dataset)
+    if overlay is None:
+        overlay = load_overlay() if src["overlay"] is not None else {}
+
+    start    = datetime.now()
+    snapshot = build_snapshot(dataset, latest, history, overlay, fp=fp)
+    save_snapshot(dataset, snapshot)
+    _MEMO[dataset] = snapshot
+    elapsed  = (datetime.now() - start).total_seconds()
+    print(f"📊 Analyse-snapshot ({dataset}) beregnet: "
+          f"{snapshot['_meta']['funds']} fonde på {elapsed:.2f} sek")
+    return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Byg fælles analyse-snapshot")
+    parser.add_argument("dataset", choices=sorted(SOURCES))
+    parser.add_argument("--force", action="store_true", help="Byg forfra selv om inputfilerne er uændrede")
+    args = parser.parse_args()
+    get_snapshot(args.dataset, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+bench_imports.py — Import-tid for rapport-scripts
+==================================================
+Måler hvor lang tid det tager at importere hvert script (python -X importtime
+i en frisk proces) og hvilke pakker der koster mest. Resultatet gemmes i
+build/import_times.json (committes ikke) og bruges som lokal reference,
+så ændringer i opstartstid kan sammenlignes mellem kørsler.
+
+Tunge pakker (yfinance/pandas, numpy, pdfplumber, justetf_scraping,
+requests, smtplib) skal importeres inde i de funktioner der bruger dem —
+alert- og valideringskørsler skal starte på millisekunder.
+
+Brug:
+  python reporting/bench_imports.py               # mål og sammenlign med sidst
+  python reporting/bench_imports.py --save        # mål og gem som ny reference
+  python reporting/bench_imports.py pfa_send_alert etf_send_alert
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT         = Path(__file__).resolve().parents[1]
+REPORTING    = Path(__file__).resolve().parent
+RESULTS_FILE = ROOT / "build/import_times.json"
+
+SCRIPTS = [
+    "pfa_send_alert",
+    "etf_send_alert",
+    "pfa_validate_data",
+    "pfa_freshness",
+    "analytics_snapshot",
+    "pfa_build_daily_report",
+    "pfa_build_weekly_report",
+    "pfa_build_monthly_report",
+    "etf_build_weekly",
+    "etf_build_monthly",
+    "render_all",
+    "pfa_pipeline",
+    "pfa_archive",
+    "etf_provider",
+    "etf_spejder",
+]
+REPEATS = 3     # Bedste af N — første kørsel betaler for kolde .pyc-filer
+TOP_N   = 3     # Tungeste pakker pr. script
+
+
+def parse_importtime(stderr, module):
+    """
+    Returnerer (ms for modulet inkl. afhængigheder, {pakke: ms}) ud fra
+    -X importtime-output. Pakke-tiden er den største kumulative tid for en
+    post i pakken — dvs. det importen af pakken kostede første gang.
+    """
+    total    = None
+    packages = {}
+    startup  = True   # Alt til og med "site" er fortolkerens egen opstart
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line.split("|")
+            cumulative_us = int(cumulative)
+        except ValueError:
+            continue   # overskriftslinjen
+        name = name.strip()
+        if startup:
+            startup = name != "site"
+            continue
+        if name == module:
+            total = cumulative_us / 1000
+            continue
+        pkg = name.split(".")[0]
+        packages[pkg] = max(packages.get(pkg, 0), cumulative_us / 1000)
+    return total, packages
+
+
+def measure(module, repeats=REPEATS):
+    """Bedste af repeats målinger for ét script. None hvis importen fejler."""
+    best = None
+    for _ in range(repeats):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPORTING, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            output = [l for l in (proc.stdout + proc.stderr).splitlines() if not l.startswith("import time:")]
+            print(f"⚠️  {module} kunne ikke importeres: {output[-1] if output else proc.returncode}")
+            return None
+        total, packages = parse_importtime(proc.stderr, module)
+        if total is not None and (best is None or total < best[0]):
+            best = (total, packages)
+
+    total, packages = best
+    local = {p.stem for p in REPORTING.glob("*.py")}
+    heavy = sorted(
+        ((pkg, ms) for pkg, ms in packages.items() if pkg not in local and pkg != module),
+        key=lambda x: -x[1],
+    )[:TOP_N]
+    return {"ms": round(total, 1), "top": [[pkg, round(ms, 1)] for pkg, ms in heavy]}
+
+
+def load_results():
+    if not RESULTS_FILE.exists():
+        return {}
+    try:
+        with open(RESULTS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️  Kunne ikke læse {RESULTS_FILE}: {e}")
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mål import-tid for rapport-scripts")
+    parser.add_argument("scripts", nargs="*", help="Scripts der skal måles (standard: alle)")
+    parser.add_argument("--save", action="store_true", help=f"Gem som reference i {RESULTS_FILE.name}")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    args = parser.parse_args()
+
+    previous = load_results().get("scripts", {})
+    results  = {}
+
+    print(f"\n⏱️  Import-tid (bedste af {args.repeats}, ms)")
+    print(f"   {'script':<26} {'ms':>8} {'før':>8}   tungeste pakker")
+    for module in args.scripts or SCRIPTS:
+        r = measure(module, max(1, args.repeats))
+        if r is None:
+            continue
+        results[module] = r
+        before = previous.get(module, {}).get("ms")
+        heavy  = ", ".join(f"{pkg} {ms:.0f}" for pkg, ms in r["top"])
+        print(f"   {module:<26} {r['ms']:8.1f} {before if before is not None else '—':>8}   {heavy}")
+
+    if args.save:
+        RESULTS_FILE.parent.mkdir(exist_ok=True)
+        data = {
+            "generated": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "python":    sys.version.split()[0],
+            "scripts":   {**previous, **results},
+        }
+        with open(RESULTS_FILE, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Gemt i {RESULTS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+data_store.py — Fælles læsning og skrivning af JSON-filer
+==========================================================
+load_json/save_json var kopieret ind i næsten hvert script med små
+forskelle ('_'-nøgler filtreret eller ej, fejl printet eller ej,
+ensure_ascii). Her samles det:
+
+  - læse-cache pr. proces med nøglen (sti, mtime, størrelse) — samme fil
+    læses kun fra disk én gang, så længe den er uændret
+  - orjson når den er installeret (ellers json) — samme output som
+    json.dump(indent=2, ensure_ascii=False). orjson skriver NaN/Infinity
+    som null, så data med ikke-endelige tal skrives med json (NaN som før)
+  - atomisk skrivning (tmp-fil + os.replace) — en afbrudt kørsel efterlader
+    aldrig en halvt skrevet datafil
+  - accessors pr. filtype: watchlist, portfolio, latest, history, hwm —
+    med fast sti, rigtig standardværdi og typetjek
+
+Hvert kald returnerer sin egen kopi (parset fra de cachede bytes), så
+kalderen frit kan ændre i data. shared=True giver det cachede objekt
+direkte — kun til data der ikke ændres.
+
+Brug:
+  from data_store import load_json, save_json, load_latest, load_hwm, save_hwm
+  latest = load_latest("etf")
+  hwm    = load_hwm("pfa")
+  save_hwm("pfa", hwm)
+"""
+
+import json
+import math
+import os
+import threading
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Faste filer pr. type og datasæt
+PATHS = {
+    "watchlist": {"etf": ROOT / "config/etf_watchlist.json"},
+    "portfolio": {"pfa": ROOT / "config/pfa_portfolio.json", "etf": ROOT / "config/etf_portfolio.json"},
+    "latest":    {"pfa": ROOT / "data/pfa_latest.json",      "etf": ROOT / "data/etf_latest.json"},
+    "history":   {"pfa": ROOT / "data/pfa_history.json",     "etf": ROOT / "data/etf_history.json"},
+    "hwm":       {"pfa": ROOT / "data/pfa_hwm.json",         "etf": ROOT / "data/etf_hwm.json",
+                  "portfolio": ROOT / "data/portfolio_hwm.json"},
+}
+
+_CACHE = {}                    # sti → [(mtime_ns, størrelse), bytes, parset objekt eller None]
+_LOCK  = threading.Lock()      # render_all.py læser fra flere tråde
+_STATS = {"hits": 0, "misses": 0}
+
+
+# ==========================================
+# JSON-BACKEND
+# ==========================================
+
+def _loads(raw):
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except ValueError:
+            pass   # fx NaN — som json accepterer
+    return json.loads(raw)
+
+
+def _has_nonfinite(data):
+    """True hvis data indeholder NaN eller ±Infinity (iterativt — ingen rekursionsgrænse)."""
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, float):
+            if not math.isfinite(obj):
+                return True
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return False
+
+
+def _dumps(data, indent, ensure_ascii):
+    """
+    Serialiserer til bytes. orjson bruges kun hvor output er identisk med
+    json — ikke ved ikke-endelige tal, som orjson ville skrive som null.
+    """
+    if orjson is not None and indent == 2 and not ensure_ascii and not _has_nonfinite(data):
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        except TypeError:
+            pass   # fx ikke-str nøgler
+    return json.dumps(data, indent=indent, ensure_ascii=ensure_ascii).encode("utf-8")
+
+
+# ==========================================
+# LÆS / SKRIV
+# ==========================================
+
+def _stat_key(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def read_json(path, shared=False):
+    """
+    Læser en JSON-fil via cachen. Fejl (manglende fil, ugyldig JSON)
+    kastes videre — brug load_json() for en standardværdi i stedet.
+    """
+    path = Path(path)
+    key  = _stat_key(path)
+    with _LOCK:
+        entry = _CACHE.get(path)
+        if entry and entry[0] == key:
+            _STATS["hits"] += 1
+            if shared:
+                if entry[2] is None:
+                    entry[2] = _loads(entry[1])
+                return entry[2]
+            return _loads(entry[1])
+
+        _STATS["misses"] += 1
+        raw  = path.read_bytes()
+        data = _loads(raw)
+        # Det returnerede objekt må kalderen ændre — det delte parses først ved behov
+        _CACHE[path] = [key, raw, data if shared else None]
+        return data
+
+
+def load_json(path, default=None, strip_meta=False, shared=False):
+    """
+    Læser en JSON-fil — returnerer default hvis den mangler eller ikke kan læses.
+    strip_meta: fjerner '_'-nøgler (kommentarer/metadata) fra et dict.
+    """
+    try:
+        data = read_json(path, shared=shared)
+    except FileNotFoundError:
+        return default
+    except Exception as e:
+        print(f"⚠️  Kunne ikke læse {path}: {e}")
+        return default
+    if strip_meta and isinstance(data, dict):
+        data = {k: v for k, v in data.items() if not k.startswith("_")}
+    return data
+
+
+def save_json(path, data, indent=2, ensure_ascii=False):
+    """Skriver atomisk og opdaterer cachen, så næste læsning ikke rammer disken."""
+    path = Path(path)
+    raw  = _dumps(data, indent, ensure_ascii)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(raw)
+    os.replace(tmp, path)
+    with _LOCK:
+        _CACHE[path] = [_stat_key(path), raw, None]
+
+
+def cache_stats():
+    return f"data-cache: {_STATS['hits']} hits, {_STATS['misses']} misses, {len(_CACHE)} filer"
+
+
+# ==========================================
+# ACCESSORS
+# ==========================================
+
+def _load_typed(kind, dataset, expected, shared=False, strip_meta=False):
+    path = PATHS[kind][dataset]
+    data = load_json(path, None, strip_meta=strip_meta, shared=shared)
+    if data is None:
+        return expected()
+    if not isinstance(data, expected):
+        print(f"⚠️  {path.name}: forventede {expected.__name__}, fik {type(data).__name__} — ignoreres")
+        return expected()
+    return data
+
+
+def load_watchlist(dataset="etf", shared=False):
+    """{isin: {...}} uden '_'-kommentarfelter."""
+    return _load_typed("watchlist", dataset, dict, shared, strip_meta=True)
+
+
+def load_portfolio(dataset, shared=False):
+    """{isin: {...}} fra config/<dataset>_portfolio.json (uden '_'-felter)."""
+    return _load_typed("portfolio", dataset, dict, shared, strip_meta=True)
+
+
+def load_latest(dataset, shared=False):
+    """[{isin, nav, nav_date, ...}] fra data/<dataset>_latest.json."""
+    return _load_typed("latest", dataset, list, shared)
+
+
+def load_history(dataset, shared=False):
+    """{isin: {"YYYY-MM-DD": kurs}} fra data/<dataset>_history.json."""
+    return _load_typed("history", dataset, dict, shared)
+
+
+def load_hwm(dataset, shared=False):
+    """HWM-data for "pfa", "etf" eller "portfolio"."""
+    return _load_typed("hwm", dataset, dict, shared)
+
+
+def save_latest(dataset, data):
+    save_json(PATHS["latest"][dataset], data)
+
+
+def save_history(dataset, data):
+    save_json(PATHS["history"][dataset], data)
+
+
+def save_hwm(dataset, data):
+    save_json(PATHS["hwm"][dataset], data)
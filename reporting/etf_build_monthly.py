@@ -9,25 +9,31 @@ Genererer build/etf_monthly.html med:
   - Strategiske handlingssignaler
   - Handelshistorik fra config/trades.json
 
+Nøgletal pr. ETF læses fra analyse-snapshottet (analytics_snapshot.py) —
+samme data-version som weekly genbruger snapshottet. Porteføljens
+drawdown følger den positionsvægtede TWR fra portfolio_valuation.py.
+
 Køres af .github/workflows/etf_monthly.yml (lørdag kl. 07:30)
 """
 
-import json
 import sys
 from pathlib import Path
 from datetime import datetime
-from jinja2 import Template
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
+from data_store import load_latest, load_watchlist, load_portfolio, load_hwm, save_hwm
+from templating import get_template, write_atomic
 from utils import (
-    get_ma, get_best_ma, get_rsi,
     get_trend_velocity, get_momentum_status,
-    get_trend_state, get_trend_shift,
-    check_trail_stop, is_trading_day,
+    get_trend_shift_from_state,
 )
+from trail_engine import run_trail_stops
+from analytics_snapshot import get_snapshot
 from trades_summary import load_trades, get_summary, format_for_template
 from portfolio_hwm import load_portfolio_hwm, save_portfolio_hwm, update_and_get_drawdown, format_drawdown_for_template
+from portfolio_hwm import sync_curve, LOCK as PORTFOLIO_HWM_LOCK
+from portfolio_valuation import value_portfolio
 from sector_heatmap import build_heatmap, get_concentration_warning
 from ai_analysis import get_weekly_analyse, get_markedskontekst
 
@@ -36,10 +42,7 @@ from ai_analysis import get_weekly_analyse, get_markedskontekst
 # ==========================================
 ROOT           = Path(__file__).resolve().parents[1]
 LATEST_FILE    = ROOT / "data/etf_latest.json"
-HISTORY_FILE   = ROOT / "data/etf_history.json"
 WATCHLIST_FILE = ROOT / "config/etf_watchlist.json"
-PORTFOLIO_FILE = ROOT / "config/etf_portfolio.json"
-HWM_FILE       = ROOT / "data/etf_hwm.json"
 TEMPLATE_FILE  = ROOT / "templates/etf_monthly.html.j2"
 REPORT_FILE    = ROOT / "build/etf_monthly.html"
 TRADES_FILE    = ROOT / "config/trades.json"
@@ -64,30 +67,6 @@ BENCHMARK_ISIN = "IE00B4L5Y983"  # IWDA — iShares Core MSCI World
 # HJÆLPEFUNKTIONER
 # ==========================================
 
-def load_json(path, default):
-    if not path.exists():
-        return default
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"⚠️  Kunne ikke læse {path}: {e}")
-        return default
-
-def load_hwm():
-    if HWM_FILE.exists():
-        try:
-            with open(HWM_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return {}
-
-def save_hwm(hwm_data):
-    HWM_FILE.parent.mkdir(exist_ok=True)
-    with open(HWM_FILE, "w", encoding="utf-8") as f:
-        json.dump(hwm_data, f, indent=2)
-
 def get_ranking_data(latest_list):
     sorted_list = sorted(latest_list, key=lambda x: x.get('return_1m') or -999, reverse=True)
     rank_map = {item['isin']: index + 1 for index, item in enumerate(sorted_list)}
@@ -98,20 +77,20 @@ def get_ranking_data(latest_list):
 # HOVEDFUNKTION
 # ==========================================
 
-def build_monthly():
+def build_monthly(latest=None):
+    """latest: kan gives direkte (fx fra render_all.py), ellers læses filen."""
     print("🔄 Starter generering af ETF månedlig rapport...")
 
-    for f in [LATEST_FILE, HISTORY_FILE, WATCHLIST_FILE, TEMPLATE_FILE]:
+    for f in [LATEST_FILE, WATCHLIST_FILE, TEMPLATE_FILE]:
         if not f.exists():
             print(f"❌ FEJL: Mangler fil: {f}")
             return
 
-    latest    = load_json(LATEST_FILE, [])
-    history   = load_json(HISTORY_FILE, {})
-    watchlist = load_json(WATCHLIST_FILE, {})
-    portfolio = load_json(PORTFOLIO_FILE, {})
-    watchlist = {k: v for k, v in watchlist.items() if not k.startswith('_')}
-    portfolio = {k: v for k, v in portfolio.items() if not k.startswith('_')}
+    if latest is None:
+        latest = load_latest("etf")
+    metrics   = get_snapshot("etf", latest=latest)["funds"]
+    watchlist = load_watchlist()
+    portfolio = load_portfolio("etf")
     benchmark_isins = {k for k, v in watchlist.items() if v.get('_benchmark')}
 
     rank_map, total_count = get_ranking_data(latest)
@@ -122,11 +101,12 @@ def build_monthly():
     timestamp   = now.strftime('%d-%m-%Y %H:%M')
     week_number = now.strftime('%V')
 
-    hwm_data          = load_hwm()
+    hwm_data          = load_hwm("etf")
     trail_stop_alerts = []
     active_rows       = []
     sold_rows         = []
     active_returns    = []
+    trail_positions   = []
 
     for isin, p_info in portfolio.items():
         if isin not in latest_map:
@@ -140,14 +120,9 @@ def build_monthly():
 
         total_return = round(((curr_p - buy_p) / buy_p * 100), 2) if buy_p > 0 else 0
 
-        p_dict = history.get(isin, {})
-        sorted_dates = [d for d in sorted(p_dict.keys()) if is_trading_day(d)]
-        prices = [p_dict[d] for d in sorted_dates]
-        if not prices or prices[-1] != curr_p:
-            prices.append(curr_p)
-
-        rsi_val          = get_rsi(prices, 14)
-        ma_val, ma_label = get_best_ma(prices)
+        m                = metrics[isin]
+        rsi_val          = m['rsi']
+        ma_val, ma_label = m['ma_val'], m['ma_label']
 
         t_label, t_class = get_trend_velocity(
             official.get('return_1w') or 0,
@@ -159,8 +134,8 @@ def build_monthly():
         )
 
         prev_trend  = hwm_data.get(isin, {}).get('trend_state')
-        t_state     = get_trend_state(prices)
-        trend_shift = get_trend_shift(prices, prev_trend)
+        t_state     = m['trend_state']
+        trend_shift = get_trend_shift_from_state(t_state, prev_trend)
 
         if isin in hwm_data:
             hwm_data[isin]['trend_state'] = t_state
@@ -200,21 +175,27 @@ def build_monthly():
             active_rows.append(fund_data)
             active_returns.append(total_return)
 
-            hwm_entry, alert = check_trail_stop(
-                isin, curr_p, buy_p, hwm_data, today_str,
-                get_trail_stop_pct(official.get('volatility'))
-            )
-            hwm_data[isin] = hwm_entry
-            if alert:
-                alert["name"] = p_info.get('name', isin)
-                trail_stop_alerts.append(alert)
-                print(f"🔔 TRAIL STOP: {alert['name']} faldet {alert['fall_pct']}% fra top")
+            trail_positions.append({
+                "isin": isin, "curr": curr_p, "buy": buy_p,
+                "trail_pct": get_trail_stop_pct(official.get('volatility')),
+            })
         else:
             fund_data["sell_date"]  = p_info.get('sell_date', 'N/A')
             fund_data["sell_price"] = p_info.get('sell_price', 'N/A')
             sold_rows.append(fund_data)
 
-    save_hwm(hwm_data)
+    # Trail Stop for alle aktive i ét kald — efter løkken, så trend_state
+    # er sat i hwm_data som før
+    trail_entries, trail_alerts = run_trail_stops(trail_positions, hwm_data, today_str)
+    hwm_data.update(trail_entries)
+    for p in trail_positions:
+        alert = trail_alerts.get(p["isin"])
+        if alert:
+            alert["name"] = portfolio[p["isin"]].get('name', p["isin"])
+            trail_stop_alerts.append(alert)
+            print(f"🔔 TRAIL STOP: {alert['name']} faldet {alert['fall_pct']}% fra top")
+
+    save_hwm("etf", hwm_data)
 
     # --- BENCHMARK ---
     benchmark_item   = latest_map.get(BENCHMARK_ISIN, {})
@@ -265,9 +246,16 @@ def build_monthly():
     trades_data = format_for_template(etf_summary)
 
     # --- PORTEFØLJE DRAWDOWN ---
-    portfolio_hwm = load_portfolio_hwm(str(PORTFOLIO_HWM_FILE))
-    dd_raw = update_and_get_drawdown(portfolio_hwm, "etf", today_str, round(avg_port_return, 2))
-    save_portfolio_hwm(portfolio_hwm, str(PORTFOLIO_HWM_FILE))
+    # Positionsvægtet TWR fra handlerne — snittet pr. fond kun uden handler
+    valuation = value_portfolio("etf", trades=trades)
+    with PORTFOLIO_HWM_LOCK:
+        portfolio_hwm = load_portfolio_hwm(str(PORTFOLIO_HWM_FILE))
+        if valuation:
+            sync_curve(portfolio_hwm, "etf", valuation["kurve"]["datoer"], valuation["kurve"]["twr"])
+            dd_raw = update_and_get_drawdown(portfolio_hwm, "etf", valuation["dato"], valuation["twr_pct"])
+        else:
+            dd_raw = update_and_get_drawdown(portfolio_hwm, "etf", today_str, round(avg_port_return, 2))
+        save_portfolio_hwm(portfolio_hwm, str(PORTFOLIO_HWM_FILE))
     drawdown_data = format_drawdown_for_template(dd_raw)
 
     # --- SEKTOR HEATMAP ---
@@ -304,7 +292,7 @@ def build_monthly():
         print(f"❌ Template mangler: {TEMPLATE_FILE}")
         return
 
-    template = Template(TEMPLATE_FILE.read_text(encoding="utf-8"))
+    template = get_template(TEMPLATE_FILE.name)
     html = template.render(
         timestamp            = timestamp,
         week_number          = week_number,
@@ -328,8 +316,7 @@ def build_monthly():
         markedskontekst      = markedskontekst,
     )
 
-    REPORT_FILE.parent.mkdir(exist_ok=True)
-    REPORT_FILE.write_text(html, encoding="utf-8")
+    write_atomic(REPORT_FILE, html)
     print(f"✅ ETF Månedlig rapport færdig (Uge {week_number})")
     if trail_stop_alerts:
         print(f"   ⚠️  {len(trail_stop_alerts)} trail stop-advarsel(er)")
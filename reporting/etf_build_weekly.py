@@ -7,25 +7,27 @@ Genererer build/etf_weekly.html med:
   - Top 5 op/ned i universet
   - Momentum-chart over alle ETF'er
 
+Nøgletal pr. ETF (MA, RSI, kryds, trend, drawdown) læses fra
+analyse-snapshottet (analytics_snapshot.py) og deles med monthly.
+Ugens afkast er positionsvægtet (TWR fra portfolio_valuation.py).
+
 Køres af .github/workflows/etf_weekly.yml (lørdag kl. 07:00)
 """
 
-import json
 import sys
 from pathlib import Path
 from datetime import datetime
-from jinja2 import Template
 
 # Tilføj reporting/ til Python-stien så utils.py kan importeres
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from utils import (
-    get_ma, get_best_ma, get_rsi,
-    calculate_drawdown, calculate_ytd,
-    get_cross_signal, get_trend_state,
-    check_trail_stop, is_trading_day,
-    get_trail_stop_pct,
+from data_store import (
+    load_json, load_latest, load_history, load_watchlist, load_portfolio, load_hwm, save_hwm,
 )
+from templating import get_template, write_atomic
+from trail_engine import run_trail_stops
+from analytics_snapshot import get_snapshot
+from portfolio_valuation import value_portfolio, period_return
 from sector_heatmap import build_heatmap, get_concentration_warning, build_correlation_table
 from ai_analysis import get_weekly_analyse, get_markedskontekst
 
@@ -36,8 +38,6 @@ ROOT           = Path(__file__).resolve().parents[1]
 LATEST_FILE    = ROOT / "data/etf_latest.json"
 HISTORY_FILE   = ROOT / "data/etf_history.json"
 WATCHLIST_FILE = ROOT / "config/etf_watchlist.json"
-PORTFOLIO_FILE = ROOT / "config/etf_portfolio.json"
-HWM_FILE       = ROOT / "data/etf_hwm.json"
 SPEJDER_FILE   = ROOT / "data/etf_spejder_hits.json"
 MOMENTUM_FILE  = ROOT / "data/etf_momentum_alerts.json"
 TEMPLATE_FILE  = ROOT / "templates/etf_weekly.html.j2"
@@ -47,23 +47,9 @@ REPORT_FILE    = ROOT / "build/etf_weekly.html"
 
 
 # ==========================================
-# HWM — fil-håndtering
+# FONDE UNDER PRES
 # ==========================================
 
-def load_hwm():
-    if HWM_FILE.exists():
-        try:
-            with open(HWM_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return {}
-
-def save_hwm(hwm_data):
-    HWM_FILE.parent.mkdir(exist_ok=True)
-    with open(HWM_FILE, "w", encoding="utf-8") as f:
-        json.dump(hwm_data, f, indent=2)
-
 def build_fonde_under_pres(portfolio, latest_map_or_rows):
     """
     Bygger 'Fonde under pres'-listen til ETF Weekly.
@@ -73,13 +59,8 @@ def build_fonde_under_pres(portfolio, latest_map_or_rows):
     Format pr. fond:
       { ticker, name, kriterium, momentum, category, dato_range }
     """
-    if not MOMENTUM_FILE.exists():
-        return []
-
-    try:
-        with open(MOMENTUM_FILE, 'r', encoding='utf-8') as f:
-            spam_data = json.load(f)
-    except Exception:
+    spam_data = load_json(MOMENTUM_FILE, None)
+    if not spam_data:
         return []
 
     # Byg kategori/momentum lookup fra rows (liste af row-dicts)
@@ -112,31 +93,14 @@ def build_fonde_under_pres(portfolio, latest_map_or_rows):
     # Sortér K1 øverst, K2 midt, K3 nederst
     result.sort(key=lambda x: x['kriterium'])
     return result
-    HWM_FILE.parent.mkdir(exist_ok=True)
-    with open(HWM_FILE, "w", encoding="utf-8") as f:
-        json.dump(hwm_data, f, indent=2)
-
-
-# ==========================================
-# HJÆLPEFUNKTIONER
-# ==========================================
-
-def load_json(path, default):
-    if not path.exists():
-        return default
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"⚠️  Kunne ikke læse {path}: {e}")
-        return default
 
 
 # ==========================================
 # HOVEDFUNKTION
 # ==========================================
 
-def build_weekly():
+def build_weekly(latest=None, history=None):
+    """latest / history: kan gives direkte (fx fra render_all.py), ellers læses filerne."""
     print("🔄 Starter generering af ETF ugerapport...")
 
     for f in [LATEST_FILE, HISTORY_FILE, WATCHLIST_FILE, TEMPLATE_FILE]:
@@ -144,12 +108,14 @@ def build_weekly():
             print(f"❌ FEJL: Mangler fil: {f}")
             return
 
-    latest    = load_json(LATEST_FILE, [])
-    history   = load_json(HISTORY_FILE, {})
-    watchlist = load_json(WATCHLIST_FILE, {})
-    portfolio = load_json(PORTFOLIO_FILE, {})
+    if latest is None:
+        latest = load_latest("etf")
+    if history is None:
+        history = load_history("etf")
+    watchlist = load_watchlist()
+    portfolio = load_portfolio("etf")
+    metrics   = get_snapshot("etf", latest=latest, history=history)["funds"]
 
-    watchlist = {k: v for k, v in watchlist.items() if not k.startswith('_')}
     # Benchmark-fonde må ikke vises i tabeller, top/bund eller Spejder
     benchmark_isins = {k for k, v in watchlist.items() if v.get('_benchmark')}
 
@@ -158,7 +124,7 @@ def build_weekly():
         if info.get("active", False)
     }
 
-    hwm_data          = load_hwm()
+    hwm_data          = load_hwm("etf")
 
     # Indlæs Spejder-hits hvis tilgængelige
     spejder_data     = load_json(SPEJDER_FILE, {})
@@ -179,32 +145,44 @@ def build_weekly():
     active_week_returns = []
     spejder_hits      = []
 
+    # --- TRAIL STOP (kun aktive) — alle positioner i ét kald ---
+    trail_positions = []
+    for item in latest:
+        isin      = item['isin']
+        cur_nav   = item.get('nav') or 0.0
+        buy_price = portfolio.get(isin, {}).get('buy_price', 0)
+        if (isin in benchmark_isins or not metrics[isin]['points']
+                or isin not in portfolio_isins or not buy_price or not cur_nav):
+            continue
+        trail_positions.append({
+            "isin":             isin,
+            "curr":             cur_nav,
+            "buy":              buy_price,
+            "volatility":       item.get('volatility'),
+            "rsi":              metrics[isin]['rsi'],
+            "total_return_pct": round(((cur_nav / buy_price) - 1) * 100, 2),
+        })
+    trail_entries, trail_alerts = run_trail_stops(trail_positions, hwm_data, today_str)
+    hwm_data.update(trail_entries)
+
     for item in latest:
         isin      = item['isin']
         # Spring benchmark-fonde over — de må ikke vises i tabellen
         if isin in benchmark_isins:
             continue
-        p_dict    = history.get(isin, {})
-
-        # Kun handelsdage
-        sorted_dates = [d for d in sorted(p_dict.keys()) if is_trading_day(d)]
-        p_list       = [p_dict[d] for d in sorted_dates]
-
-        if not p_list:
+        # Kun ETF'er med historik (handelsdage)
+        m = metrics[isin]
+        if not m['points']:
             continue
 
         cur_nav   = item.get('nav') or 0.0
         is_active = isin in portfolio_isins
 
-        # Sikr dagens NAV er med
-        if p_list[-1] != cur_nav:
-            p_list.append(cur_nav)
-
-        # --- TEKNISKE BEREGNINGER ---
-        ma_val, ma_label = get_best_ma(p_list)
-        rsi              = get_rsi(p_list, 14)
-        cross            = get_cross_signal(p_list)
-        dd               = calculate_drawdown(p_list)
+        # --- TEKNISKE NØGLETAL (analyse-snapshot) ---
+        ma_val, ma_label = m['ma_val'], m['ma_label']
+        rsi              = m['rsi']
+        cross            = m['cross']
+        dd               = m['drawdown']
 
         # Momentum — afstand til bedste MA
         if ma_val and cur_nav:
@@ -213,7 +191,7 @@ def build_weekly():
             momentum = round(item.get('return_1m') or 0.0, 2)
             ma_label = "1M proxy"
 
-        trend_state = get_trend_state(p_list)
+        trend_state = m['trend_state']
 
         # RSI alert
         rsi_alert = None
@@ -230,7 +208,7 @@ def build_weekly():
             total_ret = round(((cur_nav / buy_price) - 1) * 100, 2) if buy_price else 0.0
         else:
             buy_price = 0
-            total_ret = round(((cur_nav / p_list[0]) - 1) * 100, 2) if p_list else 0.0
+            total_ret = round(((cur_nav / m['first_price']) - 1) * 100, 2)
 
         if is_active:
             active_week_returns.append(week_change)
@@ -238,12 +216,7 @@ def build_weekly():
         # --- TRAIL STOP (kun aktive) ---
         trail_alert = None
         if is_active and buy_price and cur_nav:
-            etf_vol    = item.get('volatility')
-            trail_pct  = get_trail_stop_pct(etf_vol, rsi, total_return_pct=total_ret)
-            hwm_entry, trail_alert = check_trail_stop(
-                isin, cur_nav, buy_price, hwm_data, today_str, trail_pct
-            )
-            hwm_data[isin] = hwm_entry
+            trail_alert = trail_alerts.get(isin)
             if trail_alert:
                 trail_alert["name"] = portfolio[isin].get("name", item.get('name', isin))
                 trail_stop_alerts.append(trail_alert)
@@ -283,10 +256,12 @@ def build_weekly():
         # Spejder-logik er flyttet til etf_spejder.py
 
     # Gem opdaterede HWM
-    save_hwm(hwm_data)
+    save_hwm("etf", hwm_data)
 
-    # Aggregerede data
-    avg_portfolio_return = (
+    # Aggregerede data — ugens afkast positionsvægtet (TWR) når handlerne kan værdiansættes
+    valuation   = value_portfolio("etf") if active_week_returns else None
+    week_return = period_return(valuation) if valuation else None
+    avg_portfolio_return = week_return if week_return is not None else (
         sum(active_week_returns) / len(active_week_returns)
         if active_week_returns else 0.0
     )
@@ -306,8 +281,7 @@ def build_weekly():
     ]
 
     # Render template
-    template_text  = TEMPLATE_FILE.read_text(encoding="utf-8")
-    jinja_template = Template(template_text)
+    jinja_template = get_template(TEMPLATE_FILE.name)
 
     # --- SEKTOR HEATMAP ---
     active_fund_data = [r for r in rows if r['is_active']]
@@ -375,8 +349,7 @@ def build_weekly():
         markedskontekst      = markedskontekst,
     )
 
-    REPORT_FILE.parent.mkdir(parents=True, exist_ok=True)
-    REPORT_FILE.write_text(html, encoding="utf-8")
+    write_atomic(REPORT_FILE, html)
 
     print(f"✅ ETF Ugerapport genereret: {REPORT_FILE}")
     print(f"   {len(rows)} ETF'er analyseret")
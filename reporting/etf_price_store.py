@@ -0,0 +1,150 @@
+"""
+etf_price_store.py — Lokalt kurslager for Spejderens ETF-univers
+=================================================================
+Spejderen henter 12 måneders kurser fra yfinance for hver ETF hver lørdag
+og smider dem væk igen. Lageret gemmer dem, så universets kurshistorik
+vokser uge for uge og kan genbruges offline — fx af spejder_backtest.py,
+der genskaber tidligere scanninger uden at hente noget.
+
+Format (data/etf_prices.json.gz — committes ikke, genbruges via actions/cache):
+  {ticker: {"isin", "name", "closes": {dato: kurs}}}
+
+Nye kurser for en dato overskriver gamle (yfinance justerer bagud ved
+splits). Skrives atomisk og gzip'et — ~1.000 ETF'er × 2 år fylder få MB.
+
+Brug:
+  python reporting/etf_price_store.py stats
+  python reporting/etf_price_store.py seed              # etf_history.json via watchlist/portfolio-tickers
+  python reporting/etf_price_store.py fetch --months 24 # hent længere historik for alle tickers i lageret
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_store import load_history, load_portfolio, load_watchlist
+
+ROOT       = Path(__file__).resolve().parents[1]
+STORE_FILE = ROOT / "data/etf_prices.json.gz"
+
+
+# ==========================================
+# LÆS / SKRIV
+# ==========================================
+
+def load_store(path=STORE_FILE):
+    """Indlæser lageret. Returnerer {} hvis filen mangler eller er ulæselig."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️  Kunne ikke læse {path}: {e}")
+        return {}
+
+
+def save_store(store, path=STORE_FILE):
+    """Skriver atomisk (tmp + replace), datoer sorteret."""
+    path = Path(path)
+    for entry in store.values():
+        entry["closes"] = dict(sorted(entry["closes"].items()))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(store, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def record(store, ticker, dates, closes, isin=None, name=None):
+    """Fletter en kursserie ind. Returnerer antal nye datoer."""
+    entry = store.setdefault(ticker, {"isin": isin or "", "name": name or ticker, "closes": {}})
+    if isin:
+        entry["isin"] = isin
+    if name:
+        entry["name"] = name
+    before = len(entry["closes"])
+    entry["closes"].update({d: c for d, c in zip(dates, closes) if c})
+    return len(entry["closes"]) - before
+
+
+def price_history(store):
+    """{ticker: {dato: kurs}} — samme form som etf_history.json."""
+    return {ticker: entry["closes"] for ticker, entry in store.items() if entry.get("closes")}
+
+
+def store_stats(store):
+    points = sum(len(e["closes"]) for e in store.values())
+    dates  = [d for e in store.values() for d in (min(e["closes"], default=None),
+                                                  max(e["closes"], default=None)) if d]
+    span   = f"{min(dates)} → {max(dates)}" if dates else "tomt"
+    return f"kurslager: {len(store)} ETF'er, {points:,} kurser ({span})"
+
+
+# ==========================================
+# KOMMANDOER
+# ==========================================
+
+def known_tickers():
+    """ISIN → (ticker, navn) for watchlist og portfolio (portfolio vinder)."""
+    out = {}
+    for source in (load_watchlist(), load_portfolio("etf")):
+        for isin, info in source.items():
+            if not isin.startswith("_") and info.get("ticker"):
+                out[isin] = (info["ticker"], info.get("name", isin))
+    return out
+
+
+def seed_from_history(store):
+    """Kurser fra etf_history.json for fonde med kendt ticker."""
+    history = load_history("etf")
+    added = 0
+    for isin, (ticker, name) in known_tickers().items():
+        pts = history.get(isin, {})
+        if pts:
+            added += record(store, ticker, list(pts), list(pts.values()), isin, name)
+    return added
+
+
+def fetch_all(store, months):
+    """Henter months måneders historik for alle tickers i lageret (yfinance)."""
+    from etf_spejder import fetch_price_series, YFINANCE_DELAY
+
+    added = 0
+    for i, (ticker, entry) in enumerate(sorted(store.items())):
+        dates, closes = fetch_price_series(ticker, months)
+        added += record(store, ticker, dates, closes)
+        time.sleep(YFINANCE_DELAY)
+        if (i + 1) % 50 == 0:
+            print(f"   [{i + 1}/{len(store)}] +{added} kurser")
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokalt kurslager for ETF-universet")
+    parser.add_argument("command", choices=["stats", "seed", "fetch"])
+    parser.add_argument("--months", type=int, default=24, help="Måneder ved fetch (standard 24)")
+    args = parser.parse_args()
+
+    store = load_store()
+    if args.command == "seed":
+        added = seed_from_history(store)
+        save_store(store)
+        print(f"🌱 {added} kurser tilføjet fra etf_history.json")
+    elif args.command == "fetch":
+        print(f"📡 Henter {args.months} måneders kurser for {len(store)} ETF'er...")
+        added = fetch_all(store, args.months)
+        save_store(store)
+        print(f"✅ {added} nye kurser")
+    print(f"   {store_stats(store)}")
+
+
+if __name__ == "__main__":
+    main()
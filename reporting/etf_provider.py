@@ -9,7 +9,6 @@ via yfinance og opdaterer:
 Køres dagligt af .github/workflows/etf_daily.yml
 """
 
-import json
 import sys
 from pathlib import Path
 from datetime import datetime, timedelta
@@ -17,13 +16,20 @@ from datetime import datetime, timedelta
 # Tilføj reporting/ til Python-stien så utils.py kan importeres
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
+from data_store import load_watchlist, load_history, save_history, save_latest
 from utils import get_volatility
+from volatility_guard import create_guard, check_point, accept_point, reject_point, save_guard
+
+
+def _yf():
+    """yfinance (og dermed pandas) importeres først når der skal hentes kurser."""
+    try:
+        import yfinance as yf
+    except ImportError:
+        print("❌ yfinance ikke installeret. Kør: pip install yfinance")
+        sys.exit(1)
+    return yf
 
-try:
-    import yfinance as yf
-except ImportError:
-    print("❌ yfinance ikke installeret. Kør: pip install yfinance")
-    sys.exit(1)
 
 # ==========================================
 # STIER
@@ -42,26 +48,6 @@ VOLATILITY_GUARD_PCT = 0.25
 INITIAL_HISTORY_YEARS = 2
 
 
-# ==========================================
-# FIL-HJÆLPEFUNKTIONER
-# ==========================================
-
-def load_json(path, default):
-    if not path.exists():
-        return default
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"⚠️  Kunne ikke læse {path}: {e}")
-        return default
-
-def save_json(path, data):
-    path.parent.mkdir(exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-
 # ==========================================
 # AFKAST-BEREGNING FRA HISTORIK
 # ==========================================
@@ -135,6 +121,7 @@ def fetch_history(ticker, existing_dates):
 
     Returnerer dict: { 'YYYY-MM-DD': kurs } eller {} ved fejl.
     """
+    yf = _yf()
     try:
         t = yf.Ticker(ticker)
 
@@ -170,38 +157,24 @@ def fetch_history(ticker, existing_dates):
 # VOLATILITY GUARD
 # ==========================================
 
-def check_volatility(ticker, new_price, new_date, existing_dict):
+def check_volatility(guard, ticker, isin, new_price, new_date, existing_dict):
     """
-    Tjekker om et nyt datapunkt er realistisk ift. eksisterende historik.
-    Returnerer True hvis datapunktet skal gemmes, False hvis det afvises.
+    Tjekker om et nyt datapunkt er realistisk ift. de seneste accepterede kurser.
+    Returnerer True hvis datapunktet skal gemmes, False hvis det afvises
+    (afviste punkter lægges i karantæne).
     """
-    if not existing_dict:
-        return True
-
-    # Find seneste eksisterende kurs inden for 10 dage
-    target = datetime.strptime(new_date, '%Y-%m-%d') - timedelta(days=10)
-    recent = {
-        d: v for d, v in existing_dict.items()
-        if datetime.strptime(d, '%Y-%m-%d') >= target
-        and d < new_date
-    }
-
-    if not recent:
+    ok, reason = check_point(guard, isin, new_date, new_price, existing_dict)
+    if ok:
+        accept_point(guard, isin, new_date, new_price)
         return True
 
-    last_date  = max(recent.keys())
-    last_price = recent[last_date]
-
-    diff = abs((new_price - last_price) / last_price)
-    if diff > VOLATILITY_GUARD_PCT:
-        print(
-            f"  ⚠️  Volatility Guard: {ticker} afvist: "
-            f"{last_price} → {new_price} ({diff*100:.1f}%) "
-            f"på {last_date} → {new_date}"
-        )
-        return False
-
-    return True
+    print(
+        f"  ⚠️  Volatility Guard: {ticker} afvist: "
+        f"{reason['ref_price']} → {new_price} ({reason['diff_pct']:.1f}%) "
+        f"på {reason['ref_date']} → {new_date}"
+    )
+    reject_point(guard, isin, new_date, new_price, reason)
+    return False
 
 
 # ==========================================
@@ -213,12 +186,8 @@ def main():
     print("📡 ETF PROVIDER — Datahentning")
     print("="*50)
 
-    # Indlæs watchlist
-    watchlist_raw = load_json(WATCHLIST_FILE, {})
-    watchlist = {
-        isin: data for isin, data in watchlist_raw.items()
-        if not isin.startswith('_')  # Spring kommentar-felter over
-    }
+    # Indlæs watchlist (uden kommentar-felter)
+    watchlist = load_watchlist()
 
     if not watchlist:
         print(f"❌ Watchlist mangler eller er tom: {WATCHLIST_FILE}")
@@ -227,8 +196,9 @@ def main():
     print(f"📋 Watchlist: {len(watchlist)} ETF'er")
 
     # Indlæs eksisterende historik
-    history = load_json(HISTORY_FILE, {})
+    history = load_history("etf")
     today   = datetime.now().strftime('%Y-%m-%d')
+    guard   = create_guard("etf", VOLATILITY_GUARD_PCT)
 
     new_points   = 0
     failed       = 0
@@ -267,7 +237,7 @@ def main():
             for date_str, price in sorted(new_prices.items()):
                 if date_str in existing:
                     continue  # Overskriv aldrig eksisterende data
-                if check_volatility(ticker, price, date_str, existing):
+                if check_volatility(guard, ticker, isin, price, date_str, existing):
                     existing[date_str] = price
                     added += 1
                     new_points += 1
@@ -319,8 +289,9 @@ def main():
         })
 
     # Gem filer
-    save_json(HISTORY_FILE, history)
-    save_json(LATEST_FILE,  latest_list)
+    save_history("etf", history)
+    save_latest("etf", latest_list)
+    save_guard(guard)
 
     print(f"\n{'='*50}")
     print(f"✅ ETF Provider færdig")
@@ -9,27 +9,22 @@ Sendes på hverdage hvis der er:
 Køres af .github/workflows/etf_alert.yml
 """
 
-import json
 import os
 import sys
-import smtplib
 from pathlib import Path
 from datetime import datetime
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 
 # Tilføj reporting/ til Python-stien så utils.py kan importeres
 sys.path.insert(0, str(Path(__file__).resolve().parent))
-from utils import check_trail_stop, get_trail_stop_pct
-from ai_analysis import get_alarm_analyse, get_all_signal_analyser
+from data_store import (
+    read_json, load_json, save_json,
+    load_portfolio, load_watchlist, load_latest, load_hwm, save_hwm,
+)
+from trail_engine import run_trail_stops
 
 ROOT           = Path(__file__).resolve().parents[1]
 HITS_FILE      = ROOT / "data/etf_spejder_hits.json"
 PREV_FILE      = ROOT / "data/etf_spejder_prev.json"
-HWM_FILE       = ROOT / "data/etf_hwm.json"
-PORTFOLIO_FILE = ROOT / "config/etf_portfolio.json"
-WATCHLIST_FILE = ROOT / "config/etf_watchlist.json"
-LATEST_FILE    = ROOT / "data/etf_latest.json"
 
 # Momentum-pile der signalerer aftagende momentum for ejede fonde
 MOMENTUM_WARN_PILES  = {'↑↓', '↓↓'}
@@ -38,28 +33,6 @@ ASK_ELIGIBLE_FILE    = ROOT / "config/etf_ask_eligible.json"  # Skats positivlis
 MOMENTUM_DOWN_PCT    = 10.0   # K2: momentum under denne % → signal
 
 
-# ==========================================
-# FIL-HJÆLPEFUNKTIONER
-# ==========================================
-
-def load_json(path, default):
-    if not path.exists():
-        return default
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                return {k: v for k, v in data.items() if not k.startswith('_')}
-            return data
-    except Exception:
-        return default
-
-def save_json(path, data):
-    path.parent.mkdir(exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-
 # ==========================================
 # TRAIL STOP — via utils (enkelt kilde til sandhed)
 # ==========================================
@@ -67,8 +40,9 @@ def save_json(path, data):
 def get_trail_alerts(portfolio, latest_map, hwm_data):
     """
     Gennemgår aktive positioner og finder trail stop-brud.
-    Bruger utils.check_trail_stop() og utils.get_trail_stop_pct()
-    så logikken er identisk med etf_build_weekly.py.
+    Alle positioner evalueres i ét kald til trail_engine.run_trail_stops()
+    — samme regler som utils.check_trail_stop()/get_trail_stop_pct() og
+    etf_build_weekly.py.
 
     Opdaterer HWM-data in-place og returnerer:
       (trail_alerts, opdateret hwm_data)
@@ -76,6 +50,7 @@ def get_trail_alerts(portfolio, latest_map, hwm_data):
     today_str    = datetime.now().strftime('%Y-%m-%d')
     trail_alerts = []
 
+    positions = []
     for isin, p_info in portfolio.items():
         if not p_info.get('active', False):
             continue
@@ -91,28 +66,32 @@ def get_trail_alerts(portfolio, latest_map, hwm_data):
         if not curr_price:
             continue
 
-        volatility     = latest_map[isin].get('volatility')
-        total_ret_pct  = round(((curr_price / buy_price) - 1) * 100, 2) if buy_price else None
-        rsi            = rsi_map.get(isin) if 'rsi_map' in dir() else None
-        trail_pct      = get_trail_stop_pct(volatility, rsi, total_return_pct=total_ret_pct)
+        positions.append({
+            "isin":             isin,
+            "curr":             curr_price,
+            "buy":              buy_price,
+            "volatility":       latest_map[isin].get('volatility'),
+            "total_return_pct": round(((curr_price / buy_price) - 1) * 100, 2),
+        })
 
-        hwm_entry, alert = check_trail_stop(
-            isin, curr_price, buy_price, hwm_data, today_str, trail_pct
+    entries, alerts = run_trail_stops(positions, hwm_data, today_str)
+    hwm_data.update(entries)
+
+    for p in positions:
+        alert = alerts.get(p["isin"])
+        if not alert:
+            continue
+        p_info = portfolio[p["isin"]]
+        alert['name']         = p_info.get('name', p["isin"])
+        alert['ticker']       = p_info.get('ticker', '')
+        alert['depot']        = p_info.get('depot', '')
+        alert['ask_eligible'] = p_info.get('ask_eligible')
+        trail_alerts.append(alert)
+        print(
+            f"🔔 TRAIL STOP: {alert['name']} faldet {alert['fall_pct']}% "
+            f"fra top {alert['hwm']} → nu {alert['curr']} "
+            f"(tærskel: {alert['trail_pct']}%)"
         )
-        hwm_data[isin] = hwm_entry
-
-        if alert:
-            alert['name']         = p_info.get('name', isin)
-            alert['ticker']       = p_info.get('ticker', '')
-            alert['depot']        = p_info.get('depot', '')
-            alert['ask_eligible'] = p_info.get('ask_eligible')
-            alert['trail_pct']    = trail_pct
-            trail_alerts.append(alert)
-            print(
-                f"🔔 TRAIL STOP: {alert['name']} faldet {alert['fall_pct']}% "
-                f"fra top {alert['hwm']} → nu {alert['curr']} "
-                f"(tærskel: {trail_pct}%)"
-            )
 
     return trail_alerts, hwm_data
 
@@ -190,19 +169,11 @@ def get_rotation_alternatives(isin, portfolio, hits_data, latest_map, n=3, watch
 
 def load_momentum_alerts():
     """Indlæser anti-spam fil. Format: {isin: {kriterium: dato}}"""
-    if not MOMENTUM_FILE.exists():
-        return {}
-    try:
-        with open(MOMENTUM_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    return load_json(MOMENTUM_FILE, {})
 
 def save_momentum_alerts(data):
     """Gemmer anti-spam fil."""
-    MOMENTUM_FILE.parent.mkdir(exist_ok=True)
-    with open(MOMENTUM_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    save_json(MOMENTUM_FILE, data)
 
 def get_momentum_svækkes_alerts(portfolio, hits_data, prev_data, latest_map, n_alternatives=3):
     """
@@ -503,8 +474,7 @@ def check_ask_reminder():
         </div>"""
 
     try:
-        with open(ASK_ELIGIBLE_FILE, encoding='utf-8') as f:
-            data = json.load(f)
+        data = read_json(ASK_ELIGIBLE_FILE, shared=True)
         opdateret = data.get('_opdateret', '')  # Format: "YYYY-MM"
         year = opdateret[:4] if opdateret else ''
     except Exception:
@@ -754,6 +724,10 @@ def send_mail(subject, html_body):
         print("❌ MAIL_USERNAME eller MAIL_PASSWORD mangler i environment")
         return False
 
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
     msg = MIMEMultipart('alternative')
     msg['Subject'] = subject
     msg['From']    = username
@@ -780,12 +754,12 @@ def main():
     print("📡 ETF SEND ALERT")
     print("="*50)
 
-    hits_data = load_json(HITS_FILE, {})
-    prev_data = load_json(PREV_FILE, {})
-    portfolio = load_json(PORTFOLIO_FILE, {})
-    watchlist = {k: v for k, v in load_json(WATCHLIST_FILE, {}).items() if not k.startswith("_")}
-    latest    = load_json(LATEST_FILE, [])
-    hwm_data  = load_json(HWM_FILE, {})
+    hits_data = load_json(HITS_FILE, {}, strip_meta=True)
+    prev_data = load_json(PREV_FILE, {}, strip_meta=True)
+    portfolio = load_portfolio("etf")
+    watchlist = load_watchlist()
+    latest    = load_latest("etf")
+    hwm_data  = load_hwm("etf")
 
     latest_map = {item['isin']: item for item in latest} if isinstance(latest, list) else {}
 
@@ -793,7 +767,7 @@ def main():
     trail_alerts, hwm_data = get_trail_alerts(portfolio, latest_map, hwm_data)
 
     # Gem opdateret HWM tilbage til fil
-    save_json(HWM_FILE, hwm_data)
+    save_hwm("etf", hwm_data)
 
     # ---- 🟡 Momentum-advarsler for ejede fonde ----
     momentum_alerts = get_momentum_alerts(portfolio, hits_data, prev_data)
@@ -823,6 +797,9 @@ def main():
         print("✅ Ingen advarsler eller nye hits — ingen mail sendes")
         return
 
+    # AI-klienten og mail-modulerne importeres først når der faktisk skal sendes
+    from ai_analysis import get_alarm_analyse, get_all_signal_analyser
+
     # Byg subject
     subject_parts = []
     if trail_alerts:
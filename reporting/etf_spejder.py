@@ -22,7 +22,6 @@ Scoring (0-6 point):
   +1  1M afkast positiv
 """
 
-import json
 import random
 import sys
 import time
@@ -31,32 +30,21 @@ from datetime import datetime
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-try:
-    import justetf_scraping
-except ImportError:
-    print("❌ justetf_scraping ikke installeret.")
-    print("   Kør: pip install git+https://github.com/druzsan/justetf-scraping.git")
-    sys.exit(1)
-
-try:
-    import yfinance as yf
-except ImportError:
-    print("❌ yfinance ikke installeret. Kør: pip install yfinance")
-    sys.exit(1)
-
-from utils import get_ma, get_best_ma, get_rsi, get_cross_signal, get_trend_state
+import indicator_cache
+import etf_price_store
+from data_store import (
+    read_json, load_json, save_json,
+    load_watchlist, load_portfolio, load_latest, load_history,
+)
 from sector_heatmap import build_portfolio_correlation
 
 # ==========================================
 # KONFIGURATION
 # ==========================================
 ROOT             = Path(__file__).resolve().parents[1]
-WATCHLIST_FILE   = ROOT / "config/etf_watchlist.json"
-PORTFOLIO_FILE   = ROOT / "config/etf_portfolio.json"
 HITS_FILE        = ROOT / "data/etf_spejder_hits.json"
 PREV_HITS_FILE   = ROOT / "data/etf_spejder_prev.json"  # Forrige uges hits
 SOLD_FILE        = ROOT / "data/etf_sold.json"           # Solgte fonde — cool-off filter
-HISTORY_FILE     = ROOT / "data/etf_history.json"        # Kurshistorik til korrelationsberegning
 NORDNET_FILE     = ROOT / "data/etf_nordnet_inventory.json"
 ASK_ELIGIBLE_FILE = ROOT / "config/etf_ask_eligible.json"  # Skats positivliste — opdateres maj hvert år
 
@@ -81,27 +69,33 @@ YFINANCE_DELAY   = 0.3
 
 
 # ==========================================
-# HJÆLPEFUNKTIONER
+# TUNGE PAKKER (importeres først ved brug)
 # ==========================================
+# yfinance trækker pandas med (~0,5 sek) — importeres først når der skal
+# hentes data, så fx --help og import af score_etf() starter med det samme.
 
-def load_json(path, default):
-    if not path.exists():
-        return default
+def _yf():
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            # Filtrer kommentar-felter
-            if isinstance(data, dict):
-                return {k: v for k, v in data.items() if not k.startswith('_')}
-            return data
-    except Exception as e:
-        print(f"⚠️  Kunne ikke læse {path}: {e}")
-        return default
+        import yfinance as yf
+    except ImportError:
+        print("❌ yfinance ikke installeret. Kør: pip install yfinance")
+        sys.exit(1)
+    return yf
+
+
+def _justetf():
+    try:
+        import justetf_scraping
+    except ImportError:
+        print("❌ justetf_scraping ikke installeret.")
+        print("   Kør: pip install git+https://github.com/druzsan/justetf-scraping.git")
+        sys.exit(1)
+    return justetf_scraping
 
-def save_json(path, data):
-    path.parent.mkdir(exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+
+# ==========================================
+# HJÆLPEFUNKTIONER
+# ==========================================
 
 def load_nordnet_inventory():
     """
@@ -116,8 +110,7 @@ def load_nordnet_inventory():
         print(f"   Nordnet-filter deaktiveret — alle ISINs scannes.")
         return None
     try:
-        with open(NORDNET_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data  = read_json(NORDNET_FILE, shared=True)
         isins = set(data.keys())
         print(f"✅ Nordnet-inventory indlæst: {len(isins):,} handlbare ETF'er")
         return isins
@@ -139,14 +132,13 @@ def load_sold_funds():
     if not SOLD_FILE.exists():
         return {}
     try:
-        with open(SOLD_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return {k: v for k, v in data.items() if not k.startswith("_")}
+        data = read_json(SOLD_FILE)
+        return {k: v for k, v in data.items() if not k.startswith("_")}
     except Exception:
         return {}
 
 
-def is_sold_cooloff(isin, ticker, sold_funds, prices):
+def is_sold_cooloff(isin, ticker, sold_funds, prices, last_date=None):
     """
     Returnerer True hvis fonden er i cool-off efter salg og skal filtreres fra.
 
@@ -170,9 +162,8 @@ def is_sold_cooloff(isin, ticker, sold_funds, prices):
 
     curr_price = prices[-1]
 
-    # Betingelse 1: BULL-trend (kurs over MA)
-    from utils import get_best_ma
-    ma_val, _ = get_best_ma(prices)
+    # Betingelse 1: BULL-trend (kurs over MA) — deles med score_etf via cachen
+    ma_val, _ = indicator_cache.best_ma(isin, last_date, prices)
     if ma_val is None or curr_price <= ma_val:
         print(f"   ⏳ Cool-off: {isin} — under MA ({curr_price:.2f} <= {ma_val:.2f if ma_val else '?'})")
         return True
@@ -198,8 +189,7 @@ def load_ask_eligible():
         print(f"   ASK-egnethed sættes til None for alle kandidater.")
         return set()
     try:
-        with open(ASK_ELIGIBLE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data  = read_json(ASK_ELIGIBLE_FILE, shared=True)
         isins = set(data.get("isins", []))
         updated = data.get("_opdateret", "ukendt")
         print(f"✅ ASK-positivliste indlæst: {len(isins):,} ISINs (opdateret: {updated})")
@@ -234,6 +224,8 @@ def get_yfinance_ticker(isin, name):
     Forsøger først ISIN direkte, derefter navnesøgning.
     Returnerer ticker-streng eller None.
     """
+    yf = _yf()
+
     # Strategi 1: Søg via yfinance search
     try:
         results = yf.Search(isin, max_results=3)
@@ -321,19 +313,23 @@ def calculate_weighted_momentum(row):
     return weighted, consistency_bonus, details
 
 
-def fetch_prices(ticker, months=12):
+def fetch_price_series(ticker, months=12):
     """
     Henter historiske kurser via yfinance.
-    Returnerer liste af daglige lukningskurser (nyeste sidst).
+    Returnerer (datoer, daglige lukningskurser) — nyeste sidst, tomme lister ved fejl.
+    Seneste dato bruges som nøgle i indicator_cache.py.
     """
+    yf = _yf()
     try:
         t = yf.Ticker(ticker)
         hist = t.history(period=f"{months}mo", auto_adjust=True)
-        if hist.empty:
-            return []
-        return [round(float(p), 4) for p in hist['Close'].dropna().tolist()]
+        close = hist['Close'].dropna() if not hist.empty else None
+        if close is None or close.empty:
+            return [], []
+        return ([d.strftime('%Y-%m-%d') for d in close.index],
+                [round(float(p), 4) for p in close.tolist()])
     except Exception:
-        return []
+        return [], []
 
 
 # ==========================================
@@ -347,6 +343,7 @@ def fetch_universe():
     Returnerer DataFrame med ISIN, navn, afkast, TER osv.
     """
     print("📡 Henter ETF-univers fra justETF...")
+    justetf_scraping = _justetf()
 
     try:
         df = justetf_scraping.load_overview(strategy="epg-longOnly")
@@ -408,23 +405,24 @@ def fetch_universe():
 # SCORE EN ETF
 # ==========================================
 
-def score_etf(isin, name, row, prices, is_owned, is_watchlist):
+def score_etf(isin, name, row, prices, is_owned, is_watchlist, last_date=None):
     """
     Beregner Spejder-score baseret på tekniske signaler.
     Returnerer score-dict eller None hvis ikke kvalificeret.
+    Indikatorer hentes via indicator_cache.py (nøgle: isin + last_date).
     """
     if len(prices) < 20:
         return None
 
-    ma_val, ma_label = get_best_ma(prices)
+    ma_val, ma_label = indicator_cache.best_ma(isin, last_date, prices)
     if not ma_val:
         return None
 
     curr = prices[-1]
     momentum = round(((curr / ma_val) - 1) * 100, 2)
-    trend    = get_trend_state(prices)
-    rsi      = get_rsi(prices, 14)
-    cross    = get_cross_signal(prices)
+    trend    = indicator_cache.trend_state(isin, last_date, prices)
+    rsi      = indicator_cache.rsi(isin, last_date, prices, 14)
+    cross    = indicator_cache.cross_signal(isin, last_date, prices)
 
     # Hurtige heste: ingen RSI-krav, høj momentum er nok
     # Stabile trendere: kræver RSI < 70 og momentum 5-20%
@@ -527,15 +525,15 @@ def main():
     print("="*55)
 
     # Indlæs kendte fonde
-    watchlist = load_json(WATCHLIST_FILE, {})
-    portfolio = load_json(PORTFOLIO_FILE, {})
+    watchlist = load_watchlist()
+    portfolio = load_portfolio("etf")
 
     owned_isins     = {isin for isin, p in portfolio.items() if p.get('active', False)}
 
     # Auto-opdater etf_sold.json når fonde går fra active→inactive i portfolio
     # Salgsdato = i dag, salgskurs = seneste kendte kurs fra etf_latest.json
     sold_funds = load_sold_funds()
-    latest_for_sold = load_json(ROOT / "data/etf_latest.json", [])
+    latest_for_sold = load_latest("etf")
     latest_sold_map = {item['isin']: item for item in latest_for_sold} if isinstance(latest_for_sold, list) else {}
 
     newly_sold = 0
@@ -641,6 +639,12 @@ def main():
         print(f"❌ Ingen ticker eller ISIN kolonne fundet. Kolonner: {list(df.columns)}")
         return
 
+    # Indikator-cache fra tidligere scripts i samme workflow (valgfri)
+    indicator_cache.load_disk()
+
+    # Kurslager — alle hentede kurser gemmes til spejder_backtest.py
+    price_store = etf_price_store.load_store()
+
     print(f"\n🔍 Scanner {len(records)} ETF'er for signaler...")
     print(f"   Bruger ISIN-kolonne: '{isin_col}', Navn-kolonne: '{name_col}'")
 
@@ -659,7 +663,7 @@ def main():
     # -----------------------------------------------------------------------
 
     # Hent forrige uges hits - max top 20 for at undga voksevaerk
-    prev_data_prio = load_json(PREV_HITS_FILE, {})
+    prev_data_prio = load_json(PREV_HITS_FILE, {}, strip_meta=True)
     prev_hit_tickers = {
         h.get('ticker', '').upper()
         for h in (prev_data_prio.get('hits', []))[:20]
@@ -729,7 +733,10 @@ def main():
         row['_effective_isin'] = effective_isin
 
         # Hent kurser
-        prices = fetch_prices(ticker, months=12)
+        dates, prices = fetch_price_series(ticker, months=12)
+        last_date = dates[-1] if dates else None
+        if prices:
+            etf_price_store.record(price_store, ticker, dates, prices, effective_isin, name)
         if len(prices) < 20:
             skipped += 1
             continue
@@ -738,12 +745,12 @@ def main():
 
         # Cool-off filter — skip solgte fonde der ikke er vendt til BULL over salgskurs
         # Ejede fonde (is_owned=True) er altid undtaget — de scannes altid
-        if not is_owned and is_sold_cooloff(effective_isin, ticker, sold_funds, prices):
+        if not is_owned and is_sold_cooloff(effective_isin, ticker, sold_funds, prices, last_date):
             skipped += 1
             continue
 
         # Score
-        result = score_etf(effective_isin, name, row, prices, is_owned, is_watchlist)
+        result = score_etf(effective_isin, name, row, prices, is_owned, is_watchlist, last_date)
         if result:
             # Berig med ASK-info — prioritet: portfolio/watchlist → Skats positivliste
             if effective_isin in ask_eligible_map:
@@ -773,7 +780,7 @@ def main():
             break
 
     # Indlaes forrige uges hits for at finde NYE fund
-    prev_data    = load_json(PREV_HITS_FILE, {})
+    prev_data    = load_json(PREV_HITS_FILE, {}, strip_meta=True)
     prev_tickers = {h.get('ticker', '') for h in prev_data.get('hits_hurtige', [])}
 
     # Byg lookup af forrige uges momentum per ticker
@@ -826,7 +833,7 @@ def main():
         weakest_info = None
 
     # Indlæs history til korrelationsberegning
-    history_data = load_json(HISTORY_FILE, {})
+    history_data = load_history("etf")
 
     # Tilfoej svageste og portfolio_correlation til alle kandidater
     for c in candidates:
@@ -971,6 +978,8 @@ def main():
         shutil.copy(HITS_FILE, PREV_HITS_FILE)
 
     save_json(HITS_FILE, output)
+    indicator_cache.save_disk()
+    etf_price_store.save_store(price_store)
 
     print(f"\n{'='*55}")
     print(f"✅ Spejder færdig")
@@ -979,6 +988,8 @@ def main():
     print(f"   Nordnet-filter: {'✅ Aktiv (' + str(len(nordnet_isins)) + ' ISINs)' if nordnet_isins else '⚠️  Deaktiveret (fil mangler)'}")
     print(f"   Nordnet-afvist (signal men ikke handlbar): {nordnet_filtered}")
     print(f"   Kandidater: {len(candidates)}")
+    print(f"   {indicator_cache.cache_stats()}")
+    print(f"   {etf_price_store.store_stats(price_store)}")
     print(f"   Top {len(top_hurtige) + len(top_stabile)} gemt til {HITS_FILE.name}")
     print()
 
@@ -0,0 +1,109 @@
+"""
+indicator_cache.py — Memoisering af tekniske indikatorer
+=========================================================
+Spejderen kalder de samme indikatorer flere gange på samme kursliste:
+score_etf() kalder get_best_ma() og get_trend_state() (der selv kalder
+get_best_ma() igen), og is_sold_cooloff() kalder get_best_ma() en tredje
+gang. Cachen husker resultatet pr. (indikator, ISIN, seneste dato,
+parametre), så hver indikator kun beregnes én gang pr. fond og data-dag.
+
+Nøglen indeholder også antal punkter og seneste kurs, så forskellige
+lookback-perioder eller en rettet slutkurs aldrig giver et forkert hit.
+Uden ISIN eller dato beregnes der bare direkte (ingen cache).
+
+Cachen er en begrænset LRU i hukommelsen. Valgfrit kan den gemmes i
+build/indicator_cache.json, så den overlever mellem scripts i samme
+workflow-kørsel (build/ committes ikke).
+"""
+
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+from utils import get_best_ma, get_rsi, get_cross_signal, trend_state_from_ma
+
+ROOT        = Path(__file__).resolve().parents[1]
+DISK_FILE   = ROOT / "build/indicator_cache.json"
+MAX_ENTRIES = 4096   # ~4 indikatorer x ~1000 ETF'er
+
+_CACHE = OrderedDict()
+_STATS = {"hits": 0, "misses": 0}
+
+
+def _key(name, isin, last_date, prices, params):
+    return f"{name}|{isin}|{last_date}|{len(prices)}|{prices[-1]}|{','.join(map(str, params))}"
+
+
+def cached(name, fn, isin, last_date, prices, *params):
+    """Returnerer fn(prices, *params) — fra cachen hvis nøglen er set før."""
+    if not isin or not last_date or not prices:
+        return fn(prices, *params)
+
+    key = _key(name, isin, last_date, prices, params)
+    if key in _CACHE:
+        _CACHE.move_to_end(key)
+        _STATS["hits"] += 1
+        return _CACHE[key]
+
+    _STATS["misses"] += 1
+    value = fn(prices, *params)
+    _CACHE[key] = value
+    while len(_CACHE) > MAX_ENTRIES:
+        _CACHE.popitem(last=False)
+    return value
+
+
+# ==========================================
+# INDIKATORER (samme signatur som utils.py + isin/dato)
+# ==========================================
+
+def best_ma(isin, last_date, prices):
+    ma_val, label = cached("best_ma", get_best_ma, isin, last_date, prices)
+    return ma_val, label
+
+
+def trend_state(isin, last_date, prices):
+    if not prices:
+        return "WARM-UP"
+    ma_val, _ = best_ma(isin, last_date, prices)
+    return trend_state_from_ma(prices[-1], ma_val)
+
+
+def cross_signal(isin, last_date, prices):
+    return cached("cross", get_cross_signal, isin, last_date, prices)
+
+
+def rsi(isin, last_date, prices, window=14):
+    return cached("rsi", get_rsi, isin, last_date, prices, window)
+
+
+# ==========================================
+# DISK (valgfrit)
+# ==========================================
+
+def load_disk(path=DISK_FILE):
+    """Indlæser en tidligere gemt cache (fx fra et tidligere script i workflowet)."""
+    if not path.exists():
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except Exception as e:
+        print(f"⚠️  Kunne ikke læse {path}: {e}")
+        return 0
+    for key, value in entries.items():
+        _CACHE.setdefault(key, value)
+    return len(entries)
+
+
+def save_disk(path=DISK_FILE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(_CACHE, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def cache_stats():
+    return f"indikator-cache: {_STATS['hits']} hits, {_STATS['misses']} misses, {len(_CACHE)} poster"
@@ -0,0 +1,127 @@
+"""
+parse_cache.py — Cache af parsede PFA faktaark
+===============================================
+PFA opdaterer ikke altid faktaarket fra dag til dag, og arkivet
+(pfa_archive.py) re-parser de samme tekster igen og igen. Cachen mapper
+sha256(tekst) → parset dict, så uændrede faktaark kun koster en hash
+i stedet for hele regex-parsingen. Arkivet er allerede adresseret via
+sha256(tekst), så re-parse kan slå op uden at pakke teksten ud.
+
+Parser-koden (pfa.py) indgår i nøglen — en ændret parser giver derfor
+automatisk cache-miss, og gamle poster forsvinder via LRU.
+
+Format (data/pfa_parse_cache.json):
+  {"entries": {nøgle: parset_dict, ...}}   — rækkefølge = LRU (ældst først)
+"""
+
+import copy
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from pfa import parse_pfa_from_text
+
+ROOT        = Path(__file__).resolve().parents[1]
+CACHE_FILE  = ROOT / "data/pfa_parse_cache.json"
+PARSER_FILE = Path(__file__).resolve().parent / "pfa.py"
+
+# ~300 bytes pr. post. 5000 poster ≈ 1,5 MB og dækker et par måneders
+# unikke faktaark — ældre arkiv-tekster parses bare igen ved rebuild.
+MAX_ENTRIES = 5000
+
+_PARSER_DIGEST = None
+
+
+def _parser_digest():
+    global _PARSER_DIGEST
+    if _PARSER_DIGEST is None:
+        _PARSER_DIGEST = hashlib.sha256(PARSER_FILE.read_bytes()).hexdigest()
+    return _PARSER_DIGEST
+
+
+def cache_key(sha):
+    """Nøgle = sha256 af parser-kode + sha256(tekst)."""
+    return hashlib.sha256(f"{_parser_digest()}:{sha}".encode("ascii")).hexdigest()
+
+
+def text_sha(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ==========================================
+# CACHE-STATE
+# ==========================================
+
+def load_cache(max_entries=MAX_ENTRIES):
+    """Indlæser cachen. Returnerer state-dict til parse_cached()/save_cache()."""
+    entries = {}
+    if CACHE_FILE.exists():
+        try:
+            with open(CACHE_FILE, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+        except Exception as e:
+            print(f"⚠️  Kunne ikke læse {CACHE_FILE}: {e}")
+    return {"entries": entries, "max": max_entries, "hits": 0, "misses": 0, "dirty": False}
+
+
+def save_cache(cache):
+    """Gemmer cachen (atomisk) hvis den er ændret — evicter de ældst brugte poster."""
+    entries = cache["entries"]
+    overflow = len(entries) - cache["max"]
+    if overflow > 0:
+        for key in list(entries)[:overflow]:
+            del entries[key]
+        cache["dirty"] = True
+
+    if not cache["dirty"]:
+        return
+
+    CACHE_FILE.parent.mkdir(exist_ok=True)
+    tmp = CACHE_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"entries": entries}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, CACHE_FILE)
+    cache["dirty"] = False
+
+
+def lookup(cache, sha):
+    """Slår et parset faktaark op via sha256(tekst). Returnerer kopi eller None."""
+    key    = cache_key(sha)
+    parsed = cache["entries"].pop(key, None)
+    if parsed is None:
+        cache["misses"] += 1
+        return None
+    cache["hits"] += 1
+    # Flyt posten bagerst = senest brugt
+    cache["entries"][key] = parsed
+    cache["dirty"] = True
+    return copy.deepcopy(parsed)
+
+
+def store(cache, sha, parsed):
+    cache["entries"][cache_key(sha)] = copy.deepcopy(parsed)
+    cache["dirty"] = True
+
+
+def parse_cached(isin, text, cache=None, sha=None):
+    """
+    parse_pfa_from_text() med cache. Uden cache parses der direkte.
+    sha: sha256(tekst) hvis kalderen allerede har den.
+    Returnerer altid en ny dict (kalderen må gerne ændre den).
+    """
+    if cache is None or not text:
+        return parse_pfa_from_text(isin, text)
+
+    sha    = sha or text_sha(text)
+    parsed = lookup(cache, sha)
+    if parsed is None:
+        parsed = parse_pfa_from_text(isin, text)
+        store(cache, sha, parsed)
+
+    parsed["isin"] = isin
+    return parsed
+
+
+def cache_stats(cache):
+    return f"parse-cache: {cache['hits']} hits, {cache['misses']} misses, {len(cache['entries'])} poster"
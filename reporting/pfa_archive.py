@@ -0,0 +1,305 @@
+"""
+pfa_archive.py — Arkiv over hentede PFA faktaark
+=================================================
+build/text/*.txt overskrives hver dag. Arkivet gemmer derfor en
+komprimeret kopi af hver faktaark-tekst, så parser-forbedringer kan
+genanvendes på hele historikken bagefter.
+
+Struktur:
+  data/pfa_archive/objects/ab/abcd....txt.gz   (indhold, adresseret via sha256)
+  data/pfa_archive/index.json                  ({isin: {nav_date: sha256}})
+
+Identiske tekster (fx weekender hvor PFA ikke har opdateret) gemmes kun én gang.
+
+Brug:
+  python reporting/pfa_archive.py import             # arkivér nuværende build/text/
+  python reporting/pfa_archive.py rebuild            # genopbyg pfa_history.json fra arkivet
+  python reporting/pfa_archive.py rebuild --replace  # kun rigtige arkiverede NAV'er
+  python reporting/pfa_archive.py stats
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_store import read_json, load_json, save_json, save_history
+from pfa import parse_pfa_from_text
+from parse_cache import load_cache, save_cache, lookup, store, parse_cached, cache_stats
+
+ROOT         = Path(__file__).resolve().parents[1]
+ARCHIVE_DIR  = ROOT / "data/pfa_archive"
+OBJECTS_DIR  = ARCHIVE_DIR / "objects"
+INDEX_FILE   = ARCHIVE_DIR / "index.json"
+TEXT_DIR     = ROOT / "build/text"
+HISTORY_FILE = ROOT / "data/pfa_history.json"
+
+# Under denne grænse er det hurtigere at parse i én proces end at starte workers
+PARALLEL_MIN_FILES = 200
+
+
+# ==========================================
+# INDEKS
+# ==========================================
+
+def load_index():
+    """Indlæser arkiv-indekset. Format: {isin: {nav_date: sha256}}"""
+    return load_json(INDEX_FILE, {})
+
+
+def save_index(index):
+    for isin in index:
+        index[isin] = dict(sorted(index[isin].items()))
+    save_json(INDEX_FILE, dict(sorted(index.items())))
+
+
+# ==========================================
+# OBJEKTER (indholdsadresseret)
+# ==========================================
+
+def text_digest(text):
+    """sha256 af faktaark-teksten — bruges som objekt-nøgle."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _object_path(sha):
+    return OBJECTS_DIR / sha[:2] / f"{sha}.txt.gz"
+
+
+def archive_text(isin, text, nav_date, index, sha=None):
+    """
+    Gemmer én faktaark-tekst i arkivet og registrerer den i indekset.
+    Objektet skrives kun hvis indholdet ikke allerede findes.
+
+    nav_date: NAV-datoen fra faktaarket (YYYY-MM-DD). Mangler den, bruges
+              'ukendt-<dags dato>' så teksten stadig bevares til re-parse.
+
+    sha: sha256(tekst) hvis kalderen allerede har beregnet den.
+
+    Returnerer (sha256, ny_tekst) — indekset gemmes af kalderen.
+    """
+    sha  = sha or text_digest(text)
+    path = _object_path(sha)
+    is_new = not path.exists()
+
+    if is_new:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        # mtime=0 gør gzip-output deterministisk (samme tekst → samme bytes)
+        with open(tmp, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                gz.write(text.encode("utf-8"))
+        os.replace(tmp, path)
+
+    key = nav_date or f"ukendt-{datetime.now().strftime('%Y-%m-%d')}"
+    index.setdefault(isin, {})[key] = sha
+    return sha, is_new
+
+
+def read_text(sha):
+    """Læser en arkiveret tekst. Returnerer None hvis objektet mangler."""
+    path = _object_path(sha)
+    if not path.exists():
+        return None
+    with gzip.open(path, "rb") as gz:
+        return gz.read().decode("utf-8")
+
+
+# ==========================================
+# BULK RE-PARSE
+# ==========================================
+
+def _parse_archived(task):
+    """Worker: læser og parser ét arkiveret objekt. task = (isin, sha)."""
+    isin, sha = task
+    text = read_text(sha)
+    if text is None:
+        return isin, sha, None
+    return isin, sha, parse_pfa_from_text(isin, text)
+
+
+def reparse_archive(index, isins=None, workers=None, cache=None):
+    """
+    Parser alle arkiverede tekster (evt. kun for udvalgte ISIN'er).
+    Hvert unikt (isin, sha) parses kun én gang. Tekster der allerede
+    ligger i parse-cachen slås op uden at blive pakket ud, og resten
+    fordeles over flere processer ved store mængder.
+
+    Returnerer liste af (isin, sha, parsed_dict).
+    """
+    tasks = sorted({
+        (isin, sha)
+        for isin, dates in index.items()
+        if isins is None or isin in isins
+        for sha in dates.values()
+    })
+    if not tasks:
+        return []
+
+    results, misses = [], []
+    for isin, sha in tasks:
+        parsed = lookup(cache, sha) if cache is not None else None
+        if parsed is None:
+            misses.append((isin, sha))
+        else:
+            parsed["isin"] = isin
+            results.append((isin, sha, parsed))
+
+    if len(misses) < PARALLEL_MIN_FILES or workers == 1:
+        parsed_misses = [_parse_archived(t) for t in misses]
+    else:
+        workers   = workers or os.cpu_count() or 1
+        chunksize = max(1, len(misses) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed_misses = list(pool.map(_parse_archived, misses, chunksize=chunksize))
+
+    if cache is not None:
+        for _isin, sha, parsed in parsed_misses:
+            if parsed is not None:
+                store(cache, sha, parsed)
+
+    return sorted(results + parsed_misses, key=lambda r: (r[0], r[1]))
+
+
+def collect_navs(results):
+    """
+    Samler parsede resultater til {isin: {nav_date: nav}}.
+    Bruger den parsede nav_date (ikke indeks-nøglen), så en bedre
+    parser også kan rette datoer.
+    """
+    navs = {}
+    for isin, _sha, parsed in results:
+        if not parsed or not parsed.get("nav") or not parsed.get("nav_date"):
+            continue
+        navs.setdefault(isin, {})[parsed["nav_date"]] = parsed["nav"]
+    return navs
+
+
+def rebuild_history(replace=False, workers=None, dry_run=False, isins=None):
+    """
+    Genopbygger pfa_history.json fra arkiverede NAV'er.
+
+    replace=False: arkiverede NAV'er overskriver samme dato i eksisterende
+                   historik — øvrige punkter bevares.
+    replace=True:  historikken for arkiverede ISIN'er består KUN af
+                   rigtige arkiverede NAV'er (fjerner fx backfill-punkter).
+    """
+    index = load_index()
+    if not index:
+        print(f"❌ Arkivet er tomt: {INDEX_FILE}")
+        return None
+
+    start   = datetime.now()
+    cache   = load_cache()
+    results = reparse_archive(index, isins=isins, workers=workers, cache=cache)
+    navs    = collect_navs(results)
+    elapsed = (datetime.now() - start).total_seconds()
+    print(f"📦 {len(results)} arkiverede faktaark parset på {elapsed:.2f} sek "
+          f"({sum(len(v) for v in navs.values())} NAV-punkter, {len(navs)} fonde)")
+    print(f"   {cache_stats(cache)}")
+    save_cache(cache)
+
+    history = read_json(HISTORY_FILE) if HISTORY_FILE.exists() else {}
+
+    changed = added = 0
+    for isin, points in navs.items():
+        existing = {} if replace else history.get(isin, {})
+        for d, nav in points.items():
+            if d not in existing:
+                added += 1
+            elif existing[d] != nav:
+                changed += 1
+            existing[d] = nav
+        history[isin] = dict(sorted(existing.items()))
+
+    print(f"   {added} nye punkter, {changed} punkter rettet"
+          f"{' (erstat-tilstand)' if replace else ''}")
+
+    if dry_run:
+        print("   Dry-run — pfa_history.json er ikke ændret.")
+        return history
+
+    save_history("pfa", history)
+    # Rettede ældre punkter skal valideres forfra næste gang
+    # (validation_engine importeres her — den trækker numpy med)
+    from validation_engine import reset_watermarks
+    reset_watermarks("pfa", list(navs))
+    print(f"✅ {HISTORY_FILE.name} genopbygget fra arkivet.")
+    return history
+
+
+# ==========================================
+# IMPORT AF EKSISTERENDE TEKSTFILER
+# ==========================================
+
+def import_text_dir(text_dir=TEXT_DIR):
+    """Arkiverer alle nuværende build/text/*.txt (bruges til at starte arkivet)."""
+    index = load_index()
+    cache = load_cache()
+    new_objects = 0
+    files = sorted(text_dir.glob("*.txt"))
+    for txt_file in files:
+        isin   = txt_file.stem
+        text   = txt_file.read_text(encoding="utf-8", errors="ignore")
+        sha    = text_digest(text)
+        parsed = parse_cached(isin, text, cache, sha=sha)
+        _, is_new = archive_text(isin, text, parsed.get("nav_date"), index, sha=sha)
+        new_objects += is_new
+    save_index(index)
+    save_cache(cache)
+    print(f"✅ {len(files)} tekstfiler arkiveret ({new_objects} nye objekter).")
+
+
+def print_stats():
+    index   = load_index()
+    shas    = {sha for dates in index.values() for sha in dates.values()}
+    entries = sum(len(dates) for dates in index.values())
+    size    = sum(_object_path(s).stat().st_size for s in shas if _object_path(s).exists())
+    print(f"📦 Arkiv: {len(index)} fonde, {entries} (isin, nav_date)-nøgler, "
+          f"{len(shas)} unikke objekter, {size / 1024:.0f} KB komprimeret")
+
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Arkiv og bulk re-parse af PFA faktaark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("import", help="Arkivér nuværende build/text/*.txt")
+    sub.add_parser("stats",  help="Vis arkivstatistik")
+
+    p_rebuild = sub.add_parser("rebuild", help="Genopbyg pfa_history.json fra arkivet")
+    p_rebuild.add_argument("--replace", action="store_true",
+                           help="Behold kun rigtige arkiverede NAV'er for arkiverede fonde")
+    p_rebuild.add_argument("--workers", type=int, default=None,
+                           help="Antal processer (standard: antal CPU'er)")
+    p_rebuild.add_argument("--dry-run", action="store_true",
+                           help="Vis ændringer uden at skrive pfa_history.json")
+    p_rebuild.add_argument("--isin", action="append", default=None,
+                           help="Begræns til ISIN (kan gentages)")
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        import_text_dir()
+    elif args.command == "stats":
+        print_stats()
+    elif args.command == "rebuild":
+        rebuild_history(
+            replace=args.replace,
+            workers=args.workers,
+            dry_run=args.dry_run,
+            isins=set(args.isin) if args.isin else None,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+pfa_backfill.py — Syntetisk backfill som separat lag
+=====================================================
+Nye fonde har ingen historik, så MA-beregninger kan ikke starte. Backfill
+estimerer historiske kurser baglæns ud fra de officielle afkasttal i
+faktaarket (1W/1M/3M/6M/1Y).
+
+Backfill-punkter skrives IKKE i pfa_history.json. De gemmes i et separat
+overlay med proveniens:
+
+  data/pfa_backfill.json
+  {isin: {dato: {"nav": 98.12, "source": "return_1m",
+                 "base_date": "2026-04-27", "base_nav": 101.3}}}
+
+Læsere fletter overlayet ind ved behov (kun for fonde der har et), og
+overlayet for en fond slettes når der er nok rigtig historik (MA200).
+
+Regel for rapporterne:
+  - MA, kryds og trend-tilstand bruger den flettede serie (bootstrap)
+  - RSI, volatilitet, drawdown og dagsændring bruger kun rigtige punkter
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from data_store import load_json, save_json
+from utils import is_trading_day
+
+ROOT         = Path(__file__).resolve().parents[1]
+OVERLAY_FILE = ROOT / "data/pfa_backfill.json"
+
+# Afkast-nøgle i faktaarket → antal kalenderdage bagud
+BACKFILL_INTERVALS = {
+    '1w':  7,
+    '1m':  30,
+    '3m':  91,
+    '6m':  182,
+    '1y':  365,
+}
+
+# Når en fond har så mange rigtige handelsdage, er backfill overflødigt (MA200)
+MIN_REAL_POINTS = 200
+
+
+# ==========================================
+# FIL
+# ==========================================
+
+def load_overlay():
+    return load_json(OVERLAY_FILE, {})
+
+
+def save_overlay(overlay):
+    cleaned = {isin: dict(sorted(points.items())) for isin, points in overlay.items() if points}
+    save_json(OVERLAY_FILE, dict(sorted(cleaned.items())))
+
+
+# ==========================================
+# BEREGNING
+# ==========================================
+
+def calculate_backfill(nav, nav_date_str, returns):
+    """
+    Beregner historiske kurspunkter baglæns baseret på officielle afkasttal.
+
+    Formel: hist_kurs = nuværende_kurs / (1 + afkast_pct/100)
+
+    Returnerer {dato: {"nav", "source", "base_date", "base_nav"}}.
+    """
+    backfill = {}
+    try:
+        current_date = datetime.strptime(nav_date_str, '%Y-%m-%d')
+    except Exception:
+        current_date = datetime.now()
+
+    for key, days in BACKFILL_INTERVALS.items():
+        pct = returns.get(f'return_{key}')
+        if pct is not None and isinstance(pct, (int, float)):
+            hist_date = (current_date - timedelta(days=days)).strftime('%Y-%m-%d')
+            backfill[hist_date] = {
+                "nav":       round(nav / (1 + (pct / 100)), 2),
+                "source":    f"return_{key}",
+                "base_date": nav_date_str,
+                "base_nav":  nav,
+            }
+
+    return backfill
+
+
+def add_backfill(overlay, isin, nav, nav_date_str, returns, real_points):
+    """
+    Tilføjer backfill-punkter for én fond til overlayet.
+    Overskriver ALDRIG rigtige datapunkter eller eksisterende backfill.
+    Fonde med nok rigtig historik får intet backfill.
+
+    Returnerer antal tilføjede punkter.
+    """
+    if _real_count(real_points) >= MIN_REAL_POINTS:
+        return 0
+
+    points = overlay.setdefault(isin, {})
+    added  = 0
+    for h_date, entry in calculate_backfill(nav, nav_date_str, returns).items():
+        if h_date not in real_points and h_date not in points:
+            points[h_date] = entry
+            added += 1
+    return added
+
+
+def _real_count(real_points):
+    return sum(1 for d in real_points if is_trading_day(d))
+
+
+def prune_overlay(overlay, history):
+    """
+    Rydder overlayet:
+      - backfill-datoer der nu har et rigtigt punkt fjernes
+      - hele fonden fjernes når den har MIN_REAL_POINTS rigtige handelsdage
+
+    Returnerer antal fonde hvis overlay er fjernet helt.
+    """
+    dropped = 0
+    for isin in list(overlay):
+        real_points = history.get(isin, {})
+        if _real_count(real_points) >= MIN_REAL_POINTS:
+            del overlay[isin]
+            dropped += 1
+            continue
+        overlay[isin] = {d: e for d, e in overlay[isin].items() if d not in real_points}
+        if not overlay[isin]:
+            del overlay[isin]
+    return dropped
+
+
+# ==========================================
+# LÆSNING (flettet serie)
+# ==========================================
+
+def merged_points(history, overlay, isin):
+    """
+    Returnerer {dato: kurs} med rigtige punkter + backfill for én fond.
+    Uden overlay returneres historikken direkte (ingen kopi).
+    """
+    real_points = history.get(isin, {})
+    synthetic   = overlay.get(isin)
+    if not synthetic:
+        return real_points
+    merged = {d: e["nav"] for d, e in synthetic.items()}
+    merged.update(real_points)
+    return merged
+
+
+def indicator_series(history, overlay, isin):
+    """
+    Returnerer (ma_prices, real_prices) — handelsdage, sorteret kronologisk.
+
+    ma_prices:   rigtige punkter + backfill (til MA, kryds og trend)
+    real_prices: kun rigtige punkter (til RSI, volatilitet, drawdown)
+
+    Uden overlay er de to lister samme objekt.
+    """
+    real_points = history.get(isin, {})
+    real_prices = [real_points[d] for d in sorted(real_points) if is_trading_day(d)]
+    if not overlay.get(isin):
+        return real_prices, real_prices
+
+    merged    = merged_points(history, overlay, isin)
+    ma_prices = [merged[d] for d in sorted(merged) if is_trading_day(d)]
+    return ma_prices, real_prices
+
+
+def with_nav(prices, nav):
+    """Sikrer at dagens NAV er sidste punkt (returnerer ny liste)."""
+    if not prices or prices[-1] != nav:
+        return prices + [nav]
+    return list(prices)
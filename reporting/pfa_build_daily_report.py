@@ -1,27 +1,22 @@
-import json
 import sys
-import time
 from pathlib import Path
 from datetime import datetime
-from jinja2 import Template
 
 # Tilføj reporting/ til Python-stien så utils.py kan importeres
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from utils import (
-    get_ma, get_best_ma, get_rsi, get_volatility,
-    calculate_drawdown, get_cross_signal, get_trend_state,
-    check_trail_stop, days_since_hwm, is_trading_day,
-)
+from data_store import read_json, load_json, load_hwm, save_hwm
+from templating import get_template, write_atomic
+from trail_engine import run_trail_stops
+from analytics_snapshot import get_snapshot
+from pfa_freshness import known_nav_date, wait_for_upstream
 
 # ==========================================
 # KONFIGURATION & STIER
 # ==========================================
 ROOT           = Path(__file__).resolve().parents[1]
 DATA_FILE      = ROOT / "data/pfa_latest.json"
-HISTORY_FILE   = ROOT / "data/pfa_history.json"
 PORTFOLIO_FILE = ROOT / "config/pfa_portfolio.json"
-HWM_FILE           = ROOT / "data/pfa_hwm.json"
 RANK_HISTORY_FILE  = ROOT / "data/pfa_rank_history.json"
 TEMPLATE_FILE  = ROOT / "templates/pfa_daily.html.j2"
 REPORT_FILE    = ROOT / "build/pfa_daily.html"
@@ -33,69 +28,69 @@ TOTAL_RETURN_ALERT_PCT = -8.0    # Tab fra købspris
 TRAIL_STOP_PCT         = 3.0     # HWM Trail Stop (deles med weekly/monthly)
 
 
-def load_high_water_marks():
-    if HWM_FILE.exists():
-        try:
-            with open(HWM_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return {}
-
-
-def save_high_water_marks(hwm_data):
-    HWM_FILE.parent.mkdir(exist_ok=True)
-    with open(HWM_FILE, "w", encoding="utf-8") as f:
-        json.dump(hwm_data, f, indent=2)
-
-
 def load_rank_history():
-    if RANK_HISTORY_FILE.exists():
-        try:
-            with open(RANK_HISTORY_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return {}
-
-
-def build_report():
-
-    # 1. RETRY-LOGIK — vent på friske data (maks 3 forsøg x 5 min)
-    max_retries = 3
-    retry_delay = 300
-    latest_data = []
-
-    for attempt in range(max_retries):
-        if not DATA_FILE.exists():
-            print(f"FEJL: {DATA_FILE} mangler.")
+    return load_json(RANK_HISTORY_FILE, {})
+
+
+def wait_for_fresh_data():
+    """
+    Vent på friske data — uden faste pauser.
+
+    Er pfa_latest.json skrevet i dag, bygges der direkte. Ellers spørges
+    PFA (pfa_freshness.py: betingede GETs, backoff, deadline); så snart der
+    er nyere kurser, køres pipelinen, og rapporten bygges på de nye data.
+    Returnerer latest-listen eller None hvis filen mangler.
+    """
+    if not DATA_FILE.exists():
+        print(f"FEJL: {DATA_FILE} mangler.")
+        return None
+
+    latest_data = read_json(DATA_FILE)
+
+    file_mod_time = datetime.fromtimestamp(DATA_FILE.stat().st_mtime).date()
+    if file_mod_time == datetime.now().date():
+        print(f"Data er frisk (fra i dag {file_mod_time}). Starter build...")
+        return latest_data
+
+    print(f"Data er fra {file_mod_time} — tjekker om PFA har nye kurser...")
+    fresh, _ = wait_for_upstream(known_date=known_nav_date(latest_data))
+    if not fresh:
+        print("Advarsel: Kører på gårsdagens data — PFA har ikke opdateret endnu.")
+        return latest_data
+
+    # Nye kurser hos PFA — hent, parse og gem dem før rapporten bygges
+    from pfa_pipeline import run_pipeline
+    result = run_pipeline(build_report_stage=False)
+    return result[0] if result else latest_data
+
+
+def build_report(latest_data=None, history=None, backfill=None):
+    """
+    Bygger daily-rapporten og README.md.
+
+    latest_data / history / backfill: kan gives direkte fra pfa_pipeline.py,
+    så data ikke skal genindlæses fra disk. Mangler de, læses filerne (efter
+    freshness-tjek mod PFA).
+    Nøgletal pr. fond kommer fra analyse-snapshottet (analytics_snapshot.py) —
+    historikken indlæses kun hvis snapshottet skal beregnes.
+    """
+
+    # 1. FRISKE DATA
+    if latest_data is None:
+        latest_data = wait_for_fresh_data()
+        if latest_data is None:
             return
 
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            latest_data = json.load(f)
-
-        file_mod_time = datetime.fromtimestamp(DATA_FILE.stat().st_mtime).date()
-        if file_mod_time == datetime.now().date():
-            print(f"Data er frisk (fra i dag {file_mod_time}). Starter build...")
-            break
-        else:
-            if attempt < max_retries - 1:
-                print(f"Forsøg {attempt+1}: Data er fra i går. Venter {retry_delay//60} min...")
-                time.sleep(retry_delay)
-            else:
-                print("Advarsel: Kører på gårsdagens data — PFA har ikke opdateret endnu.")
-
     # 2. INDLÆS FILER
     try:
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            history = json.load(f)
-        with open(PORTFOLIO_FILE, "r", encoding="utf-8") as f:
-            portfolio = json.load(f)
+        portfolio = read_json(PORTFOLIO_FILE)
     except Exception as e:
         print(f"Fejl ved indlæsning: {e}")
         return
 
-    hwm_data     = load_high_water_marks()
+    metrics = get_snapshot("pfa", latest=latest_data, history=history, overlay=backfill)["funds"]
+
+    hwm_data     = load_hwm("pfa")
     rank_history = load_rank_history()
     today_str = datetime.now().strftime('%Y-%m-%d')
     timestamp = datetime.now().strftime('%d-%m-%Y %H:%M')
@@ -103,6 +98,17 @@ def build_report():
     processed_list = []
     daily_alerts   = []   # Samler alle signaler til mail-beslutning
 
+    # Trail Stop for alle aktive fonde i ét kald (deler HWM med weekly/monthly)
+    trail_positions = []
+    for item in latest_data:
+        isin, nav = item.get('isin'), item.get('nav')
+        p_info    = portfolio.get(isin, {})
+        if isin is None or not nav or not p_info.get('active', False) or not p_info.get('buy_price'):
+            continue
+        trail_positions.append({"isin": isin, "curr": nav, "buy": p_info['buy_price']})
+    trail_entries, trail_alerts = run_trail_stops(trail_positions, hwm_data, today_str, TRAIL_STOP_PCT)
+    hwm_data.update(trail_entries)
+
     # 3. BEHANDL HVER FOND
     for item in latest_data:
         isin = item.get('isin')
@@ -110,31 +116,22 @@ def build_report():
         if nav is None or isin is None:
             continue
 
-        # Historik — kun handelsdage
-        price_dict   = history.get(isin, {})
-        sorted_dates = [d for d in sorted(price_dict.keys()) if is_trading_day(d)]
-        prices       = [price_dict[d] for d in sorted_dates]
-
-        # Sikr dagens NAV er med
-        if not prices or prices[-1] != nav:
-            prices.append(nav)
-
-        # --- TEKNISKE BEREGNINGER via utils.py ---
-        ma20       = get_ma(prices, 20)
-        ma50       = get_ma(prices, 50)
-        ma200      = get_ma(prices, 200)
-        ma_val, ma_label = get_best_ma(prices)
-        rsi        = get_rsi(prices, 14)
-        volatility = get_volatility(prices, 20)
-        drawdown   = calculate_drawdown(prices)
-        cross      = get_cross_signal(prices)
-        t_state    = get_trend_state(prices)
+        # --- TEKNISKE NØGLETAL (analyse-snapshot) ---
+        m          = metrics[isin]
+        ma200      = m['ma200']
+        ma_val     = m['ma_val']
+        ma_label   = m['ma_label']
+        rsi        = m['rsi']
+        volatility = m['volatility']
+        drawdown   = m['drawdown']
+        cross      = m['cross']
+        t_state    = m['trend_state']
 
         # Afstand til bedste tilgængelige MA (MA200 > MA50 > MA20)
         dist_ma200 = round(((nav - ma_val) / ma_val * 100), 2) if ma_val else 0.0
 
         # Daglig ændring
-        prev_nav = prices[-2] if len(prices) > 1 else nav
+        prev_nav = m['prev_nav']
         day_chg  = round(((nav - prev_nav) / prev_nav * 100), 2) if prev_nav else 0.0
 
         # KØB/SALG signal — kun ved MA200-kryds (kræver nok historik)
@@ -161,10 +158,7 @@ def build_report():
         # Trail Stop (kun aktive fonde — deler HWM med weekly/monthly)
         trail_alert = None
         if is_active and buy_p and nav:
-            hwm_entry, trail_alert = check_trail_stop(
-                isin, nav, buy_p, hwm_data, today_str, TRAIL_STOP_PCT
-            )
-            hwm_data[isin] = hwm_entry
+            trail_alert = trail_alerts.get(isin)
             if trail_alert:
                 trail_alert["name"] = p_info.get("name", isin)
 
@@ -227,7 +221,7 @@ def build_report():
         })
 
     # Gem opdateret HWM
-    save_high_water_marks(hwm_data)
+    save_hwm("pfa", hwm_data)
 
     # 4. SORTERING — aktive øverst, derefter signaler, derefter alfabetisk
     processed_list.sort(key=lambda x: (
@@ -260,7 +254,7 @@ def build_report():
             )
 
     try:
-        README_FILE.write_text("\n".join(readme_lines), encoding="utf-8")
+        write_atomic(README_FILE, "\n".join(readme_lines))
     except Exception as e:
         print(f"Kunne ikke skrive README: {e}")
 
@@ -269,7 +263,7 @@ def build_report():
         print(f"❌ Template mangler: {TEMPLATE_FILE}")
         return
 
-    template   = Template(TEMPLATE_FILE.read_text(encoding="utf-8"))
+    template   = get_template(TEMPLATE_FILE.name)
     total_market_count = len(latest_data)
 
     html_output = template.render(
@@ -281,8 +275,7 @@ def build_report():
         trail_stop_pct     = TRAIL_STOP_PCT,
         total_market_count = total_market_count,
     )
-    REPORT_FILE.parent.mkdir(exist_ok=True)
-    REPORT_FILE.write_text(html_output, encoding="utf-8")
+    write_atomic(REPORT_FILE, html_output)
 
     active_alerts = len(daily_alerts)
     print(f"✅ Daily rapport færdig: {len(processed_list)} fonde analyseret.")
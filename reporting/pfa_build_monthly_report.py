@@ -1,20 +1,22 @@
-import json
 import sys
 from pathlib import Path
 from datetime import datetime
-from jinja2 import Template
 
 # Tilføj reporting/ til Python-stien så utils.py kan importeres
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
+from data_store import read_json, load_json, load_hwm, save_hwm
+from templating import get_template, write_atomic
 from utils import (
-    get_ma, get_best_ma, get_rsi,
     get_trend_velocity, get_momentum_status,
-    get_cross_signal, get_trend_state, get_trend_shift,
-    check_trail_stop, is_trading_day,
+    get_trend_shift_from_state,
 )
+from trail_engine import run_trail_stops
+from analytics_snapshot import get_snapshot
 from trades_summary import load_trades, get_summary, format_for_template
 from portfolio_hwm import load_portfolio_hwm, save_portfolio_hwm, update_and_get_drawdown, format_drawdown_for_template
+from portfolio_hwm import sync_curve, LOCK as PORTFOLIO_HWM_LOCK
+from portfolio_valuation import value_portfolio
 from sector_heatmap import build_heatmap, get_concentration_warning
 
 # ==========================================
@@ -22,11 +24,9 @@ from sector_heatmap import build_heatmap, get_concentration_warning
 # ==========================================
 ROOT = Path(__file__).resolve().parents[1]
 DATA_FILE          = ROOT / "data/pfa_latest.json"
-HISTORY_FILE       = ROOT / "data/pfa_history.json"
 PORTFOLIO_FILE     = ROOT / "config/pfa_portfolio.json"
 TEMPLATE_FILE      = ROOT / "templates/pfa_monthly.html.j2"
 REPORT_FILE        = ROOT / "build/pfa_monthly.html"
-HWM_FILE           = ROOT / "data/pfa_hwm.json"
 TRADES_FILE        = ROOT / "config/trades.json"
 PORTFOLIO_HWM_FILE = ROOT / "data/portfolio_hwm.json"
 RANK_HISTORY_FILE  = ROOT / "data/pfa_rank_history.json"
@@ -36,13 +36,7 @@ TRAIL_STOP_PCT = 3.0
 
 
 def load_rank_history():
-    if RANK_HISTORY_FILE.exists():
-        try:
-            with open(RANK_HISTORY_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return {}
+    return load_json(RANK_HISTORY_FILE, {})
 
 
 def build_overlap_data(active_isins, latest_map):
@@ -106,26 +100,6 @@ def build_fund_risk_data(active_rows, latest_map, rank_history):
     return rows
 
 
-# ==========================================
-# HWM — fil-håndtering (ikke i utils.py)
-# ==========================================
-
-def load_high_water_marks():
-    if HWM_FILE.exists():
-        try:
-            with open(HWM_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return {}
-
-
-def save_high_water_marks(hwm_data):
-    HWM_FILE.parent.mkdir(exist_ok=True)
-    with open(HWM_FILE, "w", encoding="utf-8") as f:
-        json.dump(hwm_data, f, indent=2)
-
-
 # ==========================================
 # HJÆLPEFUNKTIONER (monthly-specifikke)
 # ==========================================
@@ -155,22 +129,22 @@ def validate_data(latest_map, portfolio):
 # HOVEDFUNKTION
 # ==========================================
 
-def build_monthly():
-    if not DATA_FILE.exists() or not PORTFOLIO_FILE.exists() or not HISTORY_FILE.exists():
-        print("KRITISK FEJL: Data- eller historikfil mangler.")
+def build_monthly(latest_list=None):
+    """latest_list: kan gives direkte (fx fra render_all.py), ellers læses filen."""
+    if not DATA_FILE.exists() or not PORTFOLIO_FILE.exists():
+        print("KRITISK FEJL: Data- eller porteføljefil mangler.")
         return
 
     try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            latest_list = json.load(f)
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            history = json.load(f)
-        with open(PORTFOLIO_FILE, "r", encoding="utf-8") as f:
-            portfolio = json.load(f)
+        if latest_list is None:
+            latest_list = read_json(DATA_FILE)
+        portfolio = read_json(PORTFOLIO_FILE)
     except Exception as e:
         print(f"Fejl ved indlæsning: {e}")
         return
 
+    metrics = get_snapshot("pfa", latest=latest_list)["funds"]
+
     rank_map, total_market_count = get_ranking_data(latest_list)
     latest_map = {item['isin']: item for item in latest_list}
     validation_warnings = validate_data(latest_map, portfolio)
@@ -181,12 +155,13 @@ def build_monthly():
     timestamp    = now.strftime('%d-%m-%Y %H:%M')
     week_number  = now.strftime('%V')
 
-    hwm_data = load_high_water_marks()
+    hwm_data = load_hwm("pfa")
 
     active_rows          = []
     sold_rows            = []
     active_returns_total = []
     trail_stop_alerts    = []
+    trail_positions      = []
 
     for isin, p_info in portfolio.items():
         if isin not in latest_map:
@@ -200,22 +175,15 @@ def build_monthly():
 
         total_return = round(((curr_p - buy_p) / buy_p * 100), 2) if buy_p > 0 else 0
 
-        # MA & RSI fra historik — kun handelsdage
-        p_dict = history.get(isin, {})
-        sorted_dates = [d for d in sorted(p_dict.keys()) if is_trading_day(d)]
-        prices = [p_dict[d] for d in sorted_dates]
-
-        # Sikr dagens NAV er med
-        if not prices or prices[-1] != curr_p:
-            prices.append(curr_p)
-
-        rsi_val          = get_rsi(prices, 14)
-        ma_val, ma_label = get_best_ma(prices)
+        # MA & RSI fra analyse-snapshottet
+        m                = metrics[isin]
+        rsi_val          = m['rsi']
+        ma_val, ma_label = m['ma_val'], m['ma_label']
 
         # Trend shift — sammenligner med gemt tilstand fra HWM-filen
-        prev_trend = hwm_data.get(isin, {}).get('trend_state')
-        t_state    = get_trend_state(prices)
-        trend_shift = get_trend_shift(prices, prev_trend)
+        prev_trend  = hwm_data.get(isin, {}).get('trend_state')
+        t_state     = m['trend_state']
+        trend_shift = get_trend_shift_from_state(t_state, prev_trend)
 
         # Gem nuværende trend_state til næste kørsel
         if isin in hwm_data:
@@ -268,25 +236,28 @@ def build_monthly():
             active_rows.append(fund_data)
             active_returns_total.append(total_return)
 
-            # Trail Stop check via utils.py
-            hwm_entry, alert = check_trail_stop(
-                isin, curr_p, buy_p, hwm_data, today_str, TRAIL_STOP_PCT
-            )
-            hwm_data[isin] = hwm_entry
-            if alert:
-                alert["name"] = p_info.get('name', isin)
-                trail_stop_alerts.append(alert)
-                print(
-                    f"🔔 TRAIL STOP: {alert['name']} faldet {alert['fall_pct']}% "
-                    f"fra top {alert['hwm']} ({alert['hwm_date']}) → nu {alert['curr']}"
-                )
+            trail_positions.append({"isin": isin, "curr": curr_p, "buy": buy_p})
         else:
             fund_data["sell_date"]  = p_info.get('sell_date', 'N/A')
             fund_data["sell_price"] = p_info.get('sell_price', 'N/A')
             sold_rows.append(fund_data)
 
+    # Trail Stop for alle aktive i ét kald — efter løkken, så trend_state
+    # er sat i hwm_data som før
+    trail_entries, trail_alerts = run_trail_stops(trail_positions, hwm_data, today_str, TRAIL_STOP_PCT)
+    hwm_data.update(trail_entries)
+    for p in trail_positions:
+        alert = trail_alerts.get(p["isin"])
+        if alert:
+            alert["name"] = portfolio[p["isin"]].get('name', p["isin"])
+            trail_stop_alerts.append(alert)
+            print(
+                f"🔔 TRAIL STOP: {alert['name']} faldet {alert['fall_pct']}% "
+                f"fra top {alert['hwm']} ({alert['hwm_date']}) → nu {alert['curr']}"
+            )
+
     # Gem opdaterede HWM (deles med daily og weekly)
-    save_high_water_marks(hwm_data)
+    save_hwm("pfa", hwm_data)
 
     # --- TOP 5 MARKEDSMULIGHEDER ---
     unsorted_opps = [
@@ -331,9 +302,16 @@ def build_monthly():
     trades_data = format_for_template(pfa_summary)
 
     # --- PORTEFØLJE DRAWDOWN ---
-    portfolio_hwm = load_portfolio_hwm(str(PORTFOLIO_HWM_FILE))
-    dd_raw = update_and_get_drawdown(portfolio_hwm, "pfa", today_str, round(avg_port_return, 2))
-    save_portfolio_hwm(portfolio_hwm, str(PORTFOLIO_HWM_FILE))
+    # Positionsvægtet TWR fra handlerne — snittet pr. fond kun uden handler
+    valuation = value_portfolio("pfa", trades=trades)
+    with PORTFOLIO_HWM_LOCK:
+        portfolio_hwm = load_portfolio_hwm(str(PORTFOLIO_HWM_FILE))
+        if valuation:
+            sync_curve(portfolio_hwm, "pfa", valuation["kurve"]["datoer"], valuation["kurve"]["twr"])
+            dd_raw = update_and_get_drawdown(portfolio_hwm, "pfa", valuation["dato"], valuation["twr_pct"])
+        else:
+            dd_raw = update_and_get_drawdown(portfolio_hwm, "pfa", today_str, round(avg_port_return, 2))
+        save_portfolio_hwm(portfolio_hwm, str(PORTFOLIO_HWM_FILE))
     drawdown_data = format_drawdown_for_template(dd_raw)
 
     # --- SEKTOR HEATMAP ---
@@ -349,7 +327,7 @@ def build_monthly():
         print(f"❌ Template mangler: {TEMPLATE_FILE}")
         return
 
-    template = Template(TEMPLATE_FILE.read_text(encoding="utf-8"))
+    template = get_template(TEMPLATE_FILE.name)
     html_output = template.render(
         timestamp            = timestamp,
         week_number          = week_number,
@@ -374,8 +352,7 @@ def build_monthly():
         fund_risk_data       = fund_risk_data,
     )
 
-    REPORT_FILE.parent.mkdir(exist_ok=True)
-    REPORT_FILE.write_text(html_output, encoding="utf-8")
+    write_atomic(REPORT_FILE, html_output)
     print(f"✅ Deep Dive Rapport færdig (Uge {week_number}).")
     if trail_stop_alerts:
         print(f"   ⚠️  {len(trail_stop_alerts)} trail stop-advarsel(er) i rapporten.")
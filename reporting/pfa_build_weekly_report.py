@@ -8,30 +8,29 @@ Genererer build/pfa_weekly.html med:
   - Markedsmuligheder (BULL-fonde ikke i portefølje med momentum > 2%)
   - Trail Stop advarsler med HWM
 
+Nøgletal pr. fond (MA, RSI, kryds, trend, drawdown, ÅTD) læses fra
+analyse-snapshottet (analytics_snapshot.py) — typisk beregnet af daily.
+Ugens afkast er positionsvægtet (TWR fra portfolio_valuation.py).
+
 Køres af .github/workflows/pfa_weekly.yml (lørdag kl. 07:00)
 """
 
-import json
 import sys
 from pathlib import Path
 from datetime import datetime
-from jinja2 import Template
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from utils import (
-    get_ma, get_best_ma, get_rsi,
-    calculate_drawdown, calculate_ytd,
-    get_cross_signal, get_trend_state,
-    check_trail_stop, is_trading_day,
-)
+from data_store import load_json, load_latest, load_portfolio, load_hwm, save_hwm
+from templating import get_template, write_atomic
+from trail_engine import run_trail_stops
+from analytics_snapshot import get_snapshot
+from portfolio_valuation import value_portfolio, period_return
 from sector_heatmap import build_heatmap, get_concentration_warning
 
 ROOT           = Path(__file__).resolve().parents[1]
 DATA_FILE      = ROOT / "data/pfa_latest.json"
-HISTORY_FILE   = ROOT / "data/pfa_history.json"
 PORTFOLIO_FILE = ROOT / "config/pfa_portfolio.json"
-HWM_FILE       = ROOT / "data/pfa_hwm.json"
 RANK_HISTORY_FILE = ROOT / "data/pfa_rank_history.json"
 TEMPLATE_FILE  = ROOT / "templates/pfa_weekly.html.j2"
 REPORT_FILE    = ROOT / "build/pfa_weekly.html"
@@ -40,13 +39,7 @@ TRAIL_STOP_PCT = 3.0
 
 
 def load_rank_history():
-    if RANK_HISTORY_FILE.exists():
-        try:
-            with open(RANK_HISTORY_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return {}
+    return load_json(RANK_HISTORY_FILE, {})
 
 
 def get_rank_trend(isin, rank_history):
@@ -84,45 +77,20 @@ def get_rank_trend(isin, rank_history):
     return dots, label, hist_str
 
 
-def load_high_water_marks():
-    if HWM_FILE.exists():
-        try:
-            with open(HWM_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return {}
-
-
-def save_high_water_marks(hwm_data):
-    HWM_FILE.parent.mkdir(exist_ok=True)
-    with open(HWM_FILE, "w", encoding="utf-8") as f:
-        json.dump(hwm_data, f, indent=2)
-
-
-def load_json(path, default):
-    if not path.exists():
-        return default
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Kunne ikke læse {path}: {e}")
-        return default
-
-
-def build_weekly():
+def build_weekly(latest=None):
+    """latest: kan gives direkte (fx fra render_all.py), ellers læses filen."""
     print("Starter generering af PFA ugerapport...")
 
-    for f in [DATA_FILE, HISTORY_FILE, PORTFOLIO_FILE, TEMPLATE_FILE]:
+    for f in [DATA_FILE, PORTFOLIO_FILE, TEMPLATE_FILE]:
         if not f.exists():
             print(f"FEJL: Mangler fil: {f}")
             return
 
-    latest    = load_json(DATA_FILE, [])
-    history   = load_json(HISTORY_FILE, {})
-    portfolio = load_json(PORTFOLIO_FILE, {})
-    hwm_data  = load_high_water_marks()
+    if latest is None:
+        latest = load_latest("pfa")
+    metrics   = get_snapshot("pfa", latest=latest)["funds"]
+    portfolio = load_portfolio("pfa")
+    hwm_data  = load_hwm("pfa")
     rank_history = load_rank_history()
 
     portfolio_isins = {
@@ -135,29 +103,35 @@ def build_weekly():
     rows                = []
     active_week_returns = []
 
+    # Trail Stop for alle aktive fonde i ét kald
+    trail_positions = []
+    for item in latest:
+        isin, nav = item.get('isin'), item.get('nav')
+        if not isin or nav is None or not metrics[isin]['ma_points'] or isin not in portfolio_isins:
+            continue
+        buy_price = portfolio[isin].get('buy_price', 0)
+        if buy_price and nav:
+            trail_positions.append({"isin": isin, "curr": nav, "buy": buy_price})
+    trail_entries, trail_alerts = run_trail_stops(trail_positions, hwm_data, today_str, TRAIL_STOP_PCT)
+    hwm_data.update(trail_entries)
+
     for item in latest:
         isin = item.get('isin')
         nav  = item.get('nav')
         if not isin or nav is None:
             continue
 
-        p_dict       = history.get(isin, {})
-        sorted_dates = [d for d in sorted(p_dict.keys()) if is_trading_day(d)]
-        p_list       = [p_dict[d] for d in sorted_dates]
-
-        if not p_list:
+        m = metrics[isin]
+        if not m['ma_points']:
             continue
 
         is_active = isin in portfolio_isins
 
-        if p_list[-1] != nav:
-            p_list.append(nav)
-
-        ma_val, ma_label = get_best_ma(p_list)
-        rsi              = get_rsi(p_list, 14)
-        cross            = get_cross_signal(p_list)
-        dd               = calculate_drawdown(p_list)
-        ytd              = calculate_ytd(p_dict)
+        ma_val, ma_label = m['ma_val'], m['ma_label']
+        rsi              = m['rsi']
+        cross            = m['cross']
+        dd               = m['drawdown']
+        ytd              = m['ytd']
 
         if ma_val and nav:
             momentum = round(((nav / ma_val) - 1) * 100, 2)
@@ -165,7 +139,7 @@ def build_weekly():
             momentum = round(item.get('return_1m') or 0.0, 2)
             ma_label = "1M proxy"
 
-        trend_state = get_trend_state(p_list)
+        trend_state = m['trend_state']
 
         rsi_alert = None
         if rsi is not None:
@@ -188,10 +162,7 @@ def build_weekly():
 
         trail_alert = None
         if is_active and buy_price and nav:
-            hwm_entry, trail_alert = check_trail_stop(
-                isin, nav, buy_price, hwm_data, today_str, TRAIL_STOP_PCT
-            )
-            hwm_data[isin] = hwm_entry
+            trail_alert = trail_alerts.get(isin)
             if trail_alert:
                 trail_alert["name"] = portfolio[isin].get("name", item.get('name', isin))
                 trail_stop_alerts.append(trail_alert)
@@ -235,9 +206,12 @@ def build_weekly():
         })
 
     # Gem HWM — deles med pfa_daily og pfa_monthly
-    save_high_water_marks(hwm_data)
+    save_hwm("pfa", hwm_data)
 
-    avg_portfolio_return = (
+    # Ugens afkast positionsvægtet (TWR) når handlerne kan værdiansættes
+    valuation   = value_portfolio("pfa") if active_week_returns else None
+    week_return = period_return(valuation) if valuation else None
+    avg_portfolio_return = week_return if week_return is not None else (
         sum(active_week_returns) / len(active_week_returns)
         if active_week_returns else 0.0
     )
@@ -272,7 +246,7 @@ def build_weekly():
         print(f"Template mangler: {TEMPLATE_FILE}")
         return
 
-    template = Template(TEMPLATE_FILE.read_text(encoding="utf-8"))
+    template = get_template(TEMPLATE_FILE.name)
     html = template.render(
         week_number          = datetime.now().isocalendar()[1],
         report_date          = datetime.now().strftime("%d. %B %Y"),
@@ -291,8 +265,7 @@ def build_weekly():
         total_market_count   = len(latest),
     )
 
-    REPORT_FILE.parent.mkdir(parents=True, exist_ok=True)
-    REPORT_FILE.write_text(html, encoding="utf-8")
+    write_atomic(REPORT_FILE, html)
 
     print(f"PFA Ugerapport genereret: {REPORT_FILE}")
     print(f"   {len(rows)} fonde analyseret")
@@ -0,0 +1,181 @@
+"""
+pfa_freshness.py — Vent på friske PFA-kurser uden faste pauser
+===============================================================
+Daily-rapporten ventede før op til 2 x 5 minutter med time.sleep(300),
+hvis pfa_latest.json var fra i går — uden at se efter om PFA faktisk
+havde opdateret imens. Her spørges kilden direkte:
+
+  - nogle få "vagt"-fonde (de første aktive ISIN'er) hentes fra FundConnect
+  - betingede GETs (If-None-Match / If-Modified-Since) — uændrede faktaark
+    koster et 304-svar; sender serveren ingen validatorer, springes
+    tekstudtrækket over når PDF'en er byte-identisk med sidste tjek
+  - eksponentiel backoff (30 s → 60 s → 120 s → 240 s) og en fast deadline
+
+Så snart en vagt-fond viser en nyere kursdato end den vi kender
+(pfa_latest.json), returneres der, og resten af pipelinen kan køre med
+det samme.
+
+Brug:
+  python reporting/pfa_freshness.py                  # exit 0 = friske data
+  python reporting/pfa_freshness.py --deadline 5     # vent højst 5 min
+"""
+
+import argparse
+import hashlib
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_store import load_json, load_latest
+from pfa import parse_pfa_from_text
+from pfa_pdf_to_text import FACTSHEET_URL, pdf_to_text
+
+ROOT        = Path(__file__).resolve().parents[1]
+CONFIG_FILE = ROOT / "config/pfa_pdfs.json"
+
+PROBE_ISINS   = 2       # Vagt-fonde pr. tjek — PFA opdaterer alle fonde samtidig
+INITIAL_DELAY = 30      # Sek før andet tjek
+MAX_DELAY     = 240     # Loft over backoff
+BACKOFF       = 2.0
+DEADLINE      = 600     # Sek — samme maks-ventetid som den gamle retry (2 x 5 min)
+
+
+def known_nav_date(latest=None):
+    """Nyeste kursdato vi allerede har (fra latest-listen eller pfa_latest.json)."""
+    if latest is None:
+        latest = load_latest("pfa")
+    dates = [item.get("nav_date") for item in latest if item.get("nav_date")]
+    return max(dates) if dates else None
+
+
+def probe_isins(count=PROBE_ISINS):
+    """De første aktive ISIN'er fra config/pfa_pdfs.json."""
+    isins  = load_json(CONFIG_FILE, [])
+    active = [i.strip() for i in isins if not i.strip().startswith(("#", "-"))]
+    return active[:count]
+
+
+# ==========================================
+# BETINGET GET
+# ==========================================
+
+def new_probe_state():
+    """Validatorer og sidst sete kursdato pr. ISIN — lever i én venteperiode."""
+    return {"etag": {}, "modified": {}, "sha": {}, "nav_date": {}, "requests": 0, "not_modified": 0}
+
+
+def probe(isin, session, state, timeout=30):
+    """
+    Henter ét faktaark betinget og returnerer dets kursdato.
+    Ved 304, netværksfejl eller uændret PDF returneres sidst sete dato.
+    """
+    headers = {}
+    if isin in state["etag"]:
+        headers["If-None-Match"] = state["etag"][isin]
+    if isin in state["modified"]:
+        headers["If-Modified-Since"] = state["modified"][isin]
+
+    state["requests"] += 1
+    try:
+        r = session.get(FACTSHEET_URL.format(isin=isin), headers=headers, timeout=timeout)
+    except Exception as e:
+        print(f"⚠️  Freshness-tjek fejlede for {isin}: {e}")
+        return state["nav_date"].get(isin)
+
+    if r.status_code == 304:
+        state["not_modified"] += 1
+        return state["nav_date"].get(isin)
+    if r.status_code != 200:
+        print(f"⚠️  Freshness-tjek for {isin}: status {r.status_code}")
+        return state["nav_date"].get(isin)
+
+    if r.headers.get("ETag"):
+        state["etag"][isin] = r.headers["ETag"]
+    if r.headers.get("Last-Modified"):
+        state["modified"][isin] = r.headers["Last-Modified"]
+
+    # Ingen validatorer fra serveren → sammenlign bytes før PDF-udtræk
+    sha = hashlib.sha256(r.content).hexdigest()
+    if state["sha"].get(isin) == sha:
+        return state["nav_date"].get(isin)
+    state["sha"][isin] = sha
+
+    try:
+        nav_date = parse_pfa_from_text(isin, pdf_to_text(r.content)).get("nav_date")
+    except Exception as e:
+        print(f"⚠️  Kunne ikke læse kursdato for {isin}: {e}")
+        nav_date = None
+    state["nav_date"][isin] = nav_date
+    return nav_date
+
+
+# ==========================================
+# VENT
+# ==========================================
+
+def wait_for_upstream(known_date=None, isins=None, deadline=DEADLINE,
+                      initial_delay=INITIAL_DELAY, max_delay=MAX_DELAY):
+    """
+    Poller vagt-fondene indtil PFA viser en kursdato nyere end known_date,
+    eller deadline (sek) er nået. Første tjek sker med det samme.
+
+    Returnerer (fresh, nav_date) — nav_date er den nyeste dato set hos PFA.
+    """
+    if known_date is None:
+        known_date = known_nav_date()
+    if isins is None:
+        isins = probe_isins()
+    if not isins:
+        print("⚠️  Ingen vagt-fonde at tjekke — springer freshness-tjek over.")
+        return False, None
+
+    import requests
+
+    state = new_probe_state()
+    start = time.monotonic()
+    end   = start + deadline
+    delay = initial_delay
+    attempt = 0
+
+    with requests.Session() as session:
+        while True:
+            attempt += 1
+            dates  = [probe(isin, session, state) for isin in isins]
+            newest = max((d for d in dates if d), default=None)
+            waited = time.monotonic() - start
+
+            if newest and (known_date is None or newest > known_date):
+                print(f"✅ Friske PFA-kurser ({newest}, kendt: {known_date}) "
+                      f"efter {attempt} tjek / {waited:.0f} sek "
+                      f"({state['requests']} kald, {state['not_modified']} x 304).")
+                return True, newest
+
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                print(f"⏰ Deadline nået efter {waited:.0f} sek — PFA viser stadig {newest or '?'} "
+                      f"(kendt: {known_date}).")
+                return False, newest
+
+            pause = min(delay, remaining)
+            print(f"⏳ Tjek {attempt}: PFA viser {newest or '?'} (kendt: {known_date}). "
+                  f"Næste tjek om {pause:.0f} sek...")
+            time.sleep(pause)
+            delay = min(delay * BACKOFF, max_delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vent på friske PFA-kurser (betingede GETs + backoff)")
+    parser.add_argument("--deadline", type=float, default=DEADLINE / 60,
+                        help=f"Maks ventetid i minutter (standard: {DEADLINE // 60})")
+    parser.add_argument("--probes", type=int, default=PROBE_ISINS,
+                        help=f"Antal vagt-fonde pr. tjek (standard: {PROBE_ISINS})")
+    args = parser.parse_args()
+
+    fresh, _ = wait_for_upstream(isins=probe_isins(max(1, args.probes)), deadline=args.deadline * 60)
+    return 0 if fresh else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
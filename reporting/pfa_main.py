@@ -1,18 +1,18 @@
-import json
 import sys
 from pathlib import Path
-from datetime import datetime, timedelta
 
 # Tilføj reporting/ til Python-stien så pfa.py kan importeres
 # uanset hvorfra scriptet kaldes (repo-rod eller reporting/)
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from pfa import parse_pfa_from_text
+from data_store import read_json, load_history, save_history, save_latest
+from pfa_archive import load_index, save_index, archive_text
+from pfa_backfill import load_overlay, save_overlay, add_backfill, prune_overlay
+from parse_cache import load_cache, save_cache, parse_cached, text_sha, cache_stats
+from volatility_guard import create_guard, check_point, accept_point, reject_point, save_guard
 
 ROOT          = Path(__file__).resolve().parents[1]
 TEXT_DIR      = ROOT / "build/text"
-OUT_FILE      = ROOT / "data/pfa_latest.json"
-HISTORY_FILE  = ROOT / "data/pfa_history.json"
 CONFIG_FILE   = ROOT / "config/pfa_pdfs.json"
 
 # Maksimalt tilladt dagligt kurs-hop i % før vi afviser datapunktet.
@@ -21,134 +21,114 @@ CONFIG_FILE   = ROOT / "config/pfa_pdfs.json"
 VOLATILITY_GUARD_PCT = 0.15
 
 
-def calculate_backfill(nav, nav_date_str, returns):
-    """
-    Beregner historiske kurspunkter baglæns baseret på officielle afkasttal.
-    Bruges til at bootstrappe historik for nyoprettede fonde i systemet.
-
-    VIGTIGT: Backfill-punkter må aldrig overskrive eksisterende rigtige data.
-    De bruges KUN til at fylde huller ud, så MA-beregninger kan starte hurtigere.
-
-    Formel: hist_kurs = nuværende_kurs / (1 + afkast_pct/100)
-    """
-    backfill = {}
-    try:
-        current_date = datetime.strptime(nav_date_str, '%Y-%m-%d')
-    except Exception:
-        current_date = datetime.now()
-
-    intervals = {
-        '1w':  7,
-        '1m':  30,
-        '3m':  91,
-        '6m':  182,
-        '1y':  365,
-    }
-
-    for key, days in intervals.items():
-        pct = returns.get(f'return_{key}')
-        if pct is not None and isinstance(pct, (int, float)):
-            hist_price = nav / (1 + (pct / 100))
-            hist_date  = (current_date - timedelta(days=days)).strftime('%Y-%m-%d')
-            backfill[hist_date] = round(hist_price, 2)
-
-    return backfill
-
-
-def main():
+def load_active_isins():
+    """Returnerer aktive ISIN'er fra config/pfa_pdfs.json (None hvis filen mangler)."""
     if not CONFIG_FILE.exists():
         print(f"❌ Config fil mangler: {CONFIG_FILE}")
-        return
-
-    with open(CONFIG_FILE, "r") as f:
-        isins = json.load(f)
+        return None
 
-    active_isins = [i.strip() for i in isins if not i.strip().startswith(("#", "-"))]
-    results = []
+    isins = read_json(CONFIG_FILE)
+    return [i.strip() for i in isins if not i.strip().startswith(("#", "-"))]
 
-    history = {}
-    if HISTORY_FILE.exists():
-        try:
-            with open(HISTORY_FILE, "r") as f:
-                history = json.load(f)
-        except Exception:
-            history = {}
 
-    for isin in active_isins:
-        txt_file = TEXT_DIR / f"{isin}.txt"
-        data = {"isin": isin, "name": "Mangler data", "nav": None, "nav_date": None}
-
-        if txt_file.exists():
-            text   = txt_file.read_text(encoding="utf-8", errors="ignore")
-            parsed = parse_pfa_from_text(isin, text)
-            data.update(parsed)
-
-            if data["nav"] and data["nav_date"]:
-                if isin not in history:
-                    history[isin] = {}
-
-                # --- VOLATILITY GUARD ---
-                # Sammenligner KUN mod eksisterende rigtige datapunkter inden
-                # for de seneste 10 dage (backfill-punkter springes over).
-                real_dates = sorted([
-                    d for d in history[isin].keys()
-                    if d <= data["nav_date"]
-                ])
-
-                if real_dates:
-                    recent_threshold = (
-                        datetime.strptime(data["nav_date"], '%Y-%m-%d') - timedelta(days=10)
-                    ).strftime('%Y-%m-%d')
-
-                    recent_dates = [d for d in real_dates if d >= recent_threshold]
-
-                    if recent_dates:
-                        last_date = recent_dates[-1]
-                        last_nav  = history[isin][last_date]
-                        diff      = abs((data["nav"] - last_nav) / last_nav)
-
-                        if diff > VOLATILITY_GUARD_PCT:
-                            print(
-                                f"⚠️  Volatility Guard: {isin} ({data.get('name', '')}) "
-                                f"afvist: {last_nav} → {data['nav']} "
-                                f"({diff*100:.1f}% ændring på {last_date} → {data['nav_date']})"
-                            )
-                            results.append(data)
-                            continue
-
-                # --- GEM KUN NYE DATA ---
-                if data["nav_date"] not in history[isin]:
-                    history[isin][data["nav_date"]] = data["nav"]
-                    print(f"[NY KURS] {isin}: {data['nav']} ({data['nav_date']})")
-
-                # --- BACKFILL ---
-                # Overskriver ALDRIG eksisterende datapunkter.
-                historical_points = calculate_backfill(data["nav"], data["nav_date"], data)
-                added_backfill = 0
-                for h_date, h_nav in historical_points.items():
-                    if h_date not in history[isin]:
-                        history[isin][h_date] = h_nav
-                        added_backfill += 1
-                if added_backfill > 0:
-                    print(f"[BACKFILL] {isin}: {added_backfill} historiske punkter tilføjet")
+def load_state():
+    """
+    Samler alt der deles over fondene i én kørsel:
+      history   — pfa_history.json ({isin: {dato: kurs}})
+      archive   — faktaark-arkivets indeks (pfa_archive.py)
+      guard     — volatility guard + karantæne (volatility_guard.py)
+      backfill  — syntetisk backfill-overlay (pfa_backfill.py)
+      cache     — parse-cache (parse_cache.py)
+    """
+    return {
+        "history":  load_history("pfa"),
+        "archive":  load_index(),
+        # Sammenligner også mod samme nav_date (weekend-genkørsel)
+        "guard":    create_guard("pfa", VOLATILITY_GUARD_PCT, inclusive=True),
+        "backfill": load_overlay(),
+        "cache":    load_cache(),
+    }
 
-        results.append(data)
 
-    # --- GEM & RYD OP ---
-    OUT_FILE.parent.mkdir(exist_ok=True)
+def process_text(isin, text, state):
+    """
+    Parser én faktaark-tekst og opdaterer kørslens state in-place:
+    arkivering, volatility guard, ny kurs og backfill.
 
+    Returnerer (data, arkiveret_ny) — data er latest-entry for fonden.
+    """
+    data = {"isin": isin, "name": "Mangler data", "nav": None, "nav_date": None}
+    if text is None:
+        return data, False
+
+    history, guard = state["history"], state["guard"]
+
+    # Uændret faktaark (fx PFA ikke opdateret) koster kun en hash
+    sha    = text_sha(text)
+    parsed = parse_cached(isin, text, state["cache"], sha=sha)
+    data.update(parsed)
+
+    _, is_new = archive_text(isin, text, data["nav_date"], state["archive"], sha=sha)
+
+    if not (data["nav"] and data["nav_date"]):
+        return data, is_new
+
+    if isin not in history:
+        history[isin] = {}
+
+    # --- VOLATILITY GUARD ---
+    # Sammenligner mod seneste accepterede punkt inden for 10 dage.
+    # Afviste punkter lægges i karantæne (data/quarantine.json).
+    ok, reason = check_point(guard, isin, data["nav_date"], data["nav"], history[isin])
+    if not ok:
+        print(
+            f"⚠️  Volatility Guard: {isin} ({data.get('name', '')}) "
+            f"afvist: {reason['ref_price']} → {data['nav']} "
+            f"({reason['diff_pct']:.1f}% ændring på {reason['ref_date']} → {data['nav_date']})"
+        )
+        reject_point(guard, isin, data["nav_date"], data["nav"], reason)
+        return data, is_new
+
+    # --- GEM KUN NYE DATA ---
+    if data["nav_date"] not in history[isin]:
+        history[isin][data["nav_date"]] = data["nav"]
+        print(f"[NY KURS] {isin}: {data['nav']} ({data['nav_date']})")
+    accept_point(guard, isin, data["nav_date"], history[isin][data["nav_date"]])
+
+    # --- BACKFILL ---
+    # Estimerede punkter gemmes i overlayet (data/pfa_backfill.json),
+    # aldrig i historikken — og overskriver ALDRIG rigtige datapunkter.
+    added_backfill = add_backfill(
+        state["backfill"], isin, data["nav"], data["nav_date"], data, history[isin]
+    )
+    if added_backfill > 0:
+        print(f"[BACKFILL] {isin}: {added_backfill} historiske punkter tilføjet")
+
+    return data, is_new
+
+
+def save_results(results, state):
+    """Gemmer pfa_latest.json, pfa_history.json, arkiv-indeks, karantæne, backfill og parse-cache."""
+    history = state["history"]
     for isin in history:
         history[isin] = dict(sorted(history[isin].items()))
 
-    with open(OUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    save_latest("pfa", results)
+    save_history("pfa", history)
 
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(history, f, indent=2)
+    save_index(state["archive"])
+    save_guard(state["guard"])
 
-    print(f"✅ Main færdig: {len(results)} fonde behandlet, historik opdateret.")
+    # Backfill er overflødigt når en fond har nok rigtig historik
+    dropped = prune_overlay(state["backfill"], history)
+    if dropped:
+        print(f"[BACKFILL] Overlay fjernet for {dropped} fonde med nok rigtig historik")
+    save_overlay(state["backfill"])
 
-    # --- DATAVALIDERING ---
+    save_cache(state["cache"])
+
+
+def run_validation():
     try:
         from pfa_validate_data import validate
         errors, warnings = validate(verbose=False)
@@ -164,5 +144,34 @@ def main():
         print(f"⚠️  Validering kunne ikke køre: {e}")
 
 
+def main():
+    active_isins = load_active_isins()
+    if active_isins is None:
+        return
+
+    results      = []
+    state        = load_state()
+    archived_new = 0
+
+    for isin in active_isins:
+        txt_file = TEXT_DIR / f"{isin}.txt"
+        text = txt_file.read_text(encoding="utf-8", errors="ignore") if txt_file.exists() else None
+
+        data, is_new = process_text(isin, text, state)
+        archived_new += is_new
+        results.append(data)
+
+    # --- GEM & RYD OP ---
+    save_results(results, state)
+
+    print(f"✅ Main færdig: {len(results)} fonde behandlet, historik opdateret.")
+    print(f"   {cache_stats(state['cache'])}")
+    if archived_new:
+        print(f"📦 {archived_new} nye faktaark arkiveret.")
+
+    # --- DATAVALIDERING ---
+    run_validation()
+
+
 if __name__ == "__main__":
     main()
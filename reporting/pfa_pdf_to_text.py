@@ -1,10 +1,48 @@
-import pdfplumber
+import io
 import logging
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
-import requests
 import json
 from pathlib import Path
 
+# pdfplumber (~0,1 sek) og requests importeres først i de funktioner der
+# bruger dem — så fx freshness-tjekket og daily-rapporten starter hurtigt.
+
+FACTSHEET_URL = (
+    "https://pfapension.os.fundconnect.com/api/v1/public/printer/"
+    "solutions/default/factsheet?language=da-DK&isin={isin}"
+)
+
+
+def fetch_pdf(isin, session=None):
+    """
+    Henter ét PFA faktaark som PDF-bytes fra FundConnect API.
+    Returnerer None ved fejl (fejlen printes).
+    """
+    url = FACTSHEET_URL.format(isin=isin)
+    if session is None:
+        import requests as session
+    try:
+        r = session.get(url, timeout=30)
+        if r.status_code == 200:
+            return r.content
+        print(f"[FEJL] Kunne ikke hente {isin} (Status: {r.status_code})")
+    except Exception as e:
+        print(f"[FEJL] Problem med {isin}: {e}")
+    return None
+
+
+def pdf_to_text(pdf_bytes):
+    """Udtrækker tekst fra alle sider i en PDF (bytes) — samme format som build/text/."""
+    import pdfplumber
+
+    text = ""
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text += page_text + "\n"
+    return text
+
 
 def download_and_convert():
     """
@@ -35,25 +73,15 @@ def download_and_convert():
         isin     = isin.strip()
         pdf_path = pdf_dir / f"{isin}.pdf"
         txt_path = txt_dir / f"{isin}.txt"
-        url = (
-            f"https://pfapension.os.fundconnect.com/api/v1/public/printer/"
-            f"solutions/default/factsheet?language=da-DK&isin={isin}"
-        )
+
+        pdf_bytes = fetch_pdf(isin)
+        if pdf_bytes is None:
+            continue
 
         try:
-            r = requests.get(url, timeout=30)
-            if r.status_code == 200:
-                pdf_path.write_bytes(r.content)
-                with pdfplumber.open(pdf_path) as pdf:
-                    text = ""
-                    for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-                    txt_path.write_text(text, encoding="utf-8")
-                print(f"[OK] Behandlet: {isin}")
-            else:
-                print(f"[FEJL] Kunne ikke hente {isin} (Status: {r.status_code})")
+            pdf_path.write_bytes(pdf_bytes)
+            txt_path.write_text(pdf_to_text(pdf_bytes), encoding="utf-8")
+            print(f"[OK] Behandlet: {isin}")
         except Exception as e:
             print(f"[FEJL] Problem med {isin}: {e}")
 
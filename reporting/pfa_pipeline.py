@@ -0,0 +1,162 @@
+"""
+pfa_pipeline.py — Samlet PFA daily pipeline i én proces
+========================================================
+Erstatter de tre separate trin i pfa_daily.yml:
+
+  pfa_pdf_to_text.py → pfa_main.py → pfa_build_daily_report.py
+
+Faktaark streames gennem hele kæden uden mellemfiler:
+
+  download (tråde) → tekstudtræk → parse/guard/historik → rapport
+
+Latest-listen og historikken holdes i hukommelsen og gives direkte til
+rapport-trinnet, så intet skal genindlæses fra disk. build/pdf/ og
+build/text/ skrives kun med --debug-files.
+
+Brug:
+  python reporting/pfa_pipeline.py
+  python reporting/pfa_pipeline.py --debug-files   # gem PDF'er og tekstfiler
+  python reporting/pfa_pipeline.py --no-report     # stop efter historik/validering
+  python reporting/pfa_pipeline.py --wait-fresh 10 # vent højst 10 min på nye kurser
+"""
+
+import argparse
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from pfa_pdf_to_text import fetch_pdf, pdf_to_text
+from pfa_main import load_active_isins, load_state, process_text, save_results, run_validation
+from parse_cache import cache_stats
+from pfa_freshness import known_nav_date, wait_for_upstream
+
+logging.getLogger("pdfminer").setLevel(logging.ERROR)
+
+ROOT    = Path(__file__).resolve().parents[1]
+PDF_DIR = ROOT / "build" / "pdf"
+TXT_DIR = ROOT / "build" / "text"
+
+# FundConnect svarer langsomt pr. kald — få samtidige downloads halverer ventetiden
+DOWNLOAD_WORKERS = 4
+
+
+# ==========================================
+# TRIN (generatorer)
+# ==========================================
+
+def download_stage(isins, workers=DOWNLOAD_WORKERS):
+    """
+    Henter faktaark parallelt og yielder (isin, pdf_bytes) i config-rækkefølge.
+    pdf_bytes er None hvis download fejlede.
+    """
+    import requests
+
+    with requests.Session() as session:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [(isin, pool.submit(fetch_pdf, isin, session)) for isin in isins]
+            for isin, future in futures:
+                yield isin, future.result()
+
+
+def extract_stage(pdfs, debug_files=False):
+    """Konverterer PDF-bytes til tekst. Yielder (isin, text) — text er None ved fejl."""
+    if debug_files:
+        PDF_DIR.mkdir(parents=True, exist_ok=True)
+        TXT_DIR.mkdir(parents=True, exist_ok=True)
+
+    for isin, pdf_bytes in pdfs:
+        if pdf_bytes is None:
+            yield isin, None
+            continue
+        try:
+            text = pdf_to_text(pdf_bytes)
+        except Exception as e:
+            print(f"[FEJL] Problem med {isin}: {e}")
+            yield isin, None
+            continue
+
+        if debug_files:
+            (PDF_DIR / f"{isin}.pdf").write_bytes(pdf_bytes)
+            (TXT_DIR / f"{isin}.txt").write_text(text, encoding="utf-8")
+        print(f"[OK] Behandlet: {isin}")
+        yield isin, text
+
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def run_pipeline(debug_files=False, build_report_stage=True, workers=DOWNLOAD_WORKERS, wait_fresh=0):
+    """
+    Kører hele PFA daily-kæden. Returnerer (results, history) eller None
+    hvis config mangler.
+
+    wait_fresh: maks sekunder at vente på at PFA viser nyere kurser end
+    pfa_latest.json (pfa_freshness.py) før alle faktaark hentes. 0 = ingen venten.
+    """
+    active_isins = load_active_isins()
+    if active_isins is None:
+        return None
+
+    if wait_fresh > 0:
+        fresh, _ = wait_for_upstream(known_date=known_nav_date(), deadline=wait_fresh)
+        if not fresh:
+            print("Advarsel: Kører på gårsdagens data — PFA har ikke opdateret endnu.")
+
+    start = datetime.now()
+    print(f"Starter pipeline: {len(active_isins)} aktive fonde")
+
+    state        = load_state()
+    results      = []
+    archived_new = 0
+
+    texts = extract_stage(download_stage(active_isins, workers), debug_files)
+    for isin, text in texts:
+        data, is_new = process_text(isin, text, state)
+        archived_new += is_new
+        results.append(data)
+
+    save_results(results, state)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    print(f"✅ Pipeline: {len(results)} fonde behandlet på {elapsed:.1f} sek, historik opdateret.")
+    print(f"   {cache_stats(state['cache'])}")
+    if archived_new:
+        print(f"📦 {archived_new} nye faktaark arkiveret.")
+
+    run_validation()
+
+    if build_report_stage:
+        # Data er netop hentet — rapporten skal ikke vente på friske filer
+        from pfa_build_daily_report import build_report
+        build_report(latest_data=results, history=state["history"], backfill=state["backfill"])
+
+    return results, state["history"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PFA daily pipeline: download → parse → historik → rapport")
+    parser.add_argument("--debug-files", action="store_true",
+                        help="Gem mellemfiler i build/pdf/ og build/text/")
+    parser.add_argument("--no-report", action="store_true",
+                        help="Byg ikke daily-rapport og README")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS,
+                        help=f"Samtidige downloads (standard: {DOWNLOAD_WORKERS})")
+    parser.add_argument("--wait-fresh", type=float, default=0, metavar="MIN",
+                        help="Vent højst MIN minutter på nye kurser hos PFA (standard: 0)")
+    args = parser.parse_args()
+
+    run_pipeline(
+        debug_files=args.debug_files,
+        build_report_stage=not args.no_report,
+        workers=max(1, args.workers),
+        wait_fresh=args.wait_fresh * 60,
+    )
+
+
+if __name__ == "__main__":
+    main()
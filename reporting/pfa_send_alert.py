@@ -17,15 +17,15 @@ Testtilstand:
 """
 
 import argparse
-import json
 import os
-import smtplib
 import sys
 from datetime import datetime
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_store import read_json, load_json, save_json
+
 ROOT            = Path(__file__).resolve().parents[1]
 HWM_FILE        = ROOT / "data/pfa_hwm.json"
 LATEST_FILE     = ROOT / "data/pfa_latest.json"
@@ -46,19 +46,11 @@ def fund_link(isin, name):
 
 def load_rank_history():
     """Indlæser rank-historik. Format: {isin: {dato: rank}}"""
-    if not RANK_HIST_FILE.exists():
-        return {}
-    try:
-        with open(RANK_HIST_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    return load_json(RANK_HIST_FILE, {})
 
 
 def save_rank_history(data):
-    RANK_HIST_FILE.parent.mkdir(exist_ok=True)
-    with open(RANK_HIST_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    save_json(RANK_HIST_FILE, data)
 
 
 def build_ranks(latest_list):
@@ -198,10 +190,10 @@ def get_vurdering(rank, arrow, return_3m, total):
 # HJÆLPEFUNKTIONER
 # ==========================================
 
-def load_json(path):
+def require_json(path):
+    """Læser en fil mailen ikke kan undværes uden — afbryder ved fejl."""
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return read_json(path)
     except Exception as e:
         print(f"❌ Kunne ikke læse {path}: {e}")
         sys.exit(1)
@@ -524,6 +516,11 @@ def build_html_email(alerts, trail_pct, report_type, portfolio, latest_list,
 
 def send_email(subject, html_body, username, password, recipients):
     """Sender HTML-mail via Gmail SMTP med TLS."""
+    # Importeres først her — de fleste kørsler sender ingen mail
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
     msg = MIMEMultipart("alternative")
     msg["Subject"] = subject
     msg["From"]    = username
@@ -570,9 +567,9 @@ def main():
         sys.exit(0)
 
     recipients  = [r.strip() for r in recipients_raw.split(",") if r.strip()]
-    portfolio   = load_json(PORTFOLIO_FILE)
-    latest_list = load_json(LATEST_FILE)
-    hwm_data    = load_json(HWM_FILE) if HWM_FILE.exists() else {}
+    portfolio   = require_json(PORTFOLIO_FILE)
+    latest_list = require_json(LATEST_FILE)
+    hwm_data    = require_json(HWM_FILE) if HWM_FILE.exists() else {}
     latest_map  = {item["isin"]: item for item in latest_list}
 
     # Rank-system
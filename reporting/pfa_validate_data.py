@@ -5,12 +5,23 @@ Køres af main.py efter daglig dataopdatering.
 Tjekker pfa_latest.json og pfa_history.json for fejl og uoverensstemmelser.
 
 Returnerer antal kritiske fejl (exit code 0 = OK, >0 = fejl fundet).
+
+Historik-reglerne køres inkrementelt: kun punkter efter sidste kørsels
+vandmærke (data/validation_state.json) valideres, tidligere fund
+genudsendes. --full validerer hele historikken forfra. --verify tjekker
+at en inkrementel kørsel giver samme fund som en fuld (uden at røre
+vandmærkerne).
 """
 
-import json
+import argparse
 import sys
+from datetime import date, timedelta
 from pathlib import Path
-from datetime import datetime, timedelta
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_store import load_json
+from validation_engine import validate_dataset, to_messages, summarize, write_report, verify_incremental
 
 ROOT           = Path(__file__).resolve().parents[1]
 
@@ -35,20 +46,61 @@ MIN_HISTORY_POINTS  = 5      # Min datapunkter i historik
 ETF_NAV_JUMP_PCT    = 0.25   # Max dagligt kursspring ETF (25%)
 ETF_MAX_DATA_AGE    = 5      # Max dage gammel data før fejl
 
-
-def load_json(path):
-    if not path.exists():
-        return None
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        return None
-
-
-def validate(verbose=True):
+# Grænser — fælles historik-regler
+FUND_LAG_DAYS       = 5      # Enkelt fond halter efter universets nav_date
+DUP_MIN_POINTS      = 3      # Samme kurs/dato i to fonde — enkelte sammenfald er normale
+FLAT_MIN_POINTS     = 7      # Uændret kurs i så mange punkter i træk
+GAP_DAYS            = 10     # Hul i historikken (kalenderdage)
+
+# Regel-konfiguration til validation_engine.py
+PFA_CONFIG = {
+    "rules": [
+        "missing_fields", "return_sanity", "stale_nav_date", "daily_jump",
+        "duplicate_prices", "flat_lined", "gaps", "min_history", "latest_consistency",
+    ],
+    "return_fields":      ['return_1w', 'return_1m', 'return_3m', 'return_6m', 'return_ytd', 'return_1y'],
+    "core_returns":       ['return_1w', 'return_1m', 'return_3m', 'return_6m'],
+    "return_min":         RETURN_SANITY_MIN,
+    "return_max":         RETURN_SANITY_MAX,
+    "max_data_age":       5,
+    "fund_lag_days":      FUND_LAG_DAYS,
+    "source_hint":        "PFA PDF-hentning",
+    "jump_pct":           NAV_JUMP_PCT,
+    "jump_hint":          " — mulig parser-fejl eller backfill-fejl",
+    "dup_min_points":     DUP_MIN_POINTS,
+    "flat_min_points":    FLAT_MIN_POINTS,
+    "gap_days":           GAP_DAYS,
+    "min_history_points": MIN_HISTORY_POINTS,
+    "max_listed":         {"daily_jump": 10, "gaps": 5},  # Begræns så loggen ikke fyldes
+    "label_suffix":       "",
+}
+
+ETF_CONFIG = {
+    "rules": [
+        "missing_fields", "return_sanity", "stale_nav_date", "daily_jump",
+        "duplicate_prices", "flat_lined", "gaps", "min_history",
+    ],
+    "return_fields":      ['return_1w', 'return_1m', 'return_1y', 'return_ytd'],
+    "core_returns":       [],
+    # ETF'er kan have høje afkast (Korea +192%) men ikke mere end 500%
+    "return_min":         -90.0,
+    "return_max":         500.0,
+    "max_data_age":       ETF_MAX_DATA_AGE,
+    "fund_lag_days":      FUND_LAG_DAYS,
+    "source_hint":        "etf_provider.py",
+    "jump_pct":           ETF_NAV_JUMP_PCT,
+    "dup_min_points":     DUP_MIN_POINTS,
+    "flat_min_points":    FLAT_MIN_POINTS,
+    "gap_days":           GAP_DAYS,
+    "min_history_points": MIN_HISTORY_POINTS,
+    "max_listed":         {"daily_jump": 5, "gaps": 5},
+    "label_suffix":       " ETF",
+}
+
+
+def validate(verbose=True, full=False):
     """
-    Kører alle valideringstjek.
+    Kører alle valideringstjek (full=True: hele historikken, ellers inkrementelt).
     Returnerer (kritiske_fejl, advarsler) som to lister af strings.
     """
     errors   = []  # Kritiske fejl — kræver handling
@@ -71,60 +123,19 @@ def validate(verbose=True):
         warnings.append(f"ADVARSEL: {PORTFOLIO_FILE} mangler — porteføljevalidering springes over")
 
     latest_map = {item['isin']: item for item in latest if 'isin' in item}
-    today      = datetime.now().strftime('%Y-%m-%d')
 
     # ==========================================
-    # TJEK 1: pfa_latest.json — grundlæggende felter
+    # TJEK 1, 2, 4, 5: Regler over latest + historik (validation_engine.py)
+    # Felter, afkastsanity, data-alder, kursspring, dubletter,
+    # flade serier, huller og konsistens mellem latest og history.
     # ==========================================
-    for item in latest:
-        isin = item.get('isin', '?')
-        name = item.get('name', isin)[:35]
-
-        # NAV skal være til stede og positiv
-        if not item.get('nav') or item['nav'] <= 0:
-            errors.append(f"FEJL: {isin} ({name}) mangler NAV")
-
-        # Dato skal være til stede
-        if not item.get('nav_date'):
-            errors.append(f"FEJL: {isin} ({name}) mangler nav_date")
-
-        # Afkastfelter — advar hvis alle er None (tyder på parser-fejl)
-        return_fields = ['return_1w', 'return_1m', 'return_3m', 'return_6m']
-        none_count = sum(1 for f in return_fields if item.get(f) is None)
-        if none_count == 4:
-            warnings.append(f"ADVARSEL: {isin} ({name}) mangler alle afkasttal — mulig parser-fejl")
-        elif none_count >= 2:
-            missing = [f for f in return_fields if item.get(f) is None]
-            warnings.append(f"ADVARSEL: {isin} ({name}) mangler {missing}")
-
-        # Afkastsanity — ekstreme værdier tyder på parser-fejl
-        for field in ['return_1w', 'return_1m', 'return_3m', 'return_6m', 'return_ytd', 'return_1y']:
-            val = item.get(field)
-            if val is not None:
-                if val > RETURN_SANITY_MAX or val < RETURN_SANITY_MIN:
-                    errors.append(
-                        f"FEJL: {isin} ({name}) {field}={val}% er urealistisk "
-                        f"(grænse: {RETURN_SANITY_MIN}% til {RETURN_SANITY_MAX}%)"
-                    )
-
-    # ==========================================
-    # TJEK 2: Data er fra i dag (eller seneste hverdag)
-    # ==========================================
-    nav_dates = [item.get('nav_date') for item in latest if item.get('nav_date')]
-    if nav_dates:
-        most_recent = max(nav_dates)
-        days_old = (datetime.strptime(today, '%Y-%m-%d') -
-                    datetime.strptime(most_recent, '%Y-%m-%d')).days
-        if days_old > 5:
-            errors.append(
-                f"FEJL: Data er {days_old} dage gammel (seneste nav_date: {most_recent}) "
-                f"— PFA PDF-hentning fejlede sandsynligvis"
-            )
-        elif days_old > 1:
-            warnings.append(
-                f"INFO: Data er {days_old} dage gammel (nav_date: {most_recent}) "
-                f"— kan skyldes weekend eller helligdag"
-            )
+    findings, frame, mode = validate_dataset("pfa", latest, history, PFA_CONFIG, full=full)
+    rule_errors, rule_warnings = to_messages(findings, PFA_CONFIG)
+    errors   += rule_errors
+    warnings += rule_warnings
+    write_report("pfa", summarize(findings, frame, mode))
+    if verbose:
+        print(f"   PFA: {mode}, {len(frame['h_date'])} historikpunkter kontrolleret")
 
     # ==========================================
     # TJEK 3: Aktive positioner i portefølje
@@ -154,83 +165,12 @@ def validate(verbose=True):
             elif not latest_map[isin].get('nav'):
                 errors.append(f"FEJL: Aktiv fond {isin} ({name}) har ingen NAV i pfa_latest.json")
 
-    # ==========================================
-    # TJEK 4: pfa_history.json — kursspring
-    # ==========================================
-    jump_count = 0
-    for isin, dates_dict in history.items():
-        dates = sorted(dates_dict.keys())
-        name  = latest_map.get(isin, {}).get('name', isin)[:35]
-
-        # Min. antal datapunkter
-        if len(dates) < MIN_HISTORY_POINTS:
-            warnings.append(
-                f"INFO: {isin} ({name}) har kun {len(dates)} historiske datapunkter "
-                f"— MA-beregninger kan være upålidelige"
-            )
-
-        # Kursspring (kun for nærliggende datoer)
-        for i in range(1, len(dates)):
-            prev_price = dates_dict[dates[i-1]]
-            curr_price = dates_dict[dates[i]]
-            gap_days   = (datetime.strptime(dates[i], '%Y-%m-%d') -
-                          datetime.strptime(dates[i-1], '%Y-%m-%d')).days
-
-            if gap_days > 7:
-                continue  # Spring over lange huller — ikke unormalt
-
-            if prev_price <= 0:
-                continue
-
-            pct_change = abs((curr_price - prev_price) / prev_price)
-            if pct_change > NAV_JUMP_PCT:
-                jump_count += 1
-                if jump_count <= 10:  # Vis max 10 for ikke at fylde loggen
-                    errors.append(
-                        f"FEJL: {isin} ({name}) kursspring {prev_price}→{curr_price} "
-                        f"({pct_change*100:.1f}%) på {dates[i-1]}→{dates[i]} "
-                        f"— mulig parser-fejl eller backfill-fejl"
-                    )
-    if jump_count > 10:
-        errors.append(f"FEJL: {jump_count} kursspring >15% fundet i alt — se logfilen for detaljer")
-
-    # ==========================================
-    # TJEK 5: Konsistens mellem latest og history
-    # ==========================================
-    for item in latest:
-        isin      = item.get('isin')
-        nav       = item.get('nav')
-        nav_date  = item.get('nav_date')
-        name      = item.get('name', isin)[:35]
-
-        if not (isin and nav and nav_date):
-            continue
-
-        if isin not in history:
-            warnings.append(f"INFO: {isin} ({name}) har ingen historik endnu")
-            continue
-
-        hist_dates = sorted(history[isin].keys())
-        if not hist_dates:
-            continue
-
-        # Seneste historik-kurs skal stemme med latest NAV (inden for 1 dag)
-        latest_hist_date = hist_dates[-1]
-        if latest_hist_date == nav_date:
-            hist_nav = history[isin][latest_hist_date]
-            diff = abs((nav - hist_nav) / hist_nav) if hist_nav else 0
-            if diff > 0.001:  # Mere end 0.1% forskel
-                warnings.append(
-                    f"ADVARSEL: {isin} ({name}) latest NAV={nav} men history[{nav_date}]={hist_nav} "
-                    f"— lille uoverensstemmelse ({diff*100:.2f}%)"
-                )
-
     return errors, warnings
 
 
-def validate_etf():
+def validate_etf(full=False):
     """
-    Validerer ETF-datafiler.
+    Validerer ETF-datafiler (full=True: hele historikken, ellers inkrementelt).
     Returnerer (kritiske_fejl, advarsler).
     """
     errors   = []
@@ -238,14 +178,9 @@ def validate_etf():
 
     etf_latest    = load_json(ETF_LATEST_FILE)
     etf_history   = load_json(ETF_HISTORY_FILE)
-    etf_portfolio = load_json(ETF_PORTFOLIO_FILE)
-    etf_watchlist = load_json(ETF_WATCHLIST_FILE)
-
-    # Filtrer kommentar-felter
-    if isinstance(etf_portfolio, dict):
-        etf_portfolio = {k: v for k, v in etf_portfolio.items() if not k.startswith('_')}
-    if isinstance(etf_watchlist, dict):
-        etf_watchlist = {k: v for k, v in etf_watchlist.items() if not k.startswith('_')}
+    # Uden kommentar-felter
+    etf_portfolio = load_json(ETF_PORTFOLIO_FILE, strip_meta=True)
+    etf_watchlist = load_json(ETF_WATCHLIST_FILE, strip_meta=True)
 
     if etf_latest is None:
         errors.append(f"KRITISK ETF: {ETF_LATEST_FILE} mangler — etf_provider.py har ikke kørt")
@@ -254,52 +189,22 @@ def validate_etf():
         errors.append(f"KRITISK ETF: {ETF_HISTORY_FILE} mangler")
         return errors, warnings
 
-    today      = datetime.now().strftime('%Y-%m-%d')
     latest_map = {item['isin']: item for item in etf_latest if 'isin' in item}
 
     # ==========================================
-    # ETF TJEK 1: etf_latest.json — grundfelter
+    # ETF TJEK 1, 2, 4: Regler over latest + historik (validation_engine.py)
     # ==========================================
-    for item in etf_latest:
-        isin = item.get('isin', '?')
-        name = item.get('name', isin)[:35]
-
-        if not item.get('nav') or item['nav'] <= 0:
-            errors.append(f"FEJL ETF: {isin} ({name}) mangler NAV")
-
-        if not item.get('nav_date'):
-            errors.append(f"FEJL ETF: {isin} ({name}) mangler nav_date")
+    findings, frame, mode = validate_dataset("etf", etf_latest, etf_history, ETF_CONFIG, full=full)
+    rule_errors, rule_warnings = to_messages(findings, ETF_CONFIG)
+    errors   += rule_errors
+    warnings += rule_warnings
+    write_report("etf", summarize(findings, frame, mode))
+    print(f"   ETF: {mode}, {len(frame['h_date'])} historikpunkter kontrolleret")
 
+    for item in etf_latest:
         if not item.get('ticker'):
-            warnings.append(f"ADVARSEL ETF: {isin} ({name}) mangler ticker")
-
-        # Afkastsanity — ETF'er kan have høje afkast (Korea +192%)
-        # men ikke mere end 500%
-        for field in ['return_1w', 'return_1m', 'return_1y', 'return_ytd']:
-            val = item.get(field)
-            if val is not None:
-                if val > 500.0 or val < -90.0:
-                    errors.append(
-                        f"FEJL ETF: {isin} ({name}) {field}={val}% er urealistisk"
-                    )
-
-    # ==========================================
-    # ETF TJEK 2: Data-alder
-    # ==========================================
-    nav_dates = [item.get('nav_date') for item in etf_latest if item.get('nav_date')]
-    if nav_dates:
-        most_recent = max(nav_dates)
-        days_old = (datetime.strptime(today, '%Y-%m-%d') -
-                    datetime.strptime(most_recent, '%Y-%m-%d')).days
-        if days_old > ETF_MAX_DATA_AGE:
-            errors.append(
-                f"FEJL ETF: Data er {days_old} dage gammel (nav_date: {most_recent}) "
-                f"— etf_provider.py fejlede sandsynligvis"
-            )
-        elif days_old > 1:
-            warnings.append(
-                f"INFO ETF: Data er {days_old} dage gammel — kan skyldes weekend"
-            )
+            isin = item.get('isin', '?')
+            warnings.append(f"ADVARSEL ETF: {isin} ({item.get('name', isin)[:35]}) mangler ticker")
 
     # ==========================================
     # ETF TJEK 3: Aktive positioner
@@ -321,41 +226,6 @@ def validate_etf():
                     f"FEJL ETF: Aktiv {isin} ({name}) mangler i etf_latest.json"
                 )
 
-    # ==========================================
-    # ETF TJEK 4: Historik — kursspring
-    # ==========================================
-    jump_count = 0
-    for isin, dates_dict in etf_history.items():
-        dates = sorted(dates_dict.keys())
-        name  = latest_map.get(isin, {}).get('name', isin)[:35]
-
-        if len(dates) < MIN_HISTORY_POINTS:
-            warnings.append(
-                f"INFO ETF: {isin} ({name}) har kun {len(dates)} datapunkter"
-            )
-
-        for i in range(1, len(dates)):
-            prev_price = dates_dict[dates[i-1]]
-            curr_price = dates_dict[dates[i]]
-            gap_days   = (datetime.strptime(dates[i], '%Y-%m-%d') -
-                          datetime.strptime(dates[i-1], '%Y-%m-%d')).days
-
-            if gap_days > 7 or prev_price <= 0:
-                continue
-
-            pct_change = abs((curr_price - prev_price) / prev_price)
-            if pct_change > ETF_NAV_JUMP_PCT:
-                jump_count += 1
-                if jump_count <= 5:
-                    errors.append(
-                        f"FEJL ETF: {isin} ({name}) kursspring "
-                        f"{prev_price}→{curr_price} ({pct_change*100:.1f}%) "
-                        f"på {dates[i-1]}→{dates[i]}"
-                    )
-
-    if jump_count > 5:
-        errors.append(f"FEJL ETF: {jump_count} kursspring >{ETF_NAV_JUMP_PCT*100:.0f}% fundet")
-
     # ==========================================
     # ETF TJEK 5: Watchlist vs historik
     # ==========================================
@@ -375,15 +245,69 @@ def validate_etf():
     return errors, warnings
 
 
+def duplicate_scenario(days=40):
+    """
+    Syntetisk historik til --verify: XA/XB deler kurs på tre gamle datoer
+    og den nyeste (antallet skal stige til 4), XC/XD på to gamle og én ny
+    (når først DUP_MIN_POINTS med den nye). Returnerer (latest, history, i dag).
+    """
+    dates   = [(date(2026, 1, 1) + timedelta(days=k)).isoformat() for k in range(days)]
+    history = {f"X{c}": {d: round(100 + n * 10 + k * 0.37, 2) for k, d in enumerate(dates)}
+               for n, c in enumerate("ABCD")}
+    for k in (2, 5, 8, days - 1):
+        history["XB"][dates[k]] = history["XA"][dates[k]]
+    for k in (3, 6, days - 2):
+        history["XD"][dates[k]] = history["XC"][dates[k]]
+    latest = [{"isin": isin, "name": isin, "nav": pts[dates[-1]], "nav_date": dates[-1]}
+              for isin, pts in history.items()]
+    return latest, history, dates[-1]
+
+
+def verify():
+    """Inkrementel mod fuld validering på PFA, ETF og duplicate_scenario(). Returnerer antal afvigelser."""
+    latest, history, today = duplicate_scenario()
+    cases = [
+        ("PFA", "pfa", load_json(LATEST_FILE), load_json(HISTORY_FILE), PFA_CONFIG, None),
+        ("ETF", "etf", load_json(ETF_LATEST_FILE), load_json(ETF_HISTORY_FILE), ETF_CONFIG, None),
+        ("Dubletter (syntetisk)", "pfa", latest, history, PFA_CONFIG, today),
+    ]
+    diffs = 0
+    for label, dataset, latest, history, cfg, today in cases:
+        if latest is None or history is None:
+            print(f"⚠️  {label}: data mangler — springes over")
+            continue
+        before = diffs
+        for cut in (1, 3, 5, 20):
+            _, only_inc, only_full = verify_incremental(dataset, latest, history, cfg, cut=cut, today=today)
+            diffs += len(only_inc) + len(only_full)
+            for m in only_inc:
+                print(f"   ❌ {label} (cut {cut}) kun inkrementel: {m}")
+            for m in only_full:
+                print(f"   ❌ {label} (cut {cut}) kun fuld: {m}")
+        ok = diffs == before
+        print(f"{'✅' if ok else '❌'} {label}: inkrementel {'=' if ok else '≠'} fuld validering (cut 1, 3, 5, 20)")
+    return diffs
+
+
 def main():
+    parser = argparse.ArgumentParser(description="TrendAgent datavalidering")
+    parser.add_argument("--full", action="store_true",
+                        help="Valider hele historikken forfra (ignorer vandmærker)")
+    parser.add_argument("--verify", action="store_true",
+                        help="Sammenlign inkrementel og fuld validering (vandmærkerne røres ikke)")
+    args = parser.parse_args()
+
+    if args.verify:
+        return 1 if verify() else 0
+
     print("\n" + "="*55)
     print("🔍 TRENDAGENT DATAVALIDERING")
     print("="*55)
 
-    errors, warnings = validate()
+    errors, warnings = validate(full=args.full)
 
     # Køer ETF-validering
-    etf_errors, etf_warnings = validate_etf()
+    etf_errors, etf_warnings = validate_etf(full=args.full)
     errors   += etf_errors
     warnings += etf_warnings
 
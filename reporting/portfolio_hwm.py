@@ -3,11 +3,36 @@ portfolio_hwm.py
 Tracker porteføljens samlede afkast over tid og beregner drawdown fra peak.
 Gemmer historik i data/portfolio_hwm.json.
 Bruges af pfa_build_monthly_report.py og etf_build_monthly.py
+
+Afkastkurven gemmes i fuld opløsning — ét punkt pr. dag, kolonnevis:
+  {segment: {"peak_afkast", "peak_dato", "max_drawdown", "max_drawdown_dato",
+             "kurve": {"datoer": [...], "afkast": [...]}, "noter": {dato: note}}}
+
+Peak og max drawdown opdateres løbende når et punkt tilføjes, og
+same-day-tjekket er et binært opslag i den sorterede datoliste. Rapporterne
+får en nedsamplet visning (curve_view) med højst VIEW_POINTS punkter: de
+seneste FULL_POINTS dage uændret, resten via LTTB (eller min/max pr. spand),
+så payloaden ikke vokser med historikken.
+
+Det gamle format (historik-liste, maks 24 punkter) konverteres ved indlæsning.
+
+Monthly fører den positionsvægtede TWR-kurve fra portfolio_valuation.py
+ind med sync_curve() — segmentet markeres med "kilde": "twr" og bygges
+forfra første gang, så det gamle snit pr. fond ikke blandes med TWR.
 """
 
-import json
-import os
-from datetime import datetime
+import threading
+from bisect import bisect_left
+from datetime import date, datetime
+
+from data_store import load_json, save_json
+
+# PFA og ETF monthly deler filen — render_all.py kan køre dem samtidig i
+# hver sin tråd, så load → update → save skal ske under låsen.
+LOCK = threading.Lock()
+
+VIEW_POINTS = 120   # Max punkter i visningen til rapporterne
+FULL_POINTS = 30    # Seneste punkter der altid vises uændret
 
 
 # ============================================================
@@ -35,35 +60,212 @@ ETF_BOOTSTRAP = [
 # INDLÆSNING OG GEMNING
 # ============================================================
 
+def new_segment(historik=(), peak_afkast=None, peak_dato=None):
+    """
+    Tomt segment — evt. fyldt fra en liste af {"dato", "afkast", "note"}.
+    peak_afkast/peak_dato: kendt peak der ikke er med i listen (fx trimmet
+    væk i det gamle format) — bruges hvis den er højere end kurvens egen.
+    """
+    seg = {
+        "peak_afkast":       None,
+        "peak_dato":         None,
+        "max_drawdown":      0.0,
+        "max_drawdown_dato": None,
+        "kurve":             {"datoer": [], "afkast": []},
+        "noter":             {},
+    }
+    for h in sorted(historik, key=lambda x: x["dato"]):
+        add_point(seg, h["dato"], h["afkast"], h.get("note"))
+    if peak_afkast is not None and (seg["peak_afkast"] is None or peak_afkast > seg["peak_afkast"]):
+        seg["peak_afkast"], seg["peak_dato"] = peak_afkast, peak_dato
+    return seg
+
+
+def _migrate(seg):
+    """Gammelt format ({"peak_afkast", "peak_dato", "historik": [...]}) → kurve."""
+    if "kurve" in seg:
+        return seg
+    return new_segment(seg.get("historik", []), seg.get("peak_afkast"), seg.get("peak_dato"))
+
+
 def load_portfolio_hwm(path):
     """Indlæser portfolio_hwm.json. Bootstrapper hvis filen ikke eksisterer."""
-    if os.path.exists(path):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
+    data = load_json(path, None)
+    if isinstance(data, dict):
+        return {segment: _migrate(seg) for segment, seg in data.items()}
 
     # Første kørsel — bootstrap med kendte datapunkter
     return {
-        "pfa": {
-            "peak_afkast":  8.21,
-            "peak_dato":    "2026-05-07",
-            "historik":     PFA_BOOTSTRAP.copy(),
-        },
-        "etf": {
-            "peak_afkast":  0.0,
-            "peak_dato":    "2026-05-05",
-            "historik":     ETF_BOOTSTRAP.copy(),
-        }
+        "pfa": new_segment(PFA_BOOTSTRAP, 8.21, "2026-05-07"),
+        "etf": new_segment(ETF_BOOTSTRAP, 0.0, "2026-05-05"),
     }
 
 
 def save_portfolio_hwm(data, path):
-    """Gemmer portfolio_hwm.json."""
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    """Gemmer portfolio_hwm.json (atomisk)."""
+    save_json(path, data)
+
+
+# ============================================================
+# KURVE — FULD OPLØSNING
+# ============================================================
+
+def _recompute(seg):
+    """
+    Peak og max drawdown forfra (kun når et punkt indsættes midt i kurven).
+    En gemt peak der er højere end kurvens egen beholdes.
+    """
+    peak, peak_dato = seg.get("peak_afkast"), seg.get("peak_dato")
+    max_dd, max_dd_dato = 0.0, None
+    run_peak = None
+    for dato, afkast in zip(seg["kurve"]["datoer"], seg["kurve"]["afkast"]):
+        run_peak = afkast if run_peak is None else max(run_peak, afkast)
+        if afkast - run_peak < max_dd:
+            max_dd, max_dd_dato = round(afkast - run_peak, 2), dato
+        if peak is None or afkast > peak:
+            peak, peak_dato = afkast, dato
+    seg.update(peak_afkast=peak, peak_dato=peak_dato,
+               max_drawdown=max_dd, max_drawdown_dato=max_dd_dato)
+
+
+def add_point(seg, dato, afkast, note=None):
+    """
+    Tilføjer dagens punkt hvis datoen ikke findes. Returnerer True hvis tilføjet.
+    Næsten altid den nyeste dato (append + løbende peak/drawdown);
+    en ældre dato indsættes på plads og peak/drawdown beregnes forfra.
+    """
+    datoer, værdier = seg["kurve"]["datoer"], seg["kurve"]["afkast"]
+    afkast = round(afkast, 2)
+    i = bisect_left(datoer, dato)
+    if i < len(datoer) and datoer[i] == dato:
+        return False
+
+    datoer.insert(i, dato)
+    værdier.insert(i, afkast)
+    if note:
+        seg["noter"][dato] = note
+    if i < len(datoer) - 1:
+        _recompute(seg)
+        return True
+
+    if seg.get("peak_afkast") is None or afkast > seg["peak_afkast"]:
+        seg["peak_afkast"], seg["peak_dato"] = afkast, dato
+    drawdown = round(afkast - seg["peak_afkast"], 2)
+    if drawdown < seg.get("max_drawdown", 0.0):
+        seg["max_drawdown"], seg["max_drawdown_dato"] = drawdown, dato
+    return True
+
+
+def sync_curve(portfolio_hwm, segment, datoer, afkast, kilde="twr"):
+    """
+    Fører en færdig afkastkurve (fx TWR fra portfolio_valuation.py) ind i
+    segmentet. Første gang — eller hvis segmentet stammer fra en anden
+    kilde (det gamle snit pr. fond) — erstattes kurven helt, så peak og
+    max drawdown kun bygger på én målemetode. Derefter tilføjes kun de
+    nye datoer. Returnerer antal tilføjede punkter.
+    """
+    seg = portfolio_hwm.get(segment)
+    if not seg or seg.get("kilde") != kilde:
+        seg = portfolio_hwm[segment] = new_segment()
+        seg["kilde"] = kilde
+    last = seg["kurve"]["datoer"][-1] if seg["kurve"]["datoer"] else ""
+    return sum(add_point(seg, d, a) for d, a in zip(datoer, afkast) if d > last)
+
+
+# ============================================================
+# NEDSAMPLING TIL VISNING
+# ============================================================
+
+def _day(dato):
+    return date.fromisoformat(dato).toordinal()
+
+
+def lttb(xs, ys, n):
+    """
+    Largest-Triangle-Three-Buckets: vælger n indeks der bevarer kurvens
+    form (toppe og dale). Første og sidste punkt beholdes altid.
+    """
+    size = len(xs)
+    if n >= size or n < 3:
+        return list(range(size)) if n >= size else [0, size - 1][:max(n, 0)]
+
+    keep  = [0]
+    every = (size - 2) / (n - 2)
+    a = 0
+    for b in range(n - 2):
+        # Gennemsnit af næste spand er tredje hjørne i trekanten
+        lo = int((b + 1) * every) + 1
+        hi = min(int((b + 2) * every) + 1, size)
+        avg_x = sum(xs[lo:hi]) / (hi - lo)
+        avg_y = sum(ys[lo:hi]) / (hi - lo)
+
+        start = int(b * every) + 1
+        end   = int((b + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs((ax - avg_x) * (ys[i] - ay) - (ax - xs[i]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        keep.append(best)
+        a = best
+    keep.append(size - 1)
+    return keep
+
+
+def minmax_buckets(ys, n):
+    """Min og max pr. spand (n/2 spand) i tidsorden — bevarer alle ekstremer."""
+    size = len(ys)
+    if n >= size:
+        return list(range(size))
+    buckets = max(n // 2, 1)
+    keep = []
+    for b in range(buckets):
+        lo, hi = b * size // buckets, (b + 1) * size // buckets
+        if hi <= lo:
+            continue
+        spand = range(lo, hi)
+        lo_i = min(spand, key=ys.__getitem__)
+        hi_i = max(spand, key=ys.__getitem__)
+        keep += sorted({lo_i, hi_i})
+    return keep
+
+
+def curve_view(seg, max_points=VIEW_POINTS, full_points=FULL_POINTS, method="lttb"):
+    """
+    Nedsamplet kurve til rapporter og grafer:
+    [{"dato", "afkast", "drawdown"(, "note")}] — højst max_points punkter.
+    De seneste full_points vises uændret; ældre punkter nedsamples med
+    method ("lttb" eller "minmax").
+    """
+    datoer, afkast = seg["kurve"]["datoer"], seg["kurve"]["afkast"]
+
+    # Drawdown fra løbende peak for hvert punkt
+    drawdown, peak = [], None
+    for v in afkast:
+        peak = v if peak is None else max(peak, v)
+        drawdown.append(round(v - peak, 2))
+
+    size = len(datoer)
+    if size <= max_points:
+        keep = list(range(size))
+    else:
+        split = size - full_points
+        budget = max(max_points - full_points, 2)
+        if method == "minmax":
+            old = minmax_buckets(afkast[:split], budget)
+        else:
+            old = lttb([_day(d) for d in datoer[:split]], afkast[:split], budget)
+        keep = old + list(range(split, size))
+
+    noter = seg.get("noter", {})
+    view = []
+    for i in keep:
+        punkt = {"dato": datoer[i], "afkast": afkast[i], "drawdown": drawdown[i]}
+        if datoer[i] in noter:
+            punkt["note"] = noter[datoer[i]]
+        view.append(punkt)
+    return view
 
 
 # ============================================================
@@ -83,24 +285,13 @@ def update_and_get_drawdown(portfolio_hwm, segment, today_str, current_afkast):
     Returns:
         dict med drawdown-data klar til template
     """
-    seg = portfolio_hwm.setdefault(segment, {
-        "peak_afkast": current_afkast,
-        "peak_dato":   today_str,
-        "historik":    []
-    })
-
-    # Tilføj dagens punkt hvis ikke allerede der
-    historik = seg.get("historik", [])
-    datoer   = [h["dato"] for h in historik]
-    if today_str not in datoer:
-        historik.append({
-            "dato":   today_str,
-            "afkast": round(current_afkast, 2)
-        })
-        seg["historik"] = historik
-
-    # Opdater peak
-    if current_afkast > seg.get("peak_afkast", -999):
+    seg = portfolio_hwm.setdefault(segment, new_segment())
+
+    # Tilføj dagens punkt hvis ikke allerede der (opdaterer peak og max drawdown)
+    add_point(seg, today_str, current_afkast)
+
+    # Opdater peak — også når dagens punkt allerede fandtes
+    if seg["peak_afkast"] is None or current_afkast > seg["peak_afkast"]:
         seg["peak_afkast"] = round(current_afkast, 2)
         seg["peak_dato"]   = today_str
 
@@ -116,17 +307,17 @@ def update_and_get_drawdown(portfolio_hwm, segment, today_str, current_afkast):
     except Exception:
         dage_siden_peak = 0
 
-    # Sorter historik kronologisk og behold maks 24 punkter
-    seg["historik"] = sorted(historik, key=lambda x: x["dato"])[-24:]
-
     return {
-        "aktuel_afkast":    round(current_afkast, 2),
-        "peak_afkast":      peak,
-        "peak_dato":        peak_dato,
-        "drawdown":         drawdown,
-        "dage_siden_peak":  dage_siden_peak,
-        "er_ved_peak":      drawdown >= -0.1,
-        "historik":         seg["historik"],
+        "aktuel_afkast":     round(current_afkast, 2),
+        "peak_afkast":       peak,
+        "peak_dato":         peak_dato,
+        "drawdown":          drawdown,
+        "dage_siden_peak":   dage_siden_peak,
+        "er_ved_peak":       drawdown >= -0.1,
+        "max_drawdown":      seg["max_drawdown"],
+        "max_drawdown_dato": seg["max_drawdown_dato"],
+        "punkter":           len(seg["kurve"]["datoer"]),
+        "historik":          curve_view(seg),
     }
 
 
@@ -154,5 +345,6 @@ def format_drawdown_for_template(dd):
         "dage_siden_peak": dd["dage_siden_peak"],
         "er_ved_peak":     dd["er_ved_peak"],
         "advarsel":        dd["drawdown"] <= -5.0,
+        "max_drawdown":    fmt(dd.get("max_drawdown")),
         "historik":        dd["historik"],
     }
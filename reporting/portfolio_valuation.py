@@ -0,0 +1,533 @@
+"""
+portfolio_valuation.py — Positionsvægtet værdiansættelse af porteføljen
+========================================================================
+Rapporterne regner porteføljens afkast som et simpelt snit pr. fond
+(ugens afkast i weekly, afkast siden køb i monthly → portfolio_hwm), så en
+lille position vejer lige så meget som en stor, og lukkede handler tæller
+ikke med. Motoren her værdiansætter i stedet beholdningen dag for dag ud
+fra handlerne i config/trades.json og kurserne i data/{pfa,etf}_history.json:
+
+  enheder  antal pr. handel — købt på dato, solgt på lukket_dato
+  værdi    Σ enheder × dagens kurs (kursmatrix, fremført over huller)
+  flows    køb = antal × kurs ind, salg = antal × lukket_kurs ud
+  TWR      tidsvægtet: dagsafkast (værdi + salg) / (gårsdagens værdi + køb),
+           kædet — uafhængig af hvornår og hvor meget der blev indskudt
+  MWR      pengevægtet: intern rente (XIRR) af flows + dagens værdi —
+           vægter perioder med meget investeret højest
+
+Alt regnes som arrays over (dage × positioner). Tilstanden gemmes i
+data/{pfa,etf}_valuation.json (sidste dato, enheder, kurser, TWR-indeks,
+flows og den daglige kurve), så den daglige kørsel kun værdiansætter de
+nye datoer. Ændres handlerne (fingerprint over segmentets handler), eller
+køres med --force, bygges tilstanden forfra — samme kode, bare fra tom
+tilstand.
+
+Tilstanden husker også sidste dato og antal punkter pr. fond. Kommer et
+punkt bag vandmærket (en ETF-lukkekurs eller en PFA-NAV der lander en dag
+for sent), spoles tilbage til dagen før og der værdiansættes igen derfra.
+Et hul der udfyldes midt i en serie giver genberegning forfra. Kurser der
+rettes på en eksisterende dato kræver stadig --force.
+
+Mangler antal (det gør det i alle nuværende handler), regnes med
+STANDARD_BELØB pr. køb — dvs. lige store køb, hvorefter vægtene følger
+kursudviklingen. Handler registreret to gange (samme fond, dato og kurs —
+én åben og én lukket) tælles én gang; den lukkede vinder. Findes en fond
+ikke i historikken, bruges købs- og salgskursen som eneste kurser.
+
+Brug:
+  python reporting/portfolio_valuation.py pfa           # værdiansæt nye datoer
+  python reporting/portfolio_valuation.py etf --force   # byg forfra
+  python reporting/portfolio_valuation.py begge
+  python reporting/portfolio_valuation.py pfa --verify  # inkrementel = fuld genberegning?
+
+  from portfolio_valuation import value_portfolio, period_return
+  val = value_portfolio("pfa")      # {"dato", "værdi", "twr_pct", "mwr_pct", ...}
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+from bisect import bisect_left
+from datetime import date, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_store import load_history, load_json, save_json
+from trades_summary import load_trades
+
+# numpy importeres først i funktionerne — rapport-builderne starter uden den
+
+ROOT        = Path(__file__).resolve().parents[1]
+TRADES_FILE = ROOT / "config/trades.json"
+STATE_FILES = {
+    "pfa": ROOT / "data/pfa_valuation.json",
+    "etf": ROOT / "data/etf_valuation.json",
+}
+
+STANDARD_BELØB = 10_000.0   # Beløb pr. køb når antal mangler i trades.json
+XIRR_ITER      = 50         # Newton-skridt — konvergerer typisk på under 10
+
+
+# ==========================================
+# HANDLER → POSITIONER
+# ==========================================
+
+def trade_positions(trades, dataset):
+    """
+    Segmentets handler som positioner {id, isin, navn, fra, til, kurs,
+    salgskurs, antal}, sorteret efter købsdato. Handler uden dato eller
+    kurs springes over.
+    """
+    unikke = {}
+    for t in trades:
+        if (t.get("type") or "").lower() != dataset or not t.get("dato") or not t.get("kurs"):
+            continue
+        key = (t["isin"], t["dato"], t["kurs"])
+        if key in unikke and not t.get("lukket_dato"):
+            continue   # Dublet — den lukkede udgave (eller den første) beholdes
+        unikke[key] = t
+
+    positions = []
+    for t in unikke.values():
+        solgt = bool(t.get("lukket_dato") and t.get("lukket_kurs"))
+        positions.append({
+            "id":        t.get("id"),
+            "isin":      t["isin"],
+            "navn":      t.get("navn") or t["isin"],
+            "fra":       t["dato"],
+            "til":       t["lukket_dato"] if solgt else None,
+            "kurs":      float(t["kurs"]),
+            "salgskurs": float(t["lukket_kurs"]) if solgt else None,
+            "antal":     float(t["antal"]) if t.get("antal") else STANDARD_BELØB / float(t["kurs"]),
+        })
+    return sorted(positions, key=lambda p: (p["fra"], p["id"] or ""))
+
+
+def fingerprint(positions):
+    """sha256 over positionerne — ændres en handel, bygges tilstanden forfra."""
+    raw = json.dumps([STANDARD_BELØB, positions], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ==========================================
+# TILSTAND
+# ==========================================
+
+def empty_state(dataset, fp):
+    return {
+        "_meta":    {"dataset": dataset, "fingerprint": fp, "generated": None},
+        "dato":     "",
+        "enheder":  {},      # isin → antal efter sidste dato
+        "kurser":   {},      # isin → sidste kendte kurs (fremføres)
+        "værdi":    0.0,
+        "indeks":   1.0,     # Kædet TWR-indeks
+        "flows":    [],      # [[dato, beløb]] — positivt = indskud
+        "sete":     {},      # isin → [sidste dato, antal punkter] til og med dato
+        "kurve":    {"datoer": [], "værdi": [], "twr": [], "mwr": [], "indeks": []},
+    }
+
+
+def load_state(dataset):
+    return load_json(STATE_FILES[dataset], default=None)
+
+
+def save_state(dataset, state):
+    state["_meta"]["generated"] = datetime.now().strftime("%Y-%m-%d %H:%M")
+    save_json(STATE_FILES[dataset], state, indent=None)
+
+
+# ==========================================
+# VÆRDIANSÆTTELSE
+# ==========================================
+
+def price_rows(history, isins, after, extra):
+    """
+    Kursmatrix for datoer efter `after`. extra: {(dato, isin): kurs} fra
+    handlerne — bruges kun hvor historikken mangler kursen. Handelsdatoer
+    efter nyeste kurs i historikken venter til kursen er der.
+    Returnerer (datoer, kurser) med NaN hvor intet er observeret.
+    """
+    import numpy as np
+
+    col = {isin: j for j, isin in enumerate(isins)}
+    observed = {d for isin in isins for d in history.get(isin, {}) if d > after}
+    slut = max(observed) if observed else max((d for d, _ in extra), default="")
+    datoer = sorted(observed | {d for d, _ in extra if after < d <= slut})
+    row = {d: i for i, d in enumerate(datoer)}
+    prices = np.full((len(datoer), len(isins)), np.nan)
+    for (d, isin), kurs in extra.items():
+        if after < d <= slut:
+            prices[row[d], col[isin]] = kurs
+    for isin in isins:
+        for d, kurs in history.get(isin, {}).items():
+            if d > after and kurs:
+                prices[row[d], col[isin]] = kurs
+    return datoer, prices
+
+
+def _day_before(dato):
+    return date.fromordinal(date.fromisoformat(dato).toordinal() - 1).isoformat()
+
+
+def _ffill(prices, seed):
+    """Fremfører sidste kurs nedad; seed er kursen før første række."""
+    import numpy as np
+
+    filled = np.vstack([seed[None, :], prices])
+    idx = np.where(np.isnan(filled), 0, np.arange(len(filled))[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return filled[idx, np.arange(filled.shape[1])][1:]
+
+
+def _trade_prices(positions):
+    """{(dato, isin): kurs} for køb og salg — første handel pr. dato vinder."""
+    extra = {}
+    for p in positions:
+        extra.setdefault((p["fra"], p["isin"]), p["kurs"])
+        if p["til"]:
+            extra.setdefault((p["til"], p["isin"]), p["salgskurs"])
+    return extra
+
+
+def _seen(history, isins, til):
+    """isin → [sidste dato, antal punkter] i historikken til og med `til`."""
+    out = {}
+    for isin in isins:
+        pts = [d for d in history.get(isin, {}) if d <= til]
+        if pts:
+            out[isin] = [max(pts), len(pts)]
+    return out
+
+
+def changed_since(state, isins, history):
+    """
+    Tidligste dato ≤ state["dato"] med et punkt der ikke var med sidst.
+    None = intet nyt bag vandmærket, "" = et hul er udfyldt (byg forfra).
+    """
+    wm = state["dato"]
+    if not wm:
+        return None
+    seen, earliest = state.get("sete", {}), None
+    for isin in isins:
+        last, count = seen.get(isin, ["", 0])
+        pts = [d for d in history.get(isin, {}) if d <= wm]
+        if sum(d <= last for d in pts) != count:
+            return ""
+        late = [d for d in pts if d > last]
+        if late and (earliest is None or min(late) < earliest):
+            earliest = min(late)
+    return earliest
+
+
+def rewind(state, positions, history, fra):
+    """
+    Spoler tilstanden tilbage til sidste værdiansatte dato før `fra`.
+    Enheder og kurser genskabes fra handlerne og historikken; TWR-indekset
+    hentes fra kurven. Uden en dato før `fra` nulstilles tilstanden.
+    """
+    import numpy as np
+
+    kurve = state["kurve"]
+    k = bisect_left(kurve["datoer"], fra) if fra else 0
+    if k == 0 or len(kurve.get("indeks", [])) != len(kurve["datoer"]):
+        meta = state["_meta"]
+        state.clear()
+        state.update(empty_state(meta["dataset"], meta["fingerprint"]))
+        return
+    dato = kurve["datoer"][k - 1]
+    for key in kurve:
+        del kurve[key][k:]
+
+    isins = sorted({p["isin"] for p in positions})
+    units = {isin: 0.0 for isin in isins}
+    for p in positions:
+        if p["fra"] <= dato:
+            units[p["isin"]] += p["antal"]
+        if p["til"] and p["til"] <= dato:
+            units[p["isin"]] -= p["antal"]
+
+    # Sidste kurs til og med datoen — historikken går forud for handelskursen
+    kurser = {}
+    extra = _trade_prices(positions)
+    for isin in isins:
+        pts = {d: kurs for (d, i), kurs in extra.items() if i == isin and d <= dato}
+        pts.update({d: kurs for d, kurs in history.get(isin, {}).items() if d <= dato and kurs})
+        if pts:
+            kurser[isin] = float(pts[max(pts)])
+
+    u = np.array([units[i] for i in isins])
+    u[np.abs(u) < 1e-9] = 0.0
+    k_arr = np.array([kurser.get(i, 0.0) for i in isins])
+    state.update(
+        dato    = dato,
+        enheder = {i: float(v) for i, v in zip(isins, u) if v},
+        kurser  = kurser,
+        værdi   = float(np.where(u != 0, u * k_arr, 0.0).sum()),
+        indeks  = kurve["indeks"][-1],
+        flows   = [f for f in state["flows"] if f[0] <= dato],
+    )
+
+
+def advance(state, positions, history):
+    """
+    Værdiansætter alle datoer efter state["dato"] og opdaterer state —
+    efter evt. tilbagespoling for punkter der er kommet bag vandmærket.
+    Returnerer antal (gen)værdiansatte datoer.
+    """
+    import numpy as np
+
+    isins = sorted({p["isin"] for p in positions})
+    if not isins:
+        return 0
+    fra = changed_since(state, isins, history)
+    if fra is not None:
+        rewind(state, positions, history, fra)
+    col   = {isin: j for j, isin in enumerate(isins)}
+    # Fra tom tilstand starter kurven på første købsdato
+    after = state["dato"] or _day_before(positions[0]["fra"])
+
+    datoer, prices = price_rows(history, isins, after, _trade_prices(positions))
+    if not datoer:
+        return 0
+    row = {d: i for i, d in enumerate(datoer)}
+
+    # Enhedsændringer og flows pr. dag — kun handler i de nye datoer
+    delta = np.zeros((len(datoer), len(isins)))
+    ind   = np.zeros(len(datoer))
+    ud    = np.zeros(len(datoer))
+    for p in positions:
+        j = col[p["isin"]]
+        if p["fra"] in row:
+            delta[row[p["fra"]], j] += p["antal"]
+            ind[row[p["fra"]]]      += p["antal"] * p["kurs"]
+        if p["til"] in row:
+            delta[row[p["til"]], j] -= p["antal"]
+            ud[row[p["til"]]]       += p["antal"] * p["salgskurs"]
+
+    seed_units  = np.array([state["enheder"].get(i, 0.0) for i in isins])
+    seed_prices = np.array([state["kurser"].get(i, np.nan) for i in isins])
+    units  = seed_units + np.cumsum(delta, axis=0)
+    units[np.abs(units) < 1e-9] = 0.0
+    prices = _ffill(prices, seed_prices)
+
+    # Værdi — positioner uden kurs endnu tæller 0
+    value = np.where(units != 0, units * np.nan_to_num(prices), 0.0).sum(axis=1)
+
+    # TWR: køb sker ved dagens start (til købskursen), salg ved dagens slut
+    # (til salgskursen) — dagsafkastene kædes
+    prev = np.concatenate([[state["værdi"]], value[:-1]]) + ind
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.where(prev > 0, (value + ud) / prev - 1, 0.0)
+    indeks = state["indeks"] * np.cumprod(1 + r)
+
+    # MWR pr. ny dato ud fra flows til og med datoen
+    flows = state["flows"] + [[d, round(float(f), 2)] for d, f in zip(datoer, ind - ud) if f]
+    mwr = [mwr_pct(flows, d, v) for d, v in zip(datoer, value)]
+
+    kurve = state["kurve"]
+    kurve["datoer"] += datoer
+    kurve["værdi"]  += [round(float(v), 2) for v in value]
+    kurve["twr"]    += [round((float(i) - 1) * 100, 4) for i in indeks]
+    kurve["mwr"]    += [m[1] for m in mwr]
+    kurve["indeks"] += [float(i) for i in indeks]
+
+    last = prices[-1]
+    state.update(
+        dato    = datoer[-1],
+        enheder = {i: float(units[-1, j]) for i, j in col.items() if units[-1, j]},
+        kurser  = {i: float(last[j]) for i, j in col.items() if not np.isnan(last[j])},
+        værdi   = float(value[-1]),
+        indeks  = float(indeks[-1]),
+        flows   = flows,
+        sete    = _seen(history, isins, datoer[-1]),
+    )
+    return len(datoer)
+
+
+# ==========================================
+# PENGEVÆGTET AFKAST (XIRR)
+# ==========================================
+
+def _years(datoer, slut):
+    import numpy as np
+
+    s = date.fromisoformat(slut).toordinal()
+    return np.array([(s - date.fromisoformat(d).toordinal()) / 365.0 for d in datoer])
+
+
+def xirr(flows, slut_dato, slut_værdi):
+    """
+    Årlig intern rente for flows ([dato, beløb], positivt = indskud) med
+    slut_værdi som udbetaling på slut_dato. None hvis den ikke kan bestemmes.
+    """
+    import numpy as np
+
+    flows = [f for f in flows if f[0] <= slut_dato]
+    if not flows or flows[0][1] <= 0:
+        return None
+    t  = _years([d for d, _ in flows] + [slut_dato], slut_dato)
+    cf = np.array([b for _, b in flows] + [-slut_værdi])
+    if t[0] <= 0:
+        return None
+
+    # Nutidsværdi på slutdatoen: Σ cf × (1+r)^t = 0
+    rate = 0.0
+    for _ in range(XIRR_ITER):
+        g  = 1 + rate
+        f  = (cf * g ** t).sum()
+        df = (cf * t * g ** (t - 1)).sum()
+        if df == 0:
+            return None
+        step = f / df
+        rate = max(rate - step, -0.9999)
+        if abs(step) < 1e-10:
+            return float(rate)
+    return None
+
+
+def mwr_pct(flows, slut_dato, slut_værdi):
+    """(årlig MWR %, MWR % for perioden) — periodeafkast kan sammenlignes med TWR."""
+    rate = xirr(flows, slut_dato, slut_værdi)
+    if rate is None:
+        return None, None
+    år = _years([flows[0][0]], slut_dato)[0]
+    return round(rate * 100, 2), round(float((1 + rate) ** år - 1) * 100, 4)
+
+
+# ==========================================
+# RAPPORTER
+# ==========================================
+
+def summary(state, positions):
+    """Nøgletal for seneste dato + vægte pr. fond."""
+    værdi  = state["værdi"]
+    navne  = {p["isin"]: p["navn"] for p in positions}
+    vægte  = {}
+    for isin, antal in state["enheder"].items():
+        v = antal * state["kurser"].get(isin, 0.0)
+        vægte[isin] = {
+            "navn":   navne.get(isin, isin),
+            "antal":  round(antal, 4),
+            "værdi":  round(v, 2),
+            "vægt":   round(v / værdi * 100, 2) if værdi else 0.0,
+        }
+    mwr_år, mwr = mwr_pct(state["flows"], state["dato"], værdi) if state["dato"] else (None, None)
+    kurve = state["kurve"]
+    return {
+        "dato":         state["dato"],
+        "værdi":        round(værdi, 2),
+        "indskudt":     round(sum(b for _, b in state["flows"]), 2),
+        "twr_pct":      round((state["indeks"] - 1) * 100, 2),
+        "mwr_pct":      round(mwr, 2) if mwr is not None else None,
+        "mwr_aar_pct":  mwr_år,
+        "positioner":   dict(sorted(vægte.items(), key=lambda kv: -kv[1]["værdi"])),
+        "kurve":        {"datoer": kurve["datoer"], "twr": [round(x, 2) for x in kurve["twr"]]},
+    }
+
+
+def period_return(val, dage=7):
+    """
+    Positionsvægtet afkast i % over de seneste `dage` kalenderdage (TWR).
+    None hvis kurven ikke går så langt tilbage.
+    """
+    datoer, twr = val["kurve"]["datoer"], val["kurve"]["twr"]
+    if not datoer:
+        return None
+    start = date.fromordinal(date.fromisoformat(datoer[-1]).toordinal() - dage).isoformat()
+    i = next((k for k in range(len(datoer) - 1, -1, -1) if datoer[k] <= start), None)
+    if i is None:
+        return None
+    return round(((1 + twr[-1] / 100) / (1 + twr[i] / 100) - 1) * 100, 2)
+
+
+def value_portfolio(dataset, force=False, trades=None, history=None, save=True):
+    """
+    Bringer tilstanden for pfa/etf ajour og returnerer summary().
+    None hvis segmentet ingen handler har.
+    """
+    positions = trade_positions(trades if trades is not None else load_trades(str(TRADES_FILE)), dataset)
+    if not positions:
+        return None
+    fp    = fingerprint(positions)
+    state = None if force else load_state(dataset)
+    if not state or state.get("_meta", {}).get("fingerprint") != fp:
+        state = empty_state(dataset, fp)
+
+    nye = advance(state, positions, history if history is not None else load_history(dataset))
+    if nye and save:
+        save_state(dataset, state)
+    result = summary(state, positions)
+    result["nye_datoer"] = nye
+    return result
+
+
+def verify(dataset, trades=None, history=None, forsinkelse=2):
+    """
+    Selvtjek af den inkrementelle kørsel: historikken afspilles dato for
+    dato, mens fonden med flest punkter får sine punkter `forsinkelse`
+    datoer for sent — så de lander bag vandmærket. Slutresultatet
+    sammenlignes med en fuld genberegning.
+    Returnerer (antal kørsler, største afvigelse i TWR-procentpoint).
+    """
+    positions = trade_positions(trades if trades is not None else load_trades(str(TRADES_FILE)), dataset)
+    history   = history if history is not None else load_history(dataset)
+    isins     = sorted({p["isin"] for p in positions})
+    if not isins:
+        return 0, 0.0
+
+    full = empty_state(dataset, "")
+    advance(full, positions, history)
+
+    sen    = max(isins, key=lambda i: len(history.get(i, {})))
+    datoer = sorted({d for i in isins for d in history.get(i, {}) if d >= positions[0]["fra"]})
+    inc    = empty_state(dataset, "")
+    for k, dato in enumerate(datoer):
+        cut = datoer[max(k - forsinkelse, 0)]
+        step = {i: {d: v for d, v in history.get(i, {}).items() if d <= (cut if i == sen else dato)}
+                for i in isins}
+        advance(inc, positions, step)
+    advance(inc, positions, history)
+
+    a, b = full["kurve"], inc["kurve"]
+    if a["datoer"] != b["datoer"]:
+        return len(datoer) + 1, float("inf")
+    diff = max((abs(x - y) for x, y in zip(a["twr"], b["twr"])), default=0.0)
+    return len(datoer) + 1, max(diff, abs(full["indeks"] - inc["indeks"]) * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Positionsvægtet værdiansættelse af porteføljen")
+    parser.add_argument("dataset", nargs="?", default="begge", choices=["pfa", "etf", "begge"])
+    parser.add_argument("--force", action="store_true", help="Byg tilstanden forfra")
+    parser.add_argument("--verify", action="store_true",
+                        help="Sammenlign inkrementel kørsel (med forsinkede punkter) med fuld genberegning")
+    args = parser.parse_args()
+
+    datasets = ["pfa", "etf"] if args.dataset == "begge" else [args.dataset]
+    if args.verify:
+        fejl = 0
+        for dataset in datasets:
+            kørsler, diff = verify(dataset)
+            ok = diff < 1e-6
+            fejl += not ok
+            print(f"{'✅' if ok else '❌'} {dataset.upper()}: {kørsler} inkrementelle kørsler med forsinkede "
+                  f"punkter — største TWR-afvigelse fra fuld genberegning {diff:.2e} pp")
+        sys.exit(1 if fejl else 0)
+
+    for dataset in datasets:
+        val = value_portfolio(dataset, force=args.force)
+        if not val:
+            print(f"ℹ️  {dataset.upper()}: ingen handler i trades.json")
+            continue
+        mwr = f"{val['mwr_pct']:+.2f}% (årligt {val['mwr_aar_pct']:+.2f}%)" if val["mwr_pct"] is not None else "—"
+        print(f"💼 {dataset.upper()} {val['dato']}: værdi {val['værdi']:,.0f} | indskudt netto "
+              f"{val['indskudt']:,.0f} | TWR {val['twr_pct']:+.2f}% | MWR {mwr} "
+              f"| {val['nye_datoer']} nye datoer")
+        for isin, p in val["positioner"].items():
+            print(f"   {p['vægt']:6.2f}%  {p['værdi']:>10,.0f}  {p['navn'][:40]}")
+
+
+if __name__ == "__main__":
+    main()
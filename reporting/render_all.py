@@ -0,0 +1,137 @@
+"""
+render_all.py — Byg alle rapporter i én proces
+===============================================
+Hver builder startede før sin egen Python-proces, importerede jinja2/
+pandas/yfinance igen og genindlæste de samme JSON-filer. render-all
+indlæser data én gang, deler analyse-snapshottet og Jinja2-miljøet, og
+bygger:
+
+  pfa_daily (+ README.md), pfa_weekly, pfa_monthly, etf_weekly, etf_monthly
+
+Rapporterne deler tilstandsfiler (pfa_hwm.json, etf_hwm.json), så de køres
+i to baner: PFA-banen og ETF-banen køres samtidig, men rapporterne inden
+for en bane køres i rækkefølge. portfolio_hwm.json (begge monthly) er
+beskyttet af en lås i portfolio_hwm.py. Alle rapporter skrives atomisk.
+
+Der ventes ikke på friske data (som pfa_build_daily_report.py gør) —
+render-all bygger på det der ligger i data/.
+
+Brug:
+  python reporting/render_all.py
+  python reporting/render_all.py --only pfa_weekly,pfa_monthly
+  python reporting/render_all.py --sequential
+"""
+
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import etf_build_monthly
+import etf_build_weekly
+import pfa_build_daily_report
+import pfa_build_monthly_report
+import pfa_build_weekly_report
+from analytics_snapshot import SOURCES, get_snapshot
+from data_store import load_latest, load_history
+from pfa_backfill import load_overlay
+
+# Rapport → (datasæt, funktion der bygger den ud fra indlæste data)
+REPORTS = {
+    "pfa_daily": ("pfa", lambda d: pfa_build_daily_report.build_report(
+        latest_data=d["pfa"]["latest"], history=d["pfa"]["history"], backfill=d["pfa"]["overlay"])),
+    "pfa_weekly":  ("pfa", lambda d: pfa_build_weekly_report.build_weekly(latest=d["pfa"]["latest"])),
+    "pfa_monthly": ("pfa", lambda d: pfa_build_monthly_report.build_monthly(latest_list=d["pfa"]["latest"])),
+    "etf_weekly":  ("etf", lambda d: etf_build_weekly.build_weekly(
+        latest=d["etf"]["latest"], history=d["etf"]["history"])),
+    "etf_monthly": ("etf", lambda d: etf_build_monthly.build_monthly(latest=d["etf"]["latest"])),
+}
+
+# Rapporter i samme bane deler HWM-fil og køres i rækkefølge
+LANES = [
+    ["pfa_daily", "pfa_weekly", "pfa_monthly"],
+    ["etf_weekly", "etf_monthly"],
+]
+
+
+def load_data(datasets):
+    """Indlæser latest, historik og overlay én gang pr. datasæt."""
+    data = {}
+    for dataset in datasets:
+        data[dataset] = {
+            "latest":  load_latest(dataset),
+            "history": load_history(dataset),
+            "overlay": load_overlay() if SOURCES[dataset]["overlay"] is not None else {},
+        }
+    return data
+
+
+def run_lane(lane, data):
+    """Bygger rapporterne i én bane. Returnerer {rapport: (ok, sekunder)}."""
+    results = {}
+    for name in lane:
+        dataset, build = REPORTS[name]
+        start = datetime.now()
+        try:
+            # Snapshottet beregnes højst én gang pr. datasæt (memo i analytics_snapshot)
+            d = data[dataset]
+            get_snapshot(dataset, latest=d["latest"], history=d["history"], overlay=d["overlay"])
+            build(data)
+            ok = True
+        except Exception as e:
+            print(f"❌ {name} fejlede: {e}")
+            ok = False
+        results[name] = (ok, (datetime.now() - start).total_seconds())
+    return results
+
+
+def render_all(only=None, sequential=False):
+    selected = set(only or REPORTS)
+    lanes    = [[r for r in lane if r in selected] for lane in LANES]
+    lanes    = [lane for lane in lanes if lane]
+    datasets = sorted({REPORTS[r][0] for lane in lanes for r in lane})
+
+    start = datetime.now()
+    data  = load_data(datasets)
+
+    results = {}
+    if sequential or len(lanes) == 1:
+        for lane in lanes:
+            results.update(run_lane(lane, data))
+    else:
+        with ThreadPoolExecutor(max_workers=len(lanes)) as pool:
+            for lane_results in pool.map(lambda lane: run_lane(lane, data), lanes):
+                results.update(lane_results)
+
+    elapsed = (datetime.now() - start).total_seconds()
+    print(f"\n{'='*55}")
+    print(f"🖨️  RENDER-ALL færdig på {elapsed:.1f} sek")
+    for name in REPORTS:
+        if name in results:
+            ok, secs = results[name]
+            print(f"   {'✅' if ok else '❌'} {name:<12} {secs:6.2f} sek")
+    print(f"{'='*55}\n")
+    return sum(1 for ok, _ in results.values() if not ok)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Byg alle TrendAgent-rapporter i én proces")
+    parser.add_argument("--only", help=f"Kommasepareret liste: {','.join(REPORTS)}")
+    parser.add_argument("--sequential", action="store_true", help="Kør banerne efter hinanden")
+    args = parser.parse_args()
+
+    only = None
+    if args.only:
+        only = [r.strip() for r in args.only.split(",") if r.strip()]
+        unknown = [r for r in only if r not in REPORTS]
+        if unknown:
+            parser.error(f"Ukendte rapporter: {', '.join(unknown)}")
+
+    return render_all(only=only, sequential=args.sequential)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
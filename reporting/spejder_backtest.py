@@ -0,0 +1,305 @@
+"""
+spejder_backtest.py — Point-in-time backtest af Spejderens scanninger
+======================================================================
+Der er ingen måde at se hvordan score_etf(), calculate_weighted_momentum()
+og opdelingen i stabile trendere / hurtige heste ville have klaret sig.
+Backtesten genskaber lørdagsscanningerne ud fra kurslageret
+(etf_price_store.py) og måler de valgte fondes afkast bagefter:
+
+  - hver lørdag scores alle ETF'er i lageret med kurser til og med
+    seneste handelsdag før lørdagen — intet kig fremad
+  - samme krav og point som score_etf(): BULL, momentum over bedste MA,
+    RSI, Golden Cross, 1M-afkast, konsistens-bonus og hurtig/stabil
+  - 1M/3M/6M/1Y-afkast (som justETF leverer i dag) beregnes fra kurserne
+    på scanningsdagen — 21/63/126/252 handelsdage tilbage
+  - top MAX_CANDIDATES_STABIL / MAX_CANDIDATES_HURTIG sorteres som i
+    main(), og deres afkast 1M (21 dage) og 3M (63 dage) frem måles mod
+    gennemsnittet af hele universet samme dag
+
+Alt er vektoriseret: indikatorerne beregnes én gang pr. ETF som rullende
+serier, og alle scanninger scores og rangeres på én gang som arrays
+[scanninger × ETF'er]. ASK-garanti, Nordnet-filter, cool-off og ejede
+fonde afhænger af porteføljen på dagen og genskabes ikke.
+
+Resultat pr. scanning gemmes i build/spejder_backtest.json.
+
+Brug:
+  python reporting/spejder_backtest.py                  # alle lørdage i lageret
+  python reporting/spejder_backtest.py --weeks 52       # kun seneste år
+  python reporting/spejder_backtest.py --synthetic 1000 --days 520   # tidsmåling
+"""
+
+import argparse
+import sys
+import time
+import warnings
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import etf_spejder as spejder
+from data_store import save_json
+from etf_price_store import load_store, price_history, store_stats
+from trail_backtest import build_matrix, compute_indicators, rolling_sum, series_indicators, synthetic_matrix
+
+ROOT         = Path(__file__).resolve().parents[1]
+RESULTS_FILE = ROOT / "build/spejder_backtest.json"
+
+RETURN_WINDOWS  = {"r1m": 21, "r3m": 63, "r6m": 126, "r1y": 252}   # Handelsdage tilbage
+FORWARD_WINDOWS = {"1m": 21, "3m": 63}                              # Handelsdage frem
+MAX_STALE_DAYS  = 5   # ETF'er uden kurs i den sidste uge før scanningen springes over
+
+
+# ==========================================
+# INDIKATORER PR. ETF
+# ==========================================
+
+def spejder_indicators(x):
+    """
+    Alt score_etf() bruger, for hvert punkt i én kursserie (som
+    trail_backtest.series_indicators: punkt i = kurserne til og med i).
+    """
+    n   = len(x)
+    ind = series_indicators(x)
+    del ind["vol"]
+
+    # Golden Cross — MA20 krydser op over MA50 på sidste punkt (kræver 51 punkter)
+    ma20 = np.round(rolling_sum(x, 20) / 20, 2)
+    ma50 = np.round(rolling_sum(x, 50) / 50, 2)
+    golden = np.zeros(n)
+    if n > 50:
+        golden[1:] = (ma20[:-1] <= ma50[:-1]) & (ma20[1:] > ma50[1:])
+    ind["golden"] = golden
+
+    for name, k in RETURN_WINDOWS.items():
+        r = np.full(n, np.nan)
+        if n > k:
+            r[k:] = (x[k:] / x[:-k] - 1) * 100
+        ind[name] = r
+    ind["points"] = np.arange(1, n + 1, dtype=float)
+    return ind
+
+
+def scan_rows(dates, weeks=None):
+    """Rækkeindeks for seneste handelsdag før hver lørdag (nyeste sidst)."""
+    if not dates:
+        return np.array([], dtype=int), []
+    first = date.fromisoformat(dates[0])
+    last  = date.fromisoformat(dates[-1])
+    sat   = first + timedelta(days=(5 - first.weekday()) % 7 or 7)
+    saturdays = []
+    while sat <= last + timedelta(days=1):
+        saturdays.append(sat.isoformat())
+        sat += timedelta(days=7)
+    if weeks:
+        saturdays = saturdays[-weeks:]
+    rows = np.searchsorted(np.array(dates), np.array(saturdays), side="right") - 1
+    return rows, saturdays
+
+
+# ==========================================
+# SCORING (som score_etf, vektoriseret)
+# ==========================================
+
+def score_scans(matrix, ind, rows):
+    """
+    Scorer alle ETF'er på alle scanningsdage. Returnerer dict af arrays
+    [scanninger × ETF'er]: valid (kunne scannes), qualified, hurtig,
+    score, weighted, momentum.
+    """
+    p  = matrix["prices"][rows]
+    at = {k: v[rows] for k, v in ind.items()}
+    ma, rsi = at["ma"], at["rsi"]
+
+    # Seneste notering højst MAX_STALE_DAYS rækker før scanningen
+    obs_idx = np.where(matrix["observed"], np.arange(len(matrix["observed"]))[:, None], -1)
+    last_obs = np.maximum.accumulate(obs_idx, axis=0)[rows]
+    fresh = (last_obs >= 0) & (rows[:, None] - last_obs <= MAX_STALE_DAYS)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        momentum = np.round((p / ma - 1) * 100, 2)
+    valid    = fresh & (at["points"] >= 20) & ~np.isnan(ma)
+    rsi_ok   = np.isnan(rsi) | (rsi < spejder.MAX_RSI)
+    hurtig_m = momentum >= spejder.HURTIG_MIN_MOMENTUM
+    qualified = (valid & (p > ma) & (momentum >= spejder.MIN_MOMENTUM_PCT)
+                 & (hurtig_m | rsi_ok))
+
+    # calculate_weighted_momentum — månedsnormaliseret 1M×4 + 3M/3×2 + 6M/6×1
+    m1, m3, m6 = at["r1m"], at["r3m"] / 3, at["r6m"] / 6
+    has1 = ~np.isnan(m1)
+    weighted = np.where(has1, np.nan_to_num(m1) * 4 + np.nan_to_num(m3) * 2 + np.nan_to_num(m6), 0.0)
+    alle_pos = (m1 > 0) & (np.isnan(m3) | (m3 > 0)) & (np.isnan(m6) | (m6 > 0))
+    alle_tre = has1 & ~np.isnan(m3) & ~np.isnan(m6)
+    accel    = np.where(alle_tre & (m1 > m3) & (m3 > m6), 2, np.where(alle_tre & (m1 > m3), 1, 0))
+    bonus    = np.where(has1, alle_pos.astype(int) + accel, 0)
+
+    score = 2 + 2 * (at["golden"] > 0) + rsi_ok + (np.nan_to_num(at["r1m"]) > 0) + bonus
+    qualified &= score >= spejder.MIN_SCORE
+    hurtig = hurtig_m | (np.nan_to_num(at["r1y"]) >= spejder.HURTIG_MIN_1Y)
+    return {"valid": valid, "qualified": qualified, "hurtig": hurtig, "score": score,
+            "weighted": weighted, "momentum": momentum}
+
+
+def top_picks(mask, primary, secondary, k):
+    """
+    Kolonneindeks for top-k pr. scanning sorteret på (primary, secondary)
+    faldende — -1 hvor der er færre end k kandidater.
+    """
+    if mask.shape[1] == 0:
+        return np.full((mask.shape[0], k), -1)
+    p = np.where(mask, primary, -np.inf)
+    s = np.where(mask, secondary, -np.inf)
+    order = np.lexsort((-s, -p), axis=-1)[:, :k]
+    picked = np.take_along_axis(mask, order, axis=1)
+    return np.where(picked, order, -1)
+
+
+def forward_returns(matrix, rows):
+    """Afkast i % k handelsdage efter hver scanning — NaN hvis historikken ikke rækker."""
+    prices = matrix["prices"]
+    out = {}
+    for name, k in FORWARD_WINDOWS.items():
+        ahead = rows + k
+        ok    = ahead < len(prices)
+        fwd   = np.full((len(rows), prices.shape[1]), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fwd[ok] = (prices[ahead[ok]] / prices[rows[ok]] - 1) * 100
+        out[name] = fwd
+    return out
+
+
+def run_backtest(matrix, weeks=None, ind=None):
+    """Genskaber alle scanninger. Returnerer dict med scanninger, valg og fremtidige afkast."""
+    ind = ind if ind is not None else compute_indicators(matrix, spejder_indicators)
+    rows, saturdays = scan_rows(matrix["dates"], weeks)
+    sc  = score_scans(matrix, ind, rows)
+    fwd = forward_returns(matrix, rows)
+
+    stabil_mask = sc["qualified"] & ~sc["hurtig"]
+    hurtig_mask = sc["qualified"] & sc["hurtig"]
+    picks = {
+        "stabile": top_picks(stabil_mask, sc["score"], sc["weighted"], spejder.MAX_CANDIDATES_STABIL),
+        "hurtige": top_picks(hurtig_mask, sc["weighted"], sc["momentum"], spejder.MAX_CANDIDATES_HURTIG),
+    }
+    return {"rows": rows, "saturdays": saturdays, "picks": picks, "fwd": fwd,
+            "universe": sc["valid"], "qualified": sc["qualified"]}
+
+
+# ==========================================
+# NØGLETAL
+# ==========================================
+
+def _pick_returns(picks, fwd):
+    """Fremtidige afkast for de valgte [scanninger × k] — NaN hvor intet valg."""
+    safe = np.maximum(picks, 0)
+    vals = np.take_along_axis(fwd, safe, axis=1)
+    return np.where(picks >= 0, vals, np.nan)
+
+
+def summarize(result):
+    """Gennemsnit pr. gruppe: afkast 1M/3M, merafkast mod universet og hitrate."""
+    fwd, universe = result["fwd"], result["universe"]
+    groups = dict(result["picks"])
+    groups["alle"] = np.concatenate([groups["hurtige"], groups["stabile"]], axis=1)
+
+    rows = []
+    for name, picks in groups.items():
+        m = {"gruppe": name, "valg_pr_scan": round(float((picks >= 0).sum(axis=1).mean()), 1)
+             if len(picks) else 0.0}
+        for horizon, f in fwd.items():
+            r    = _pick_returns(picks, f)
+            univ = np.where(universe & ~np.isnan(f), f, np.nan)
+            with warnings.catch_warnings():
+                # nanmean på en scanning uden valg giver RuntimeWarning — forventet
+                warnings.simplefilter("ignore", RuntimeWarning)
+                per_scan  = np.nanmean(r, axis=1)
+                univ_scan = np.nanmean(univ, axis=1)
+            done = ~np.isnan(per_scan) & ~np.isnan(univ_scan)
+            hits = r[~np.isnan(r)]
+            m[f"afkast_{horizon}"] = round(float(per_scan[done].mean()), 2) if done.any() else None
+            m[f"mer_{horizon}"]    = round(float((per_scan - univ_scan)[done].mean()), 2) if done.any() else None
+            m[f"hit_{horizon}"]    = round(float((hits > 0).mean() * 100), 1) if len(hits) else None
+        rows.append(m)
+    return rows
+
+
+def scan_details(matrix, result):
+    """Én række pr. scanning til build/spejder_backtest.json."""
+    names = matrix["isins"]
+    out = []
+    for i, sat in enumerate(result["saturdays"]):
+        entry = {"lørdag": sat, "data": matrix["dates"][result["rows"][i]],
+                 "kvalificerede": int(result["qualified"][i].sum())}
+        for group, picks in result["picks"].items():
+            chosen = picks[i][picks[i] >= 0]
+            entry[group] = [names[j] for j in chosen]
+            for horizon, f in result["fwd"].items():
+                vals = f[i, chosen]
+                vals = vals[~np.isnan(vals)]
+                entry[f"{group}_{horizon}"] = round(float(vals.mean()), 2) if len(vals) else None
+        out.append(entry)
+    return out
+
+
+def format_summary(rows):
+    heads = [("gruppe", "Gruppe", 9), ("valg_pr_scan", "Valg/scan", 11),
+             ("afkast_1m", "1M%", 8), ("mer_1m", "Mer 1M%", 9), ("hit_1m", "Hit 1M%", 9),
+             ("afkast_3m", "3M%", 8), ("mer_3m", "Mer 3M%", 9), ("hit_3m", "Hit 3M%", 9)]
+    lines = ["  " + "".join(f"{h:>{w}}" if k != "gruppe" else f"{h:<{w}}" for k, h, w in heads)]
+    for m in rows:
+        cells = []
+        for k, _, w in heads:
+            v = m.get(k)
+            v = "—" if v is None else v
+            cells.append(f"{v:<{w}}" if k == "gruppe" else f"{v:>{w}}")
+        lines.append("  " + "".join(cells))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Point-in-time backtest af Spejderens lørdagsscanninger")
+    parser.add_argument("--weeks", type=int, help="Kun de seneste N lørdage")
+    parser.add_argument("--synthetic", type=int, metavar="ETFS", help="Syntetiske kurser (tidsmåling)")
+    parser.add_argument("--days", type=int, default=520, help="Dage ved --synthetic")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        label, matrix = f"syntetisk {args.synthetic} ETF'er", synthetic_matrix(args.synthetic, args.days)
+    else:
+        store = load_store()
+        print(f"📦 {store_stats(store)}")
+        if not store:
+            print("❌ Kurslageret er tomt — kør etf_spejder.py eller etf_price_store.py seed først")
+            return
+        label, matrix = "kurslager", build_matrix(price_history(store))
+
+    start  = time.perf_counter()
+    ind    = compute_indicators(matrix, spejder_indicators)
+    t_ind  = time.perf_counter() - start
+    result = run_backtest(matrix, args.weeks, ind)
+    rows   = summarize(result)
+    elapsed = time.perf_counter() - start
+
+    days, etfs = matrix["prices"].shape
+    scans = len(result["rows"])
+    print(f"\n🛰️  Spejder-backtest — {label}: {etfs} ETF'er × {days} dage, {scans} lørdagsscanninger")
+    if scans:
+        print(f"   {result['saturdays'][0]} → {result['saturdays'][-1]}")
+    print(format_summary(rows))
+    print(f"   Mer = merafkast mod gennemsnittet af hele universet samme dag · "
+          f"Hit = andel valg med positivt afkast")
+    print(f"   ⏱️  {elapsed:.2f} sek (heraf indikatorer {t_ind:.2f} sek)")
+
+    save_json(RESULTS_FILE, {
+        "_meta": {"kilde": label, "etfs": etfs, "dage": days, "scanninger": scans},
+        "opsummering": rows,
+        "scanninger":  scan_details(matrix, result),
+    }, indent=1)
+    print(f"💾 Gemt: {RESULTS_FILE.relative_to(ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+templating.py — Fælles Jinja2-miljø for alle rapporter
+=======================================================
+Builderne kompilerede hver template forfra med Template(fil.read_text()).
+Her deles ét Environment:
+
+  - FileSystemLoader på templates/
+  - FileSystemBytecodeCache i build/.jinja_cache/ — kompileret bytecode
+    genbruges mellem kørsler så længe templaten er uændret
+  - fælles filtre til tal/procent-formattering
+  - auto_reload kun i dev-tilstand (TRENDAGENT_DEV=1), ellers kompileres
+    hver template kun én gang pr. proces
+
+Brug:
+  from templating import get_template, write_atomic
+  html = get_template("pfa_daily.html.j2").render(...)
+  write_atomic(REPORT_FILE, html)
+"""
+
+import os
+import threading
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+ROOT          = Path(__file__).resolve().parents[1]
+TEMPLATES_DIR = ROOT / "templates"
+CACHE_DIR     = ROOT / "build/.jinja_cache"
+
+_ENV      = None
+_ENV_LOCK = threading.Lock()   # render_all.py bygger rapporter i flere tråde
+
+
+def is_dev():
+    return os.environ.get("TRENDAGENT_DEV", "") not in ("", "0", "false")
+
+
+# ==========================================
+# FILTRE
+# ==========================================
+
+def num(value, decimals=2):
+    """{{ x|num }} → '12.35', {{ x|num(0) }} → '12' (samme som '%.2f'|format(x))."""
+    return f"{value:.{decimals}f}"
+
+
+def signed(value, decimals=2):
+    """{{ x|signed(1) }} → '+1.2' / '-0.4' (samme som '%+.1f'|format(x))."""
+    return f"{value:+.{decimals}f}"
+
+
+FILTERS = {
+    "num":    num,
+    "signed": signed,
+}
+
+
+# ==========================================
+# ENVIRONMENT
+# ==========================================
+
+def get_env():
+    """Returnerer det fælles Environment (oprettes ved første kald)."""
+    global _ENV
+    with _ENV_LOCK:
+        if _ENV is None:
+            dev = is_dev()
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            env = Environment(
+                loader         = FileSystemLoader(str(TEMPLATES_DIR)),
+                bytecode_cache = FileSystemBytecodeCache(str(CACHE_DIR)),
+                auto_reload    = dev,
+                # Templates i cache-grænsen: alle rapporter + lidt plads
+                cache_size     = 50,
+            )
+            env.filters.update(FILTERS)
+            _ENV = env
+    return _ENV
+
+
+def get_template(name):
+    """Henter en kompileret template fra templates/ (kompileres kun én gang pr. proces)."""
+    return get_env().get_template(name)
+
+
+def write_atomic(path, text):
+    """
+    Skriver en rapport atomisk (tmp-fil + os.replace) — en afbrudt kørsel
+    efterlader aldrig en halvt skrevet HTML-fil eller README.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
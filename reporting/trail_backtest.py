@@ -0,0 +1,418 @@
+"""
+trail_backtest.py — Historisk backtest af Trail Stop-reglerne
+==============================================================
+Tærsklerne i get_trail_stop_pct() (Fase 1 5%, volatilitet 3/5/7%,
+RSI-stramning) er sat i hånden og skal "justeres når data fra egne handler
+er tilgængeligt". Backtesten afspiller etf_history.json og pfa_history.json
+dag for dag med samme regler som rapporterne og måler hvad et parametersæt
+ville have givet:
+
+  - indgang: kursen krydser op over bedste MA (trend WARM-UP/BEAR → BULL,
+    samme MA200 > MA50 > MA20-prioritet som rapporterne) — eller med
+    --spejder den dag Spejderens krav bliver opfyldt (momentum, RSI)
+  - udgang: trail stop fra HWM (trail_engine.evaluate) — ny indgang kræver
+    et nyt kryds op over MA
+  - afkast: ligevægtet portefølje af de åbne positioner (kontant = 0%)
+
+Pr. parametersæt rapporteres afkast, max drawdown, antal handler, stop,
+whipsaws (stoppet sælger, og kursen når den gamle top igen inden for
+WHIPSAW_DAYS) og undgået fald (hvor meget lavere kursen kom inden for
+HORIZON_DAYS efter stoppet).
+
+Indikatorerne (MA, RSI-14, volatilitet-20) beregnes vektoriseret pr. fond
+på fondens egne kurspunkter — samme formler som utils.py (MA kan afvige
+0.01 i sidste decimal pga. summeringsrækkefølgen). Simuleringen
+går dag for dag, men alle fonde behandles samtidigt i numpy, så 2 år × 100
+fonde tager under et sekund. Kun rigtige kurspunkter bruges — PFA's
+syntetiske backfill-overlay indgår ikke.
+
+Brug:
+  python reporting/trail_backtest.py                        # ETF + PFA, nuværende regler
+  python reporting/trail_backtest.py etf --fase1 4 --fase1 6
+  python reporting/trail_backtest.py pfa --fixed 3          # PFA's faste 3%-stop
+  python reporting/trail_backtest.py etf --spejder          # indgang på Spejder-krav
+  python reporting/trail_backtest.py --vol-stops 2.5 4 6 --vol-buckets 0.8 1.8
+  python reporting/trail_backtest.py --synthetic 100 --days 520   # tidsmåling
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_store import load_history
+from trail_engine import TRAIL_PARAMS, trail_stop_pcts, evaluate
+
+WHIPSAW_DAYS = 20    # Kurspunkter efter stop hvor en ny top tæller som whipsaw
+HORIZON_DAYS = 20    # Kurspunkter efter stop hvor undgået fald måles
+MA_WINDOWS   = (200, 50, 20)   # Prioritet som get_best_ma()
+RSI_WINDOW   = 14
+VOL_WINDOW   = 20
+
+
+# ==========================================
+# KURSMATRIX
+# ==========================================
+
+def build_matrix(history):
+    """
+    {isin: {dato: kurs}} → dict med dato-gitter (foreningsmængden af
+    alle datoer) og arrays [dage × fonde]:
+      prices    kurs, fremført over dage uden notering (NaN før første)
+      observed  True hvor fonden har en rigtig notering
+    """
+    series = {isin: {d: v for d, v in pts.items() if v} for isin, pts in history.items()}
+    series = {isin: pts for isin, pts in series.items() if pts}
+    dates  = sorted({d for pts in series.values() for d in pts})
+    isins  = sorted(series)
+    row    = {d: i for i, d in enumerate(dates)}
+
+    prices   = np.full((len(dates), len(isins)), np.nan)
+    observed = np.zeros(prices.shape, dtype=bool)
+    for j, isin in enumerate(isins):
+        idx = [row[d] for d in series[isin]]
+        prices[idx, j]   = list(series[isin].values())
+        observed[idx, j] = True
+    return {"dates": dates, "isins": isins, "prices": _ffill(prices), "observed": observed}
+
+
+def load_matrix(datasets):
+    """Historik for et eller flere datasæt i ét gitter (ISIN'er er unikke på tværs)."""
+    history = {}
+    for dataset in datasets:
+        history.update(load_history(dataset))
+    return build_matrix(history)
+
+
+def synthetic_matrix(funds=100, days=520, seed=7):
+    """Tilfældige kursforløb (GBM med skiftende trend) til tidsmåling."""
+    rng   = np.random.default_rng(seed)
+    vol   = rng.uniform(0.004, 0.025, funds)
+    drift = rng.normal(0.0003, 0.001, (days // 60 + 1, funds)).repeat(60, axis=0)[:days]
+    rets  = drift + rng.standard_normal((days, funds)) * vol
+    prices = 100 * np.exp(np.cumsum(rets, axis=0))
+    dates  = _business_days(date(2024, 1, 1), days)
+    isins  = [f"SYN{j:04d}" for j in range(funds)]
+    return {"dates": dates, "isins": isins, "prices": prices,
+            "observed": np.ones(prices.shape, dtype=bool)}
+
+
+def _business_days(start, n):
+    """n hverdage fra start som ISO-datoer (helligdage ignoreres)."""
+    out, d = [], start
+    while len(out) < n:
+        if d.weekday() < 5:
+            out.append(d.isoformat())
+        d += timedelta(days=1)
+    return out
+
+
+def _ffill(a):
+    """Fremfører sidste ikke-NaN værdi nedad i hver kolonne."""
+    idx = np.where(np.isnan(a), 0, np.arange(a.shape[0])[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return a[idx, np.arange(a.shape[1])]
+
+
+# ==========================================
+# INDIKATORER (vektoriseret, som utils.py)
+# ==========================================
+
+def rolling_sum(x, window):
+    """Sum af de seneste window værdier — NaN før der er nok."""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        c = np.concatenate(([0.0], np.cumsum(x)))
+        out[window - 1:] = c[window:] - c[:-window]
+    return out
+
+
+def series_indicators(x):
+    """
+    Bedste MA, RSI og volatilitet for hvert punkt i én kursserie —
+    værdien i punkt i svarer til utils-funktionerne kaldt på x[:i+1].
+    """
+    n = len(x)
+    best_ma = np.full(n, np.nan)
+    for window in MA_WINDOWS:
+        ma = np.round(rolling_sum(x, window) / window, 2)
+        best_ma = np.where(np.isnan(best_ma), ma, best_ma)
+
+    # RSI — simpelt gennemsnit af de seneste 14 ændringer (kræver 15 punkter)
+    rsi = np.full(n, np.nan)
+    if n > RSI_WINDOW:
+        d = np.diff(x)
+        gain = rolling_sum(np.maximum(d, 0), RSI_WINDOW)
+        loss = rolling_sum(np.maximum(-d, 0), RSI_WINDOW)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+        rsi[1:] = np.round(r, 1)
+
+    # Volatilitet — stdev (n-1) af de seneste 20 daglige ændringer i %
+    vol = np.full(n, np.nan)
+    if n > VOL_WINDOW:
+        pct = np.diff(x) / x[:-1] * 100
+        s  = rolling_sum(pct, VOL_WINDOW)
+        s2 = rolling_sum(pct ** 2, VOL_WINDOW)
+        var = np.maximum((s2 - s ** 2 / VOL_WINDOW) / (VOL_WINDOW - 1), 0)
+        vol[1:] = np.round(np.sqrt(var), 2)
+    return {"ma": best_ma, "rsi": rsi, "vol": vol}
+
+
+def compute_indicators(matrix, fn=series_indicators):
+    """
+    Indikatorer for hele matricen — fn beregnes på hver fonds egne punkter
+    (én 1-D serie ad gangen) og fremføres over dage uden notering.
+    """
+    shape = matrix["prices"].shape
+    out = {}
+    for j in range(shape[1]):
+        rows = np.flatnonzero(matrix["observed"][:, j])
+        for k, v in fn(matrix["prices"][rows, j]).items():
+            if k not in out:
+                out[k] = np.full(shape, np.nan)
+            out[k][rows, j] = v
+    return {k: _ffill(v) for k, v in out.items()}
+
+
+# ==========================================
+# SIMULERING
+# ==========================================
+
+def spejder_entry():
+    """Spejderens nuværende indgangskrav (etf_spejder.py)."""
+    import etf_spejder
+    return {
+        "min_momentum":        etf_spejder.MIN_MOMENTUM_PCT,
+        "max_rsi":             etf_spejder.MAX_RSI,
+        "hurtig_min_momentum": etf_spejder.HURTIG_MIN_MOMENTUM,
+    }
+
+
+def entry_signals(matrix, ind, entry=None):
+    """
+    Indgangssignal [dage × fonde] — dagen hvor betingelsen bliver sand:
+      entry=None  kursen krydser op over bedste MA
+      entry=dict  Spejderens krav som score_etf(): BULL, momentum over MA
+                  ≥ min_momentum og RSI < max_rsi — RSI-kravet gælder ikke
+                  hurtige heste (momentum ≥ hurtig_min_momentum)
+    """
+    prices, ma = matrix["prices"], ind["ma"]
+    ok = prices > ma
+    if entry:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            momentum = (prices / ma - 1) * 100
+        rsi = ind["rsi"]
+        hurtig = momentum >= entry["hurtig_min_momentum"]
+        ok &= momentum >= entry["min_momentum"]
+        ok &= hurtig | np.isnan(rsi) | (rsi < entry["max_rsi"])
+    signal = np.zeros_like(ok)
+    signal[1:] = ok[1:] & ~ok[:-1] & matrix["observed"][1:]
+    return signal
+
+
+def simulate(matrix, ind, params=None, fixed_pct=None, entry=None):
+    """
+    Afspiller historikken dag for dag for alle fonde samtidigt.
+    fixed_pct: fast stop (som PFA) i stedet for get_trail_stop_pct-reglerne.
+    entry:     indgangskrav — se entry_signals().
+
+    Returnerer {"trades": [...], "equity": array} — trades er dicts med
+    fond, ind/ud (dagindeks), købs-/salgskurs, HWM og om stoppet ramte.
+    """
+    prices, observed = matrix["prices"], matrix["observed"]
+    days, funds = prices.shape
+
+    # Signal på en dag med notering (gårsdagens værdier er fremført)
+    cross = entry_signals(matrix, ind, entry)
+
+    in_pos = np.zeros(funds, dtype=bool)
+    buy    = np.full(funds, np.nan)
+    hwm    = np.full(funds, np.nan)
+    entry  = np.zeros(funds, dtype=int)
+    held   = np.zeros((days, funds), dtype=bool)   # Åben ved dagens slutning
+    trades = []
+    exited = np.zeros(funds, dtype=bool)
+
+    for t in range(days):
+        exited[:] = False
+        active = np.flatnonzero(in_pos & observed[t])
+        if len(active):
+            curr = prices[t, active]
+            if fixed_pct is not None:
+                pct = fixed_pct
+            else:
+                ret = (curr / buy[active] - 1) * 100
+                pct = trail_stop_pcts(ind["vol"][t, active], ind["rsi"][t, active], ret, params)
+            res = evaluate(curr, buy[active], hwm[active], pct)
+            hwm[active] = res["hwm"]
+            for k in np.flatnonzero(res["alert"]):
+                j = active[k]
+                trades.append(_trade(j, entry[j], t, buy[j], curr[k], hwm[j], stopped=True))
+            exited[active[res["alert"]]] = True
+            in_pos &= ~exited
+
+        new = np.flatnonzero(cross[t] & ~in_pos & ~exited)
+        in_pos[new] = True
+        buy[new]    = prices[t, new]
+        hwm[new]    = prices[t, new]
+        entry[new]  = t
+        held[t]     = in_pos
+
+    for j in np.flatnonzero(in_pos):
+        trades.append(_trade(j, entry[j], days - 1, buy[j], prices[-1, j], hwm[j], stopped=False))
+
+    # Ligevægtet portefølje: dagens afkast af positioner åbne ved gårsdagens slutning
+    daily = np.zeros(days)
+    if days > 1:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = prices[1:] / prices[:-1] - 1
+        r = np.where(held[:-1], np.nan_to_num(r), np.nan)
+        n = held[:-1].sum(axis=1)
+        daily[1:] = np.where(n > 0, np.nansum(r, axis=1) / np.maximum(n, 1), 0.0)
+    return {"trades": trades, "equity": np.cumprod(1 + daily)}
+
+
+def _trade(j, ind_dag, ud_dag, buy, sell, hwm, stopped):
+    return {"fond": int(j), "ind": int(ind_dag), "ud": int(ud_dag), "buy": float(buy),
+            "sell": float(sell), "hwm": float(hwm), "stop": stopped}
+
+
+# ==========================================
+# NØGLETAL
+# ==========================================
+
+def summarize(matrix, sim):
+    """Afkast, max drawdown, handler, whipsaws og undgået fald for én simulering."""
+    prices, observed = matrix["prices"], matrix["observed"]
+    trades = sim["trades"]
+    equity = sim["equity"]
+    peak   = np.maximum.accumulate(equity)
+
+    whipsaws, avoided = 0, []
+    for tr in trades:
+        if not tr["stop"]:
+            continue
+        j = tr["fond"]
+        after = prices[tr["ud"] + 1:, j][observed[tr["ud"] + 1:, j]]
+        if (after[:WHIPSAW_DAYS] > tr["hwm"]).any():
+            whipsaws += 1
+        if len(after):
+            low = after[:HORIZON_DAYS].min()
+            avoided.append(max(0.0, (1 - low / tr["sell"]) * 100))
+
+    rets  = [(tr["sell"] / tr["buy"] - 1) * 100 for tr in trades]
+    stops = sum(tr["stop"] for tr in trades)
+    return {
+        "afkast_pct":    round((equity[-1] - 1) * 100, 2) if len(equity) else 0.0,
+        "max_dd_pct":    round(float((equity / peak - 1).min()) * 100, 2) if len(equity) else 0.0,
+        "handler":       len(trades),
+        "stop":          stops,
+        "whipsaws":      whipsaws,
+        "whipsaw_pct":   round(whipsaws / stops * 100, 1) if stops else 0.0,
+        "undgået_pct":   round(float(np.mean(avoided)), 2) if avoided else 0.0,
+        "snit_handel":   round(float(np.mean(rets)), 2) if rets else 0.0,
+        "vinder_pct":    round(sum(r > 0 for r in rets) / len(rets) * 100, 1) if rets else 0.0,
+        "dage_holdt":    round(float(np.mean([tr["ud"] - tr["ind"] for tr in trades])), 1) if trades else 0.0,
+    }
+
+
+def backtest(matrix, param_sets, ind=None):
+    """
+    Kører hvert parametersæt mod samme matrix (indikatorerne beregnes én gang).
+    param_sets: [(navn, {"params": {...}, "fixed_pct": x}), ...]
+    Returnerer [(navn, nøgletal), ...].
+    """
+    ind = ind if ind is not None else compute_indicators(matrix)
+    return [(name, summarize(matrix, simulate(matrix, ind, **kw))) for name, kw in param_sets]
+
+
+# ==========================================
+# OUTPUT
+# ==========================================
+
+COLUMNS = [
+    ("afkast_pct", "Afkast%"), ("max_dd_pct", "MaxDD%"), ("handler", "Handler"),
+    ("stop", "Stop"), ("whipsaw_pct", "Whipsaw%"), ("undgået_pct", "Undgået%"),
+    ("snit_handel", "Snit/handel%"), ("vinder_pct", "Vinder%"), ("dage_holdt", "Dage"),
+]
+
+
+def format_table(rows):
+    name_w = max([len("Parametre")] + [len(n) for n, _ in rows])
+    widths = [max(len(h), 7) + 2 for _, h in COLUMNS]
+    lines  = ["  " + "Parametre".ljust(name_w) + "".join(f"{h:>{w}}" for (_, h), w in zip(COLUMNS, widths))]
+    for name, m in rows:
+        lines.append("  " + name.ljust(name_w)
+                     + "".join(f"{m[k]:>{w}}" for (k, _), w in zip(COLUMNS, widths)))
+    return "\n".join(lines)
+
+
+def param_sets_from_args(args):
+    """Nuværende regler først, derefter én række pr. variation fra kommandolinjen."""
+    sets = [("nuværende", {})]
+    for v in args.fase1 or []:
+        sets.append((f"fase1={v:g}", {"params": {"fase1_pct": v}}))
+    if args.vol_buckets:
+        sets.append((f"vol-grænser={args.vol_buckets[0]:g}/{args.vol_buckets[1]:g}",
+                     {"params": {"vol_buckets": tuple(args.vol_buckets)}}))
+    if args.vol_stops:
+        sets.append(("vol-stop=" + "/".join(f"{v:g}" for v in args.vol_stops),
+                     {"params": {"vol_stops": tuple(args.vol_stops)}}))
+    if args.no_rsi:
+        sets.append(("uden RSI-stramning", {"params": {"rsi_steps": ()}}))
+    for v in args.fixed or []:
+        sets.append((f"fast {v:g}%", {"fixed_pct": v}))
+    if args.spejder:
+        # Samme stop-varianter, men med Spejderens indgang
+        entry = spejder_entry()
+        sets = [(f"{name} + spejder" if kw else "spejder-indgang", {**kw, "entry": entry})
+                for name, kw in sets]
+    return sets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest af Trail Stop-reglerne på historikken")
+    parser.add_argument("datasets", nargs="*", metavar="{etf,pfa}",
+                        help="Datasæt (standard: begge hver for sig)")
+    parser.add_argument("--fase1", type=float, action="append", help="Fase 1-stop i %% (kan gentages)")
+    parser.add_argument("--vol-buckets", type=float, nargs=2, metavar=("LAV", "HØJ"),
+                        help=f"Volatilitetsgrænser (nu {TRAIL_PARAMS['vol_buckets']})")
+    parser.add_argument("--vol-stops", type=float, nargs=3, metavar=("LAV", "MID", "HØJ"),
+                        help=f"Basisstop pr. volatilitet (nu {TRAIL_PARAMS['vol_stops']})")
+    parser.add_argument("--no-rsi", action="store_true", help="Også uden RSI-stramning")
+    parser.add_argument("--fixed", type=float, action="append", help="Fast stop i %% (kan gentages)")
+    parser.add_argument("--spejder", action="store_true", help="Indgang på Spejderens krav i stedet for MA-kryds")
+    parser.add_argument("--synthetic", type=int, metavar="FONDE", help="Syntetiske kurser (tidsmåling)")
+    parser.add_argument("--days", type=int, default=520, help="Dage ved --synthetic (standard 520 ≈ 2 år)")
+    args = parser.parse_args()
+    for ds in args.datasets:
+        if ds not in ("etf", "pfa"):
+            parser.error(f"ukendt datasæt: {ds}")
+
+    if args.synthetic:
+        matrices = [(f"syntetisk {args.synthetic} fonde", synthetic_matrix(args.synthetic, args.days))]
+    else:
+        matrices = [(ds.upper(), load_matrix([ds])) for ds in (args.datasets or ["etf", "pfa"])]
+
+    sets = param_sets_from_args(args)
+    for label, matrix in matrices:
+        start = time.perf_counter()
+        ind   = compute_indicators(matrix)
+        rows  = backtest(matrix, sets, ind)
+        elapsed = time.perf_counter() - start
+        days, funds = matrix["prices"].shape
+        period = f"{matrix['dates'][0]} → {matrix['dates'][-1]}" if days else "ingen data"
+        print(f"\n📈 Trail Stop-backtest — {label}: {funds} fonde × {days} dage ({period})")
+        print(format_table(rows))
+        print(f"   ⏱️  {len(sets)} parametersæt på {elapsed:.2f} sek "
+              f"(whipsaw = ny top inden for {WHIPSAW_DAYS} punkter, undgået fald over {HORIZON_DAYS})")
+
+
+if __name__ == "__main__":
+    main()
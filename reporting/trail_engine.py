@@ -0,0 +1,185 @@
+"""
+trail_engine.py — Vektoriseret Trail Stop for alle positioner på én gang
+=========================================================================
+check_trail_stop() og get_trail_stop_pct() (utils.py) kaldes én position
+ad gangen fra seks scripts, og hvert kald ændrer HWM-dict'en undervejs.
+Motoren her tager arrays af kurser, købspriser, gemte HWM'er, volatilitet
+og RSI og returnerer opdaterede HWM'er og alarmer for alle positioner i
+ét kald — samme regler, bare med numpy:
+
+  - stop-procent: Fase 1 (afkast < 0 eller ukendt) → 5%, Fase 2 →
+    3/5/7% efter volatilitet, strammet med RSI, min. 1.5%
+  - HWM: starter i købsprisen, løftes ved ny top
+  - alarm: fald fra HWM ≥ stop-procenten
+
+utils.check_trail_stop()/get_trail_stop_pct() er stadig referencen for
+én position — motoren giver identiske resultater (None ↔ NaN).
+
+Array-funktionerne (trail_stop_pcts, evaluate) er til backtests med
+tusindvis af hypotetiske positioner; run_trail_stops() er til
+rapporterne og arbejder med hwm-dicts og alarm-dicts som før.
+
+Tærsklerne ligger i TRAIL_PARAMS, så trail_backtest.py kan afprøve
+andre sæt — rapporterne bruger altid standardværdierne.
+
+Brug:
+  from trail_engine import run_trail_stops
+  entries, alerts = run_trail_stops(positions, hwm_data, today_str)
+  hwm_data.update(entries)
+"""
+
+import math
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from utils import FASE1_TRAIL_STOP_PCT, days_since_hwm
+
+# numpy importeres først i funktionerne — alert-scripts starter uden den
+
+# Reglerne fra get_trail_stop_pct() som parametre (standard = utils.py)
+TRAIL_PARAMS = {
+    "fase1_pct":   FASE1_TRAIL_STOP_PCT,             # Stop i Fase 1 (afkast < 0)
+    "vol_buckets": (1.0, 2.0),                        # Volatilitetsgrænser i %
+    "vol_stops":   (3.0, 5.0, 7.0),                   # Basisstop under/mellem/over grænserne
+    "rsi_steps":   ((80, 1.5), (75, 1.0), (70, 0.5)), # (RSI ≥, stramning) — højeste først
+    "min_pct":     1.5,                               # Minimum uanset fase
+}
+
+
+def _array(values):
+    """Liste med None → float-array med NaN."""
+    import numpy as np
+    if isinstance(values, np.ndarray):
+        return values.astype(float, copy=False)
+    return np.array([math.nan if v is None else v for v in values], dtype=float)
+
+
+# ==========================================
+# ARRAYS
+# ==========================================
+
+def trail_stop_pcts(volatility, rsi=None, total_return_pct=None, params=None):
+    """
+    get_trail_stop_pct() for et helt array. NaN svarer til None:
+    ukendt afkast = Fase 1, ukendt volatilitet = lav-vol, ukendt RSI = ingen stramning.
+    params: afvigelser fra TRAIL_PARAMS (backtests).
+    """
+    import numpy as np
+
+    p = TRAIL_PARAMS if not params else {**TRAIL_PARAMS, **params}
+    vol = _array(volatility)
+    n   = len(vol)
+    rsi = _array(rsi) if rsi is not None else np.full(n, np.nan)
+    ret = _array(total_return_pct) if total_return_pct is not None else np.full(n, np.nan)
+
+    # Trin 1 — basisstop fra volatilitet (NaN < grænse er False → håndteres eksplicit)
+    lav, høj = p["vol_buckets"]
+    stop_lav, stop_mid, stop_høj = p["vol_stops"]
+    base = np.where(np.isnan(vol) | (vol < lav), stop_lav, np.where(vol < høj, stop_mid, stop_høj))
+
+    # Trin 2 — RSI-stramning
+    steps = p["rsi_steps"]
+    if steps:
+        base = base - np.select([rsi >= niveau for niveau, _ in steps], [s for _, s in steps], 0.0)
+    fase2 = np.maximum(np.round(base, 1), p["min_pct"])
+
+    # Fase 1 — ny position uden gevinst
+    fase1 = np.isnan(ret) | (ret < 0)
+    return np.where(fase1, p["fase1_pct"], fase2)
+
+
+def evaluate(curr, buy, hwm, trail_pct):
+    """
+    Trail Stop for alle positioner. hwm: gemt HWM (NaN = ingen historik →
+    købsprisen). trail_pct: skalar eller array.
+
+    Returnerer dict af arrays:
+      hwm       opdateret HWM (ikke afrundet)
+      new_high  True hvor dagens kurs er ny top
+      fall_pct  fald fra HWM i % (0 hvor HWM ≤ 0)
+      alert     True hvor faldet har ramt stoppet
+    """
+    import numpy as np
+
+    curr = _array(curr)
+    buy  = _array(buy)
+    hwm  = _array(hwm)
+    hwm  = np.where(np.isnan(hwm), buy, hwm)
+
+    new_high = curr > hwm
+    hwm      = np.where(new_high, curr, hwm)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fall = np.where(hwm > 0, (curr / hwm - 1) * 100, 0.0)
+    return {
+        "hwm":      hwm,
+        "new_high": new_high,
+        "fall_pct": fall,
+        "alert":    fall <= -np.asarray(trail_pct, dtype=float),
+    }
+
+
+# ==========================================
+# RAPPORTER
+# ==========================================
+
+def run_trail_stops(positions, hwm_data, today_str, trail_pct=None):
+    """
+    Trail Stop for rapporternes aktive positioner i ét kald.
+
+    positions: [{"isin", "curr", "buy"}] — plus "volatility", "rsi" og
+               "total_return_pct" når stoppet er variabelt, eller et
+               færdigt "trail_pct" pr. position
+    trail_pct: fast stop for alle (PFA) — None = get_trail_stop_pct-reglerne
+
+    hwm_data ændres ikke. Returnerer (entries, alerts):
+      entries  {isin: hwm_entry} — som check_trail_stop() (uændret entry
+               hvis ingen ny top)
+      alerts   {isin: alert_dict} — check_trail_stop()-felterne + trail_pct
+    """
+    if not positions:
+        return {}, {}
+
+    stored = [hwm_data.get(p["isin"], {}) for p in positions]
+    if trail_pct is not None:
+        pcts = [trail_pct] * len(positions)
+    else:
+        pcts = trail_stop_pcts(
+            [p.get("volatility") for p in positions],
+            [p.get("rsi") for p in positions],
+            [p.get("total_return_pct") for p in positions],
+        )
+        pcts = [p.get("trail_pct", pct) for p, pct in zip(positions, pcts)]
+
+    res = evaluate(
+        [p["curr"] for p in positions],
+        [p["buy"] for p in positions],
+        [e.get("hwm") for e in stored],
+        pcts,
+    )
+
+    entries, alerts = {}, {}
+    for i, p in enumerate(positions):
+        isin, curr, buy = p["isin"], p["curr"], p["buy"]
+        hwm = float(res["hwm"][i])
+        if res["new_high"][i]:
+            entry = {"hwm": round(hwm, 2), "hwm_date": today_str}
+        else:
+            entry = stored[i]
+        entries[isin] = entry
+
+        if res["alert"][i]:
+            hwm_date = entry.get("hwm_date", today_str)
+            alerts[isin] = {
+                "isin":      isin,
+                "hwm":       round(hwm, 2),
+                "hwm_date":  hwm_date,
+                "days_hwm":  days_since_hwm(hwm_date),
+                "curr":      round(curr, 2),
+                "fall_pct":  round(float(res["fall_pct"][i]), 2),
+                "buy_price": round(buy, 2),
+                "total_ret": round(((curr / buy) - 1) * 100, 2) if buy else 0,
+                "trail_pct": float(pcts[i]),
+            }
+    return entries, alerts
@@ -0,0 +1,249 @@
+"""
+trail_sweep.py — Parallel parametersøgning for Trail Stop og Spejder
+=====================================================================
+trail_backtest.py afprøver en håndfuld parametersæt. Her spredes en grid-
+eller tilfældig søgning over Spejderens indgangskrav (MIN_MOMENTUM_PCT,
+MAX_RSI, HURTIG_MIN_MOMENTUM) og stoppet (FASE1_TRAIL_STOP_PCT,
+volatilitetsgrænserne) ud på en ProcessPoolExecutor:
+
+  - kursmatrix og indikatorer beregnes én gang og lægges i shared memory —
+    workerne mapper dem direkte i stedet for at få dem pickled pr. opgave
+  - hvert punkt er én simulering (trail_backtest.simulate) — kun parametrene
+    sendes frem og tilbage
+  - resultatet gemmes som kompakt tabel ({"kolonner", "rækker"}) i
+    build/trail_sweep_<datasæt>.json, og Pareto-fronten for afkast mod
+    max drawdown udskrives — punkter hvor intet andet punkt er bedre på begge
+
+Første punkt er altid de nuværende værdier, så fronten kan læses relativt.
+
+Brug:
+  python reporting/trail_sweep.py                       # ETF, 200 tilfældige punkter
+  python reporting/trail_sweep.py etf --random 1000
+  python reporting/trail_sweep.py etf --grid            # hele gitteret i SWEEP_SPACE
+  python reporting/trail_sweep.py --synthetic 100 --random 1000 --workers 8
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_store import save_json
+from trail_engine import TRAIL_PARAMS
+from trail_backtest import (
+    compute_indicators, load_matrix, simulate, spejder_entry, summarize, synthetic_matrix,
+)
+
+ROOT        = Path(__file__).resolve().parents[1]
+RESULTS_DIR = ROOT / "build"
+
+# (fra, til, skridt) pr. parameter — grid bruger alle skridt, random trækker inden for
+SWEEP_SPACE = {
+    "fase1_pct":           (3.0, 7.0, 1.0),
+    "vol_lav":             (0.6, 1.2, 0.2),
+    "vol_høj":             (1.6, 2.4, 0.4),
+    "min_momentum":        (0.0, 7.5, 2.5),
+    "max_rsi":             (65.0, 80.0, 5.0),
+    "hurtig_min_momentum": (15.0, 30.0, 5.0),
+}
+METRICS = ["afkast_pct", "max_dd_pct", "handler", "stop", "whipsaw_pct", "undgået_pct"]
+CHUNKS_PER_WORKER = 4   # Små nok til jævn fordeling, store nok til lille overhead
+
+_SHARED = {}   # I workeren: navn → array i shared memory (+ "_blocks")
+
+
+# ==========================================
+# PARAMETERPUNKTER
+# ==========================================
+
+def current_point():
+    """De værdier rapporterne og Spejderen bruger i dag."""
+    entry = spejder_entry()
+    lav, høj = TRAIL_PARAMS["vol_buckets"]
+    return {"fase1_pct": TRAIL_PARAMS["fase1_pct"], "vol_lav": lav, "vol_høj": høj, **entry}
+
+
+def grid_points(space=SWEEP_SPACE):
+    axes = [np.round(np.arange(lo, hi + step / 2, step), 2) for lo, hi, step in space.values()]
+    return [dict(zip(space, map(float, combo))) for combo in itertools.product(*axes)]
+
+
+def random_points(n, space=SWEEP_SPACE, seed=42):
+    """n punkter trukket uniformt og rundet til halve skridt."""
+    rng = np.random.default_rng(seed)
+    cols = {}
+    for name, (lo, hi, step) in space.items():
+        half = step / 2
+        cols[name] = np.round(rng.uniform(lo, hi, n) / half) * half
+    return [{name: float(cols[name][i]) for name in space} for i in range(n)]
+
+
+def point_kwargs(point):
+    """Parameterpunkt → keyword-argumenter til trail_backtest.simulate()."""
+    return {
+        "params": {"fase1_pct": point["fase1_pct"],
+                   "vol_buckets": (point["vol_lav"], point["vol_høj"])},
+        "entry":  {k: point[k] for k in ("min_momentum", "max_rsi", "hurtig_min_momentum")},
+    }
+
+
+# ==========================================
+# SHARED MEMORY
+# ==========================================
+
+def share_arrays(arrays):
+    """Kopierer arrays til shared memory. Returnerer (blokke, specs til workerne)."""
+    blocks, specs = [], {}
+    for name, a in arrays.items():
+        shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+        np.ndarray(a.shape, a.dtype, buffer=shm.buf)[...] = a
+        blocks.append(shm)
+        specs[name] = (shm.name, a.shape, a.dtype.str)
+    return blocks, specs
+
+
+def _attach(specs):
+    """Worker-initializer: mapper blokkene som arrays (ingen kopi)."""
+    blocks = []
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm)
+        _SHARED[name] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+    _SHARED["_blocks"] = blocks   # Holdes i live så længe workeren kører
+
+
+def _run_points(points, arrays=None):
+    """Simulerer en bunke punkter — i workeren mod shared memory."""
+    a = arrays if arrays is not None else _SHARED
+    matrix = {"prices": a["prices"], "observed": a["observed"]}
+    ind    = {"ma": a["ma"], "rsi": a["rsi"], "vol": a["vol"]}
+    return [summarize(matrix, simulate(matrix, ind, **point_kwargs(p))) for p in points]
+
+
+def run_sweep(matrix, points, workers=None):
+    """
+    Kører alle punkter og returnerer nøgletal i samme rækkefølge.
+    workers=1 kører i processen (ingen pool, ingen shared memory).
+    """
+    ind    = compute_indicators(matrix)
+    arrays = {"prices": matrix["prices"], "observed": matrix["observed"], **ind}
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(points) < 2:
+        return _run_points(points, arrays)
+
+    size   = max(1, len(points) // (workers * CHUNKS_PER_WORKER))
+    chunks = [points[i:i + size] for i in range(0, len(points), size)]
+    blocks, specs = share_arrays(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(specs,)) as pool:
+            return [m for part in pool.map(_run_points, chunks) for m in part]
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+# ==========================================
+# PARETO-FRONT
+# ==========================================
+
+def pareto_front(results):
+    """
+    Indeks for punkter hvor intet andet punkt har både højere afkast og
+    mindre max drawdown (max_dd_pct er negativ — højere er bedre).
+    Sorteret efter afkast, højest først.
+    """
+    order = sorted(range(len(results)),
+                   key=lambda i: (-results[i]["afkast_pct"], -results[i]["max_dd_pct"]))
+    front, best_dd = [], -np.inf
+    for i in order:
+        if results[i]["max_dd_pct"] > best_dd:
+            front.append(i)
+            best_dd = results[i]["max_dd_pct"]
+    return front
+
+
+def results_table(points, results, front):
+    """Kompakt tabel: feltnavne én gang, én række pr. punkt."""
+    on_front = set(front)
+    kolonner = list(SWEEP_SPACE) + METRICS + ["pareto"]
+    rækker = [[p[k] for k in SWEEP_SPACE] + [m[k] for k in METRICS] + [i in on_front]
+              for i, (p, m) in enumerate(zip(points, results))]
+    return {"kolonner": kolonner, "rækker": rækker}
+
+
+def format_front(points, results, front):
+    heads = ["fase1", "vol", "mom", "rsi", "hurtig", "Afkast%", "MaxDD%", "Handler", "Whipsaw%"]
+    lines = ["  " + "".join(f"{h:>9}" for h in heads)]
+    for i in front:
+        p, m = points[i], results[i]
+        cells = [f"{p['fase1_pct']:g}", f"{p['vol_lav']:g}/{p['vol_høj']:g}",
+                 f"{p['min_momentum']:g}", f"{p['max_rsi']:g}", f"{p['hurtig_min_momentum']:g}",
+                 m["afkast_pct"], m["max_dd_pct"], m["handler"], m["whipsaw_pct"]]
+        mark = " ← nuværende" if i == 0 else ""
+        lines.append("  " + "".join(f"{c:>9}" for c in cells) + mark)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel parametersøgning for Trail Stop og Spejder")
+    parser.add_argument("dataset", nargs="?", default="etf", choices=["etf", "pfa"])
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--random", type=int, default=200, metavar="N", help="Tilfældige punkter (standard 200)")
+    mode.add_argument("--grid", action="store_true", help="Hele gitteret i SWEEP_SPACE")
+    parser.add_argument("--workers", type=int, help="Antal processer (standard: alle kerner)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--synthetic", type=int, metavar="FONDE", help="Syntetiske kurser (tidsmåling)")
+    parser.add_argument("--days", type=int, default=520, help="Dage ved --synthetic")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        label, matrix = f"syntetisk-{args.synthetic}", synthetic_matrix(args.synthetic, args.days)
+    else:
+        label, matrix = args.dataset, load_matrix([args.dataset])
+
+    points = [current_point()]
+    points += grid_points() if args.grid else random_points(args.random, seed=args.seed)
+    days, funds = matrix["prices"].shape
+    workers = args.workers or os.cpu_count() or 1
+    print(f"🔎 Parametersøgning ({label}): {len(points)} punkter × {funds} fonde × {days} dage "
+          f"på {workers} processer")
+
+    start   = time.perf_counter()
+    results = run_sweep(matrix, points, workers)
+    elapsed = time.perf_counter() - start
+    front   = pareto_front(results)
+
+    out = RESULTS_DIR / f"trail_sweep_{label}.json"
+    save_json(out, {
+        "_meta": {
+            "dataset":   label,
+            "generated": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "mode":      "grid" if args.grid else f"random (seed {args.seed})",
+            "punkter":   len(points),
+            "periode":   [matrix["dates"][0], matrix["dates"][-1]] if days else None,
+            "sekunder":  round(elapsed, 1),
+        },
+        **results_table(points, results, front),
+    }, indent=None)
+
+    print(f"   ⏱️  {len(points)} punkter på {elapsed:.1f} sek ({len(points) / elapsed:.0f} pr. sek)")
+    print(f"\n🏆 Pareto-front — afkast mod max drawdown ({len(front)} punkter):")
+    print(format_front(points, results, front))
+    if 0 not in front:
+        m = results[0]
+        print(f"   Nuværende: afkast {m['afkast_pct']}%, max drawdown {m['max_dd_pct']}% (ikke på fronten)")
+    print(f"\n💾 Alle punkter gemt: {out.relative_to(ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
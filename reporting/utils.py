@@ -210,10 +210,15 @@ def get_trend_state(prices):
         return "WARM-UP"
 
     ma_val, _ = get_best_ma(prices)
+    return trend_state_from_ma(prices[-1], ma_val)
+
+
+def trend_state_from_ma(last_price, ma_val):
+    """Som get_trend_state(), men med en allerede beregnet MA (fx fra indicator_cache.py)."""
     if ma_val is None:
         return "WARM-UP"
 
-    return "BULL" if prices[-1] > ma_val else "BEAR"
+    return "BULL" if last_price > ma_val else "BEAR"
 
 
 def get_trend_shift(prices, prev_trend_state):
@@ -228,8 +233,11 @@ def get_trend_shift(prices, prev_trend_state):
 
     prev_trend_state: Gemt tilstand fra forrige kørsel (str eller None)
     """
-    current = get_trend_state(prices)
+    return get_trend_shift_from_state(get_trend_state(prices), prev_trend_state)
+
 
+def get_trend_shift_from_state(current, prev_trend_state):
+    """Som get_trend_shift(), men med en allerede beregnet trend-tilstand (fx fra snapshot)."""
     if prev_trend_state is None or prev_trend_state == "WARM-UP":
         return None
 
@@ -0,0 +1,762 @@
+"""
+validation_engine.py — Vektoriseret datavalidering for PFA og ETF
+==================================================================
+Indlæser latest + historik som numpy-arrays (én række pr. fond, ét
+fladt array for alle historikpunkter) og evaluerer alle regler som
+masker over hele datasættet på én gang.
+
+Regler registreres med @rule og får samme frame — en ny regel kræver
+derfor ikke endnu et gennemløb af data:
+
+  @rule("min_regel", "Beskrivelse")
+  def _min_regel(frame, cfg):
+      mask = ...
+      return [finding(...) for i in np.flatnonzero(mask)]
+
+Resultatet er en liste af fund (dicts) med regel, niveau, isin, dato og
+besked. pfa_validate_data.py formaterer dem til log-linjer og skriver
+den strukturerede rapport til build/validation_report.json.
+
+Inkrementel validering:
+  data/validation_state.json holder et vandmærke pr. ISIN (seneste
+  validerede dato, antal punkter og kurs på vandmærket). Kun punkter efter
+  vandmærket valideres — med nok naboer bagud til spring-, hul- og
+  flat-reglerne. Fund fra historik-regler gemmes i state og genudsendes,
+  så rapporten er den samme som ved fuld validering. Ændres en fonds
+  ældre historik (antal eller vandmærke-kurs passer ikke), valideres den
+  fonden fuldt igen. Regler der sammenligner fonde (scope="pairs") kan
+  ikke nøjes med halen — i stedet gemmes antal fælles (dato, kurs) og
+  seneste fælles dato pr. fondspar, og kun de nye punkter tælles med.
+  Partællingerne bygges forfra over hele historikken ved fuld kørsel,
+  eller når en kendt fonds ældre historik er ændret eller fjernet.
+  verify_incremental() tjekker at inkrementel og fuld kørsel er ens.
+"""
+
+from datetime import datetime
+from itertools import combinations
+from pathlib import Path
+
+import numpy as np
+
+from data_store import load_json, save_json
+
+ROOT        = Path(__file__).resolve().parents[1]
+REPORT_FILE = ROOT / "build/validation_report.json"
+STATE_FILE  = ROOT / "data/validation_state.json"
+PAIRS_KEY   = "_pairs"   # partællinger i datasættets state (ved siden af ISIN'erne)
+
+# Niveauer — FEJL er kritiske, resten er advarsler
+LEVEL_ERROR   = "FEJL"
+LEVEL_WARNING = "ADVARSEL"
+LEVEL_INFO    = "INFO"
+
+# Regel-registret: navn → {"fn", "description", "scope"}
+#   scope="latest":  genberegnes hver kørsel (billigt — O(antal fonde))
+#   scope="history": fund på historikpunkter — kun nye punkter valideres,
+#                    tidligere fund genudsendes fra state
+#   scope="pairs":   regler på tværs af fonde (duplicate_prices) — læser
+#                    frame["pairs"] (tællinger pr. fondspar, se pair_counts),
+#                    fund genberegnes hver kørsel fra tællingerne
+RULES = {}
+
+
+def rule(name, description, scope="latest"):
+    """Registrerer en valideringsregel. fn(frame, cfg) → liste af fund."""
+    def decorator(fn):
+        RULES[name] = {"fn": fn, "description": description, "scope": scope}
+        return fn
+    return decorator
+
+
+def finding(rule_name, level, isin, message, date=None, value=None, key=None):
+    """
+    Ét fund. key identificerer fund der kan genfindes på tværs af kørsler
+    (fx et fondspar) — et nyt fund med samme (regel, key) erstatter det gamle.
+    """
+    return {
+        "rule":    rule_name,
+        "level":   level,
+        "isin":    isin,
+        "date":    date,
+        "value":   value,
+        "key":     key,
+        "message": message,
+    }
+
+
+# ==========================================
+# FRAME (arrays)
+# ==========================================
+
+def _to_date(values):
+    return np.array(values, dtype="datetime64[D]")
+
+
+def _tail(points, watermark, context):
+    """
+    Punkter efter vandmærket + 'context' naboer før — læst bagfra, så
+    kun halen af den (sorterede) historik berøres.
+    Returnerer (dates, prices, antal_nye).
+    """
+    tail, new_count = [], 0
+    for d, p in reversed(points.items()):
+        if d > watermark:
+            new_count += 1
+        elif len(tail) >= new_count + context:
+            break
+        tail.append((d, p))
+    tail.reverse()
+    return [d for d, _ in tail], [p for _, p in tail], new_count
+
+
+def build_frame(latest, history, return_fields, today=None, windows=None):
+    """
+    Bygger array-frame fra latest-listen og historik-dict'en.
+
+    windows: {isin: (vandmærke, context)} fra plan_windows() — for disse
+             fonde medtages kun punkter efter vandmærket (h_active=True)
+             plus 'context' naboer bagud (h_active=False).
+             None = fuld validering af hele historikken.
+
+    Frame-felter (n = antal fonde, N = antal historikpunkter):
+      isins, names           (n)   fond-id og kort navn
+      has_latest, nav,
+      nav_date, returns      (n), (n x k)  fra latest
+      h_fund, h_date,
+      h_price, h_active      (N)   historik sorteret på (fond, dato)
+      h_count, in_history    (n)   antal historikpunkter pr. fond / fonden findes i historik
+    """
+    latest_map = {item["isin"]: item for item in latest if item.get("isin")}
+    isins = list(latest_map) + [i for i in history if i not in latest_map]
+    n     = len(isins)
+
+    names = [
+        (latest_map.get(isin, {}).get("name") or isin)[:35]
+        for isin in isins
+    ]
+
+    nav      = np.full(n, np.nan)
+    nav_date = np.full(n, np.datetime64("NaT"), dtype="datetime64[D]")
+    returns  = np.full((n, len(return_fields)), np.nan)
+    has_latest = np.zeros(n, dtype=bool)
+
+    for i, isin in enumerate(isins):
+        item = latest_map.get(isin)
+        if item is None:
+            continue
+        has_latest[i] = True
+        if isinstance(item.get("nav"), (int, float)):
+            nav[i] = item["nav"]
+        if item.get("nav_date"):
+            nav_date[i] = np.datetime64(item["nav_date"], "D")
+        for j, field in enumerate(return_fields):
+            val = item.get(field)
+            if isinstance(val, (int, float)):
+                returns[i, j] = val
+
+    # --- Historik som flade arrays ---
+    date_parts, price_parts, fund_parts, active_parts = [], [], [], []
+    h_count    = np.zeros(n, dtype=int)
+    in_history = np.array([isin in history for isin in isins], dtype=bool)
+    for i, isin in enumerate(isins):
+        points = history.get(isin) or {}
+        h_count[i] = len(points)
+        if not points:
+            continue
+
+        if windows and isin in windows:
+            watermark, context = windows[isin]
+            keys, values, new_count = _tail(points, watermark, context)
+            active = np.zeros(len(keys), dtype=bool)
+            if new_count:
+                active[-new_count:] = True
+        else:
+            keys, values = list(points.keys()), list(points.values())
+            active = np.ones(len(keys), dtype=bool)
+        if not keys:
+            continue
+
+        dates  = _to_date(keys)
+        prices = np.array(values, dtype=float)
+        order  = np.argsort(dates, kind="stable")
+        date_parts.append(dates[order])
+        price_parts.append(prices[order])
+        fund_parts.append(np.full(len(dates), i, dtype=int))
+        active_parts.append(active[order])
+
+    def _cat(parts, dtype):
+        return np.concatenate(parts) if parts else np.array([], dtype=dtype)
+
+    h_date = _cat(date_parts, "datetime64[D]")
+    return {
+        "isins":      np.array(isins, dtype=object),
+        "names":      names,
+        "has_latest": has_latest,
+        "nav":        nav,
+        "nav_date":   nav_date,
+        "returns":    returns,
+        "ret_fields": list(return_fields),
+        "h_fund":     _cat(fund_parts, int),
+        "h_date":     h_date,
+        "h_price":    _cat(price_parts, float),
+        # Punkter der skal rapporteres på (alle ved fuld validering)
+        "h_active":   _cat(active_parts, bool),
+        "h_count":    h_count,
+        "in_history": in_history,
+        "today":      np.datetime64(today or datetime.now().strftime("%Y-%m-%d"), "D"),
+    }
+
+
+def _pairs(frame):
+    """
+    Nabo-par inden for samme fond: (i_prev, i_curr, gap_dage).
+    Beregnes én gang og deles af jump-, gap- og flat-reglerne.
+    """
+    if "_pairs" not in frame:
+        fund = frame["h_fund"]
+        same = fund[1:] == fund[:-1]
+        curr = np.flatnonzero(same) + 1
+        prev = curr - 1
+        gap  = (frame["h_date"][curr] - frame["h_date"][prev]).astype(int)
+        frame["_pairs"] = (prev, curr, gap)
+    return frame["_pairs"]
+
+
+def _label(frame, i):
+    return f"{frame['isins'][i]} ({frame['names'][i]})"
+
+
+def _d(value):
+    return str(value) if not np.isnat(value) else None
+
+
+# ==========================================
+# REGLER — LATEST
+# ==========================================
+
+@rule("missing_fields", "NAV, nav_date eller afkasttal mangler i latest")
+def _missing_fields(frame, cfg):
+    out = []
+    has = frame["has_latest"]
+    for i in np.flatnonzero(has & ~(frame["nav"] > 0)):
+        out.append(finding("missing_fields", LEVEL_ERROR, frame["isins"][i],
+                           f"{_label(frame, i)} mangler NAV"))
+    for i in np.flatnonzero(has & np.isnat(frame["nav_date"])):
+        out.append(finding("missing_fields", LEVEL_ERROR, frame["isins"][i],
+                           f"{_label(frame, i)} mangler nav_date"))
+
+    # Kerne-afkast (fx 1W-6M) — alle mangler tyder på parser-fejl
+    core = [frame["ret_fields"].index(f) for f in cfg.get("core_returns", [])]
+    if core:
+        missing = np.isnan(frame["returns"][:, core]) & has[:, None]
+        n_missing = missing.sum(axis=1)
+        for i in np.flatnonzero(n_missing == len(core)):
+            out.append(finding("missing_fields", LEVEL_WARNING, frame["isins"][i],
+                               f"{_label(frame, i)} mangler alle afkasttal — mulig parser-fejl"))
+        for i in np.flatnonzero((n_missing >= 2) & (n_missing < len(core))):
+            fields = [cfg["core_returns"][j] for j in np.flatnonzero(missing[i])]
+            out.append(finding("missing_fields", LEVEL_WARNING, frame["isins"][i],
+                               f"{_label(frame, i)} mangler {fields}"))
+    return out
+
+
+@rule("return_sanity", "Afkasttal uden for realistiske grænser")
+def _return_sanity(frame, cfg):
+    lo, hi = cfg["return_min"], cfg["return_max"]
+    ret    = frame["returns"]
+    with np.errstate(invalid="ignore"):
+        mask = (ret > hi) | (ret < lo)
+    out = []
+    for i, j in zip(*np.nonzero(mask)):
+        field = frame["ret_fields"][j]
+        val   = float(ret[i, j])
+        out.append(finding(
+            "return_sanity", LEVEL_ERROR, frame["isins"][i],
+            f"{_label(frame, i)} {field}={val}% er urealistisk (grænse: {lo}% til {hi}%)",
+            value=val,
+        ))
+    return out
+
+
+@rule("stale_nav_date", "Seneste nav_date er for gammel (samlet og pr. fond)")
+def _stale_nav_date(frame, cfg):
+    dates = frame["nav_date"][~np.isnat(frame["nav_date"])]
+    if not len(dates):
+        return []
+    most_recent = dates.max()
+    days_old    = int((frame["today"] - most_recent).astype(int))
+    out = []
+    if days_old > cfg["max_data_age"]:
+        out.append(finding(
+            "stale_nav_date", LEVEL_ERROR, None,
+            f"Data er {days_old} dage gammel (seneste nav_date: {most_recent}) "
+            f"— {cfg['source_hint']} fejlede sandsynligvis",
+            date=str(most_recent), value=days_old,
+        ))
+    elif days_old > 1:
+        out.append(finding(
+            "stale_nav_date", LEVEL_INFO, None,
+            f"Data er {days_old} dage gammel (nav_date: {most_recent}) "
+            f"— kan skyldes weekend eller helligdag",
+            date=str(most_recent), value=days_old,
+        ))
+
+    # Enkelte fonde der halter efter resten af universet
+    lag  = (most_recent - frame["nav_date"]).astype(float)
+    mask = ~np.isnat(frame["nav_date"]) & (lag > cfg["fund_lag_days"])
+    for i in np.flatnonzero(mask):
+        out.append(finding(
+            "stale_nav_date", LEVEL_WARNING, frame["isins"][i],
+            f"{_label(frame, i)} nav_date {_d(frame['nav_date'][i])} halter "
+            f"{int(lag[i])} dage efter universet ({most_recent})",
+            date=_d(frame["nav_date"][i]), value=int(lag[i]),
+        ))
+    return out
+
+
+# ==========================================
+# REGLER — HISTORIK
+# ==========================================
+
+@rule("daily_jump", "Kursspring mellem nærliggende datapunkter", scope="history")
+def _daily_jump(frame, cfg):
+    prev, curr, gap = _pairs(frame)
+    p0, p1 = frame["h_price"][prev], frame["h_price"][curr]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.abs((p1 - p0) / p0)
+    # Lange huller (>7 dage) er ikke unormale — spring dem over
+    mask = frame["h_active"][curr] & (gap <= 7) & (p0 > 0) & (pct > cfg["jump_pct"])
+
+    out = []
+    for k in np.flatnonzero(mask):
+        i  = frame["h_fund"][curr[k]]
+        d0 = str(frame["h_date"][prev[k]])
+        d1 = str(frame["h_date"][curr[k]])
+        out.append(finding(
+            "daily_jump", LEVEL_ERROR, frame["isins"][i],
+            f"{_label(frame, i)} kursspring {p0[k]}→{p1[k]} ({pct[k]*100:.1f}%) "
+            f"på {d0}→{d1}{cfg.get('jump_hint', '')}",
+            date=d1, value=round(float(pct[k]) * 100, 2),
+        ))
+    return out
+
+
+def _count_pair(pairs, a, b, day):
+    entry = pairs.setdefault(f"{a}|{b}", [0, day])
+    entry[0] += 1
+    entry[1]  = max(entry[1], day)
+
+
+def pair_counts(frame):
+    """
+    Tæller fælles (dato, kurs) pr. fondspar over alle historikpunkter i
+    frame. Returnerer {"isinA|isinB": [antal, seneste dato]} med parret
+    sorteret på ISIN — samme format som gemmes i state.
+    """
+    fund, date, price = frame["h_fund"], frame["h_date"], frame["h_price"]
+    pairs = {}
+    if len(fund) < 2:
+        return pairs
+
+    order = np.lexsort((fund, price, date))
+    f, d, p = fund[order], date[order], price[order]
+    same = (d[1:] == d[:-1]) & (p[1:] == p[:-1])
+    if not same.any():
+        return pairs
+
+    # Grupper af punkter med samme (dato, kurs) — alle fonde i gruppen parres
+    start = np.flatnonzero(np.r_[True, ~same])
+    size  = np.diff(np.r_[start, len(f)])
+    for s, n in zip(start[size > 1], size[size > 1]):
+        day = str(d[s])
+        for a, b in combinations(sorted(frame["isins"][k] for k in f[s:s + n]), 2):
+            _count_pair(pairs, a, b, day)
+    return pairs
+
+
+def update_pairs(pairs, history, windows):
+    """
+    Lægger nye punkter oven i gemte partællinger. Nye punkter = efter
+    vandmærket for fonde i windows, alle punkter for fonde uden vandmærke.
+    Kun datoer med nye punkter læses — på tværs af alle fonde, så et nyt
+    punkt også parres med andre fondes ældre punkter på samme dato.
+    """
+    fresh = {}
+    for isin, points in history.items():
+        if not points:
+            continue
+        if isin in windows:
+            wm = windows[isin][0]
+            for d in reversed(points):
+                if d <= wm:
+                    break
+                fresh.setdefault(d, set()).add(isin)
+        else:
+            for d in points:
+                fresh.setdefault(d, set()).add(isin)
+
+    for day, new in fresh.items():
+        groups = {}
+        for isin, points in history.items():
+            value = points.get(day) if points else None
+            if value is not None and value == value:
+                groups.setdefault(float(value), []).append(isin)
+        for members in groups.values():
+            for a, b in combinations(sorted(members), 2):
+                # Par hvor begge punkter er gamle er talt med i forvejen
+                if a in new or b in new:
+                    _count_pair(pairs, a, b, day)
+    return pairs
+
+
+@rule("duplicate_prices", "Samme kurs på samme dato i to fonde gentagne gange", scope="pairs")
+def _duplicate_prices(frame, cfg):
+    # Tæl sammenfald pr. fondspar — enkelte tilfældige sammenfald er normale
+    pairs = frame["pairs"] if "pairs" in frame else pair_counts(frame)
+    pos   = {isin: k for k, isin in enumerate(frame["isins"])}
+    rows  = []
+    for key, (count, last_date) in pairs.items():
+        a, b = key.split("|")
+        if count >= cfg["dup_min_points"] and a in pos and b in pos:
+            rows.append((*sorted((pos[a], pos[b])), count, last_date))
+
+    out = []
+    for i, j, count, last_date in sorted(rows):
+        out.append(finding(
+            "duplicate_prices", LEVEL_WARNING, frame["isins"][i],
+            f"{_label(frame, i)} og {_label(frame, j)} har identisk kurs på "
+            f"{count} datoer (senest {last_date}) — mulig forkert fond i parser",
+            date=last_date, value=count,
+            key=f"{frame['isins'][i]}|{frame['isins'][j]}",
+        ))
+    return out
+
+
+@rule("flat_lined", "Kursen har stået helt stille i mange datapunkter i træk", scope="history")
+def _flat_lined(frame, cfg):
+    prev, curr, _ = _pairs(frame)
+    if not len(curr):
+        return []
+    price = frame["h_price"]
+    eq    = np.zeros(len(price), dtype=bool)
+    eq[curr] = price[curr] == price[prev]
+
+    # Længde af løbende ens-run pr. punkt (nulstilles ved hver ændring)
+    idx       = np.arange(len(eq))
+    reset_at  = np.maximum.accumulate(np.where(~eq, idx, 0))
+    run_len   = idx - reset_at + 1
+
+    # Rapportér én gang pr. run — når den når grænsen
+    mask = (run_len == cfg["flat_min_points"]) & frame["h_active"]
+    out = []
+    for k in np.flatnonzero(mask):
+        i     = frame["h_fund"][k]
+        start = str(frame["h_date"][reset_at[k]])
+        out.append(finding(
+            "flat_lined", LEVEL_WARNING, frame["isins"][i],
+            f"{_label(frame, i)} har uændret kurs {price[k]} i {cfg['flat_min_points']} "
+            f"datapunkter fra {start} — fonden opdateres måske ikke",
+            date=str(frame["h_date"][k]), value=float(price[k]),
+        ))
+    return out
+
+
+@rule("gaps", "Huller i historikken", scope="history")
+def _gaps(frame, cfg):
+    prev, curr, gap = _pairs(frame)
+    mask = frame["h_active"][curr] & (gap > cfg["gap_days"])
+    out = []
+    for k in np.flatnonzero(mask):
+        i  = frame["h_fund"][curr[k]]
+        d0 = str(frame["h_date"][prev[k]])
+        d1 = str(frame["h_date"][curr[k]])
+        out.append(finding(
+            "gaps", LEVEL_INFO, frame["isins"][i],
+            f"{_label(frame, i)} hul i historikken på {int(gap[k])} dage ({d0}→{d1})",
+            date=d1, value=int(gap[k]),
+        ))
+    return out
+
+
+@rule("min_history", "For få historiske datapunkter til MA-beregninger")
+def _min_history(frame, cfg):
+    mask = frame["in_history"] & (frame["h_count"] < cfg["min_history_points"])
+    return [
+        finding("min_history", LEVEL_INFO, frame["isins"][i],
+                f"{_label(frame, i)} har kun {frame['h_count'][i]} historiske datapunkter "
+                f"— MA-beregninger kan være upålidelige",
+                value=int(frame["h_count"][i]))
+        for i in np.flatnonzero(mask)
+    ]
+
+
+@rule("latest_consistency", "Seneste historik-kurs stemmer ikke med latest NAV")
+def _latest_consistency(frame, cfg):
+    n    = len(frame["isins"])
+    fund = frame["h_fund"]
+    out  = []
+
+    valid = frame["has_latest"] & (frame["nav"] > 0) & ~np.isnat(frame["nav_date"])
+    for i in np.flatnonzero(valid & ~frame["in_history"]):
+        out.append(finding("latest_consistency", LEVEL_INFO, frame["isins"][i],
+                           f"{_label(frame, i)} har ingen historik endnu"))
+    if not len(fund):
+        return out
+
+    # Sidste punkt pr. fond = sidste indeks før fonden skifter
+    last_idx = np.flatnonzero(np.append(fund[1:] != fund[:-1], True))
+    last_of  = np.full(n, -1)
+    last_of[fund[last_idx]] = last_idx
+
+    has  = valid & (last_of >= 0)
+    li   = last_of[has]
+    idxs = np.flatnonzero(has)
+    same_date = frame["h_date"][li] == frame["nav_date"][idxs]
+    hist_nav  = frame["h_price"][li]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diff = np.where(hist_nav != 0, np.abs((frame["nav"][idxs] - hist_nav) / hist_nav), 0.0)
+    for k in np.flatnonzero(same_date & (diff > 0.001)):
+        i = idxs[k]
+        out.append(finding(
+            "latest_consistency", LEVEL_WARNING, frame["isins"][i],
+            f"{_label(frame, i)} latest NAV={frame['nav'][i]} men "
+            f"history[{_d(frame['nav_date'][i])}]={hist_nav[k]} "
+            f"— lille uoverensstemmelse ({diff[k]*100:.2f}%)",
+            date=_d(frame["nav_date"][i]), value=round(float(diff[k]) * 100, 3),
+        ))
+    return out
+
+
+# ==========================================
+# KØRSEL & RAPPORT
+# ==========================================
+
+def run_rules(frame, cfg, rules=None):
+    """Kører de valgte regler (standard: cfg['rules']) og returnerer alle fund."""
+    findings = []
+    for name in (cfg["rules"] if rules is None else rules):
+        findings.extend(RULES[name]["fn"](frame, cfg))
+    return findings
+
+
+# ==========================================
+# INKREMENTEL VALIDERING (vandmærker)
+# ==========================================
+
+def load_state():
+    """
+    Format: {dataset: {isin: {"date", "count", "price", "findings": [...]},
+                       "_pairs": {"isinA|isinB": [antal, seneste dato]}}}
+    """
+    return load_json(STATE_FILE, {})
+
+
+def save_state(state):
+    save_json(STATE_FILE, state)
+
+
+def reset_watermarks(dataset, isins=None):
+    """
+    Tvinger fuld validering af udvalgte fonde (eller hele datasættet)
+    næste gang. Kaldes af værktøjer der omskriver historik.
+    """
+    state = load_state()
+    if dataset not in state:
+        return
+    if isins is None:
+        del state[dataset]
+    else:
+        for isin in isins:
+            state[dataset].pop(isin, None)
+        # Fondenes gamle punkter indgår i partællingerne — byg dem forfra
+        state[dataset].pop(PAIRS_KEY, None)
+    save_state(state)
+
+
+def history_context(cfg):
+    """Antal naboer bagud der skal med for at reglerne ser det samme som ved fuld kørsel."""
+    # flat_lined skal kunne se hele run'et + ét punkt før for at kende starten
+    return max(1, cfg.get("flat_min_points", 1), cfg.get("dup_min_points", 1))
+
+
+def plan_windows(history, dataset_state, cfg):
+    """
+    Finder fonde hvis ældre historik er uændret siden sidste kørsel.
+    Returnerer {isin: (vandmærke, context)} — øvrige fonde valideres fuldt.
+
+    Uændret = punkt-antallet op til vandmærket og kursen på vandmærket
+    passer med state. Kun halen af historikken læses.
+    """
+    context = history_context(cfg)
+    windows = {}
+    for isin, points in history.items():
+        wm = dataset_state.get(isin)
+        if not wm or not points:
+            continue
+        if points.get(wm["date"]) != wm["price"]:
+            continue
+        new_count = 0
+        for d in reversed(points):
+            if d <= wm["date"]:
+                break
+            new_count += 1
+        if len(points) - new_count != wm["count"]:
+            continue
+        windows[isin] = (wm["date"], context)
+    return windows
+
+
+def carry_over(dataset_state, windows, cfg):
+    """Tidligere fund fra historik-regler for fonde der valideres inkrementelt."""
+    rules = {name for name in cfg["rules"] if RULES[name]["scope"] == "history"}
+    out = []
+    for isin in windows:
+        out.extend(f for f in dataset_state[isin].get("findings", []) if f["rule"] in rules)
+    return out
+
+
+def pairs_reusable(dataset_state, windows):
+    """
+    Gemte partællinger kan opdateres inkrementelt, når alle kendte fonde
+    har uændret ældre historik (ingen ændrede, tilbagefyldte eller fjernede
+    punkter). Nye fonde er i orden — alle deres punkter tælles som nye.
+    """
+    return PAIRS_KEY in dataset_state and all(
+        isin in windows for isin in dataset_state if isin != PAIRS_KEY
+    )
+
+
+def update_state(history, findings, pairs=None):
+    """
+    Nyt state for datasættet: vandmærke = seneste punkt pr. fond, alle
+    fund fra historik-regler gemt under fonden, og partællingerne.
+    """
+    by_isin = {}
+    for f in findings:
+        if f["isin"] and RULES[f["rule"]]["scope"] == "history":
+            by_isin.setdefault(f["isin"], []).append(f)
+
+    dataset_state = {}
+    for isin, points in history.items():
+        if not points:
+            continue
+        last_date = next(reversed(points))
+        dataset_state[isin] = {
+            "date":     last_date,
+            "count":    len(points),
+            "price":    points[last_date],
+            "findings": by_isin.get(isin, []),
+        }
+    if pairs is not None:
+        dataset_state[PAIRS_KEY] = pairs
+    return dataset_state
+
+
+def validate_dataset(dataset, latest, history, cfg, full=False, today=None, state=None):
+    """
+    Kører reglerne for ét datasæt — inkrementelt medmindre full=True.
+    Returnerer (findings, frame, mode) og opdaterer vandmærkerne.
+    state: vandmærker i hukommelsen (verify_incremental) — så røres
+    data/validation_state.json ikke.
+    """
+    persist       = state is None
+    state         = load_state() if persist else state
+    dataset_state = {} if full else state.get(dataset, {})
+    windows       = plan_windows(history, dataset_state, cfg) if dataset_state else {}
+
+    frame = build_frame(latest, history, cfg["return_fields"], today=today, windows=windows)
+    pairs = None
+    if any(RULES[name]["scope"] == "pairs" for name in cfg["rules"]):
+        if windows and pairs_reusable(dataset_state, windows):
+            pairs = update_pairs(dataset_state[PAIRS_KEY], history, windows)
+        else:
+            whole = build_frame(latest, history, cfg["return_fields"], today=today) if windows else frame
+            pairs = pair_counts(whole)
+        frame["pairs"] = pairs
+
+    fresh    = run_rules(frame, cfg)
+    replaced = {(f["rule"], f["key"]) for f in fresh if f["key"]}
+    findings = [
+        f for f in carry_over(dataset_state, windows, cfg)
+        if (f["rule"], f.get("key")) not in replaced
+    ] + fresh
+
+    # Samme rækkefølge som ved fuld kørsel: regel, fond, dato
+    rule_pos = {name: k for k, name in enumerate(cfg["rules"])}
+    fund_pos = {isin: k for k, isin in enumerate(frame["isins"])}
+    findings.sort(key=lambda f: (rule_pos[f["rule"]], fund_pos.get(f["isin"], -1), f["date"] or ""))
+
+    mode = "full" if not windows else f"inkrementel ({len(windows)}/{len(history)} fonde)"
+    state[dataset] = update_state(history, findings, pairs)
+    if persist:
+        save_state(state)
+    return findings, frame, mode
+
+
+def verify_incremental(dataset, latest, history, cfg, cut=5, today=None):
+    """
+    Selvtjek: validerer historikken uden hver fonds sidste `cut` punkter,
+    derefter inkrementelt med det hele, og sammenligner med en fuld
+    kørsel. Returnerer (mode, kun_inkrementel, kun_fuld) som beskeder.
+    """
+    state   = {}
+    trimmed = {isin: dict(list(points.items())[:-cut]) if isinstance(points, dict) else points
+               for isin, points in history.items()}
+    validate_dataset(dataset, latest, trimmed, cfg, today=today, state=state)
+    inc, _, mode = validate_dataset(dataset, latest, history, cfg, today=today, state=state)
+    ful, _, _    = validate_dataset(dataset, latest, history, cfg, full=True, today=today, state={})
+    a = [f["message"] for f in inc]
+    b = [f["message"] for f in ful]
+    return mode, [m for m in a if m not in b], [m for m in b if m not in a]
+
+
+def to_messages(findings, cfg):
+    """
+    Formaterer fund til (fejl, advarsler) som log-linjer.
+    cfg['max_listed'] begrænser antal linjer pr. regel (resten summeres).
+    """
+    errors, warnings = [], []
+    listed, levels = {}, {}
+    suffix = cfg.get("label_suffix", "")
+
+    for f in findings:
+        target = errors if f["level"] == LEVEL_ERROR else warnings
+        limit  = cfg.get("max_listed", {}).get(f["rule"])
+        listed[f["rule"]] = listed.get(f["rule"], 0) + 1
+        levels.setdefault(f["rule"], f["level"])
+        if limit is None or listed[f["rule"]] <= limit:
+            target.append(f"{f['level']}{suffix}: {f['message']}")
+
+    for rule_name, limit in cfg.get("max_listed", {}).items():
+        total = listed.get(rule_name, 0)
+        if total > limit:
+            level  = levels[rule_name]
+            target = errors if level == LEVEL_ERROR else warnings
+            target.append(
+                f"{level}{suffix}: {total} fund af typen '{rule_name}' i alt "
+                f"— se {REPORT_FILE.relative_to(ROOT)} for detaljer"
+            )
+    return errors, warnings
+
+
+def summarize(findings, frame, mode):
+    counts = {}
+    for f in findings:
+        counts.setdefault(f["rule"], {}).setdefault(f["level"], 0)
+        counts[f["rule"]][f["level"]] += 1
+    return {
+        "generated": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "mode":      mode,
+        "funds":     int(len(frame["isins"])),
+        "points":    int(len(frame["h_date"])),
+        "errors":    sum(1 for f in findings if f["level"] == LEVEL_ERROR),
+        "counts":    counts,
+        "findings":  findings,
+    }
+
+
+def write_report(dataset, summary):
+    """Opdaterer datasættets sektion i build/validation_report.json (atomisk)."""
+    report = load_json(REPORT_FILE, {})
+    report[dataset] = summary
+    save_json(REPORT_FILE, report)
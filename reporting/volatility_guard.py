@@ -0,0 +1,310 @@
+"""
+volatility_guard.py — Fælles volatility guard for PFA og ETF
+=============================================================
+Afviser urealistiske kursspring før de skrives til historikken.
+
+Guarden holder pr. ISIN den senest accepterede (dato, kurs) samt en lille
+ringbuffer med de seneste punkter. Et tjek er derfor O(1) — historikken
+gennemløbes ikke for hvert nyt datapunkt. Ringbufferen seedes første gang
+fra halen af historikken (der altid gemmes sorteret).
+
+Afviste punkter logges i data/quarantine.json med begrundelse, så de kan
+genoptages samlet bagefter hvis springet viser sig at være ægte:
+
+  python reporting/volatility_guard.py list
+  python reporting/volatility_guard.py readmit --source pfa --isin PFA000002450
+  python reporting/volatility_guard.py readmit --source etf --all
+  python reporting/volatility_guard.py drop --source pfa --isin PFA000002450
+"""
+
+import argparse
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+
+from data_store import PATHS, load_json, save_json, load_history, save_history
+
+ROOT            = Path(__file__).resolve().parents[1]
+QUARANTINE_FILE = ROOT / "data/quarantine.json"
+
+# Kilder med historik — karantæne-punkter genoptages via data_store
+SOURCES = sorted(PATHS["history"])
+
+# Sammenlign kun mod punkter inden for dette antal kalenderdage
+WINDOW_DAYS = 10
+
+# Antal seneste punkter pr. ISIN i ringbufferen.
+# 10 kalenderdage er højst ~8 handelsdage — 16 giver god margin.
+RING_SIZE = 16
+
+
+# ==========================================
+# GUARD-STATE
+# ==========================================
+
+def create_guard(source, max_jump_pct, window_days=WINDOW_DAYS, inclusive=False):
+    """
+    Opretter guard-state for én kilde ('pfa' eller 'etf').
+
+    inclusive=True: sammenlign også mod et eksisterende punkt på samme dato
+                    (PFA genkører samme nav_date i weekender).
+    """
+    return {
+        "source":      source,
+        "max_jump":    max_jump_pct,
+        "window_days": window_days,
+        "inclusive":   inclusive,
+        "series":      {},
+        "quarantine":  load_quarantine(),
+        "dirty":       False,
+    }
+
+
+def _series(guard, isin, history_points):
+    """Returnerer ISIN'ens ringbuffer — seedes fra historikkens hale første gang."""
+    series = guard["series"].get(isin)
+    if series is None:
+        tail = []
+        if history_points:
+            # Historikken gemmes sorteret, så de sidste nøgler er de nyeste
+            tail = sorted(islice(reversed(history_points.items()), RING_SIZE))
+        series = {
+            "last":   tail[-1] if tail else None,
+            "recent": deque(tail, maxlen=RING_SIZE),
+        }
+        guard["series"][isin] = series
+    return series
+
+
+def _reference(guard, series, new_date):
+    """Finder seneste punkt i vinduet før (eller på) new_date — O(RING_SIZE)."""
+    threshold = (
+        datetime.strptime(new_date, "%Y-%m-%d") - timedelta(days=guard["window_days"])
+    ).strftime("%Y-%m-%d")
+
+    last = series["last"]
+    if last is not None and threshold <= last[0] and (
+        last[0] < new_date or (guard["inclusive"] and last[0] == new_date)
+    ):
+        return last
+
+    # Langsom vej: punktet ligger før seneste accepterede (fx bootstrap/backfill)
+    for d, p in reversed(series["recent"]):
+        if d < threshold:
+            return None
+        if d < new_date or (guard["inclusive"] and d == new_date):
+            return d, p
+    return None
+
+
+def check_point(guard, isin, new_date, new_price, history_points=None):
+    """
+    Tjekker om et nyt datapunkt er realistisk ift. de seneste accepterede.
+
+    history_points: ISIN'ens eksisterende historik ({dato: kurs}) — bruges kun
+                    til at seede ringbufferen første gang ISIN'en ses.
+
+    Returnerer (ok, reason) — reason er None når punktet accepteres, ellers
+    et dict med referencepunkt og ændring i %. Punktet registreres IKKE;
+    kald accept_point() eller reject_point() bagefter.
+    """
+    series = _series(guard, isin, history_points)
+    ref    = _reference(guard, series, new_date)
+    if ref is None:
+        return True, None
+
+    ref_date, ref_price = ref
+    if not ref_price:
+        return True, None
+
+    diff = abs((new_price - ref_price) / ref_price)
+    if diff <= guard["max_jump"]:
+        return True, None
+
+    return False, {
+        "reason":    "kursspring",
+        "ref_date":  ref_date,
+        "ref_price": ref_price,
+        "diff_pct":  round(diff * 100, 2),
+        "limit_pct": round(guard["max_jump"] * 100, 2),
+    }
+
+
+def accept_point(guard, isin, date, price):
+    """Registrerer et accepteret punkt i ringbufferen (og rydder evt. karantæne)."""
+    series = _series(guard, isin, None)
+    recent = series["recent"]
+
+    if not recent or date > recent[-1][0]:
+        recent.append((date, price))
+    else:
+        # Punkt uden for rækkefølge — sjældent, så bufferen sorteres bare om
+        points = dict(recent)
+        points[date] = price
+        recent.clear()
+        recent.extend(sorted(points.items())[-RING_SIZE:])
+
+    if series["last"] is None or date >= series["last"][0]:
+        series["last"] = (date, price)
+
+    isin_q = guard["quarantine"].get(guard["source"], {}).get(isin)
+    if isin_q and date in isin_q:
+        del isin_q[date]
+        guard["dirty"] = True
+
+
+def reject_point(guard, isin, date, price, reason):
+    """Logger et afvist punkt i karantæne-lageret."""
+    entry = dict(reason)
+    entry["price"]  = price
+    entry["logged"] = datetime.now().strftime("%Y-%m-%d %H:%M")
+    guard["quarantine"].setdefault(guard["source"], {}).setdefault(isin, {})[date] = entry
+    guard["dirty"] = True
+
+
+def save_guard(guard):
+    """Gemmer karantæne-lageret hvis guarden har ændret det."""
+    if guard["dirty"]:
+        save_quarantine(guard["quarantine"])
+        guard["dirty"] = False
+
+
+# ==========================================
+# KARANTÆNE
+# ==========================================
+
+def load_quarantine():
+    """Format: {source: {isin: {dato: {price, reason, ref_date, ref_price, diff_pct, ...}}}}"""
+    return load_json(QUARANTINE_FILE, {})
+
+
+def save_quarantine(store):
+    # Ryd tomme ISIN'er/kilder så filen ikke vokser med tomme dicts
+    cleaned = {}
+    for source, isins in store.items():
+        isins = {isin: dict(sorted(dates.items())) for isin, dates in isins.items() if dates}
+        if isins:
+            cleaned[source] = dict(sorted(isins.items()))
+    save_json(QUARANTINE_FILE, cleaned)
+
+
+def _select(store, source, isins=None, dates=None):
+    """Udvælger (isin, dato, entry) fra karantæne for én kilde."""
+    selected = []
+    for isin, points in store.get(source, {}).items():
+        if isins and isin not in isins:
+            continue
+        for d, entry in points.items():
+            if dates and d not in dates:
+                continue
+            selected.append((isin, d, entry))
+    return selected
+
+
+def readmit(source, isins=None, dates=None, dry_run=False):
+    """
+    Genoptager karantæne-punkter i historikken for kilden.
+    Eksisterende datapunkter overskrives aldrig.
+    Returnerer antal genoptagne punkter.
+    """
+    store    = load_quarantine()
+    selected = _select(store, source, isins, dates)
+    if not selected:
+        print("Ingen karantæne-punkter matcher.")
+        return 0
+
+    history = load_history(source)
+    added = skipped = 0
+    for isin, d, entry in selected:
+        points = history.setdefault(isin, {})
+        if d in points:
+            skipped += 1
+        else:
+            points[d] = entry["price"]
+            added += 1
+            print(f"[GENOPTAGET] {isin}: {entry['price']} ({d}) — {entry.get('diff_pct')}% spring")
+        del store[source][isin][d]
+
+    print(f"✅ {added} punkter genoptaget"
+          f"{f', {skipped} sprunget over (dato findes allerede)' if skipped else ''}")
+
+    if dry_run:
+        print("   Dry-run — intet er gemt.")
+        return added
+
+    for isin in history:
+        history[isin] = dict(sorted(history[isin].items()))
+    save_history(source, history)
+    save_quarantine(store)
+    return added
+
+
+def drop(source, isins=None, dates=None):
+    """Fjerner karantæne-punkter uden at genoptage dem."""
+    store    = load_quarantine()
+    selected = _select(store, source, isins, dates)
+    for isin, d, _ in selected:
+        del store[source][isin][d]
+    save_quarantine(store)
+    print(f"🗑️  {len(selected)} karantæne-punkter fjernet.")
+    return len(selected)
+
+
+def print_quarantine(source=None):
+    store = load_quarantine()
+    total = 0
+    for src, isins in store.items():
+        if source and src != source:
+            continue
+        for isin, points in isins.items():
+            for d, e in points.items():
+                total += 1
+                print(f"  [{src}] {isin} {d}: {e.get('ref_price')} ({e.get('ref_date')}) → "
+                      f"{e['price']} ({e.get('diff_pct')}%, {e.get('reason')})")
+    print(f"📋 {total} punkter i karantæne.")
+
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Karantæne for afviste kursspring")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_list = sub.add_parser("list", help="Vis punkter i karantæne")
+    p_list.add_argument("--source", choices=SOURCES)
+
+    for name, help_text in (("readmit", "Genoptag punkter i historikken"),
+                            ("drop",    "Slet punkter fra karantæne")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--source", choices=SOURCES, required=True)
+        p.add_argument("--isin", action="append", default=None,
+                       help="Begræns til ISIN (kan gentages)")
+        p.add_argument("--date", action="append", default=None,
+                       help="Begræns til dato YYYY-MM-DD (kan gentages)")
+        p.add_argument("--all", action="store_true",
+                       help="Alle punkter for kilden (kræves uden --isin/--date)")
+        if name == "readmit":
+            p.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        print_quarantine(args.source)
+        return
+
+    if not (args.all or args.isin or args.date):
+        parser.error("angiv --isin, --date eller --all")
+
+    isins = set(args.isin) if args.isin else None
+    dates = set(args.date) if args.date else None
+    if args.command == "readmit":
+        readmit(args.source, isins, dates, dry_run=args.dry_run)
+    else:
+        drop(args.source, isins, dates)
+
+
+if __name__ == "__main__":
+    main()